@@ -1,20 +1,31 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable
 import uuid
 import time
+import json
 import asyncio
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Header
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from starlette.background import BackgroundTask
 from starlette.concurrency import run_in_threadpool
 
 from app.services.ai_service import ai_service
 from app.services.schema_context import schema_context
 from app.models.profile_models import Users, UserAcademics
 from app.core.security import get_current_user, RoleChecker
-from app.core.db import get_db, SessionLocal
-from app.core.logging_config import get_logger
+from app.core.db import get_async_db
+from app.core.logging_config import get_logger, log_payload
+from app.core.config import settings
 from app.core.rate_limiter import rate_limiter, query_cache
+from app.core.answer_cache import answer_cache
+from app.core.job_store import job_store
+from app.core.single_flight import question_flight
+from app.core.usage_recorder import usage_recorder, set_usage_context, GROUP_FIELDS
+from app.core.metrics import SQL_ATTEMPTS, stage_timer, time_awaitable, timed_stage
 from app.prompts import (
     get_admin_prompt,
     get_student_prompt,
@@ -26,13 +37,13 @@ from app.prompts import (
 
 from app.services import sql_executor
 from app.services.query_classifier import query_classifier
+from app.services.sql_templates import sql_template_library
+from app.services.table_retriever import table_retriever
 
 router = APIRouter()
 logger = get_logger("ai_query")
-
-# In-memory Job Store for Async Queries
-JOB_STORE: Dict[str, Any] = {}
-
+prompt_logger = get_logger("ai_service.prompts")
+failure_logger = get_logger("ai_failures")
 
 from app.models.saved_queries import SavedQuery
 
@@ -64,12 +75,48 @@ class AIQueryResponse(BaseModel):
 
 # --- CORE LOGIC ---
 
+# Stage event callback used by the streaming endpoint: await emit(event, data)
+EmitFn = Callable[[str, dict], Awaitable[None]]
+
+# Appended to the correction prompt after a QUERY_TIMEOUT
+QUERY_TIMEOUT_CORRECTION = (
+    "The query exceeded its time budget. Rewrite it to scan less data: filter result "
+    "tables by college/batch/semester early, avoid joining submission_tracks unless "
+    "required, replace correlated subqueries with joins or GROUP BY, and add a LIMIT."
+)
+
+
+async def _emit(emit: Optional[EmitFn], event: str, data: dict):
+    """Send a pipeline stage event when running in streaming mode."""
+    if emit is not None:
+        await emit(event, data)
+
+
+async def _load_academics(db: AsyncSession, user_id) -> Optional[UserAcademics]:
+    """The user's academics row with college/department/batch/section eagerly loaded"""
+    result = await db.execute(
+        select(UserAcademics)
+        .where(UserAcademics.user_id == user_id)
+        .options(
+            joinedload(UserAcademics.college),
+            joinedload(UserAcademics.department),
+            joinedload(UserAcademics.batch),
+            joinedload(UserAcademics.section),
+        )
+        .limit(1)
+    )
+    return result.scalars().first()
+
 
-async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
+@timed_stage("total")
+async def _process_ai_query(
+    request: AIQueryRequest, db: AsyncSession, emit: Optional[EmitFn] = None
+) -> dict:
     """
     Core Logic for processing AI queries.
-    Refactored for reuse in Sync and Async modes.
+    Refactored for reuse in Sync, Async and Streaming modes.
     Ensures high-precision role-based prompts (Batch/Section scoping).
+    When `emit` is given, stage events and answer tokens are emitted as they happen.
     """
     question = request.question
     model = request.model
@@ -77,7 +124,9 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
     # 0. User Context Identification
     current_user = None
     if request.user_id:
-        current_user = db.query(Users).filter(Users.id == str(request.user_id)).first()
+        current_user = (
+            await db.execute(select(Users).where(Users.id == str(request.user_id)).limit(1))
+        ).scalars().first()
         if current_user and request.user_role:
             current_user.role = request.user_role
 
@@ -96,16 +145,13 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
     role_instruction = ""
     user_context_str = ""
     current_role_id = int(str(current_user.role or 7))
+    college_id = dept_id = batch_id = section_id = None
     
     if current_role_id in [1, 2]: # Admin
         role_instruction = get_admin_prompt(current_user.id)
 
     elif current_role_id == 7:  # Student
-        academics = (
-            db.query(UserAcademics)
-            .filter(UserAcademics.user_id == current_user.id)
-            .first()
-        )
+        academics = await _load_academics(db, current_user.id)
         dept_id = academics.department_id if academics else "Unknown"
         college_id = academics.college_id if academics else "Unknown"
         batch_id = academics.batch_id if academics else "Unknown"
@@ -162,11 +208,7 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
         )
 
     elif current_role_id == 4:  # Staff
-        academics = (
-            db.query(UserAcademics)
-            .filter(UserAcademics.user_id == current_user.id)
-            .first()
-        )
+        academics = await _load_academics(db, current_user.id)
         dept_id = academics.department_id if academics else "Unknown"
         dept_name = "Your Department"
         if academics:
@@ -176,11 +218,7 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
         role_instruction = get_staff_prompt(dept_id, dept_name, current_user.id)
 
     elif current_role_id == 3:  # College Admin
-        academics = (
-            db.query(UserAcademics)
-            .filter(UserAcademics.user_id == current_user.id)
-            .first()
-        )
+        academics = await _load_academics(db, current_user.id)
         college_id = academics.college_id if academics else "Unknown"
         college_short_name = "admin"
         college_name = "Your Institution"
@@ -195,11 +233,7 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
         role_instruction = get_content_creator_prompt(current_user.id)
 
     elif current_role_id == 5:  # Trainer
-        academics = (
-            db.query(UserAcademics)
-            .filter(UserAcademics.user_id == current_user.id)
-            .first()
-        )
+        academics = await _load_academics(db, current_user.id)
         dept_id = academics.department_id if academics else "Unknown"
         dept_name = "Your Department"
         if academics:
@@ -211,6 +245,9 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
     else:
         role_instruction = f"Unauthorized role: {current_role_id}. Access Denied."
 
+    # Attribute LLM token usage in this request to the caller's role and tenant
+    set_usage_context(current_role_id, college_id, str(current_user.id))
+
     # 1.6 Security Interceptor
     if current_role_id not in [1, 2]:
         lower_q = question.lower()
@@ -237,14 +274,99 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
                         "follow_ups": [],
                     }
 
+    # STEP 1.4: Answer Cache (same question in the same role/scope skips every LLM stage)
+    cache_key = answer_cache.make_key(
+        question,
+        current_role_id,
+        user_id=str(current_user.id),
+        college_id=college_id,
+        department_id=dept_id,
+        batch_id=batch_id,
+        section_id=section_id,
+    )
+    with stage_timer("answer_cache_lookup"):
+        cached_entry = answer_cache.get(cache_key)
+    if cached_entry:
+        cached_response = await _answer_from_cache(
+            cache_key, cached_entry, question, model, current_user, current_role_id, db, emit
+        )
+        if cached_response:
+            return cached_response
+
+    # Scope ids for SQL templates (the same ids are part of cache_key)
+    scope = {
+        "role_id": current_role_id,
+        "college_id": college_id,
+        "department_id": dept_id,
+        "batch_id": batch_id,
+        "section_id": section_id,
+    }
+
+    # STEP 1.45: Single-flight — concurrent identical questions (same role/scope key)
+    # share one pipeline run. Streaming callers run their own so they get token events.
+    user_id = str(current_user.id)
+    shared_key = not answer_cache.is_personal(question, current_role_id)
+    if emit is None:
+        outcome, _ = await question_flight.do(
+            cache_key,
+            lambda: _run_question_pipeline(
+                question, model, current_role_id, role_instruction, cache_key, scope,
+                user_id=user_id, shared_key=shared_key,
+            ),
+        )
+        # The leader's SQL was scoped to the leader's own id: don't hand it to others
+        if outcome.get("owner") not in (None, user_id):
+            outcome = await _run_question_pipeline(
+                question, model, current_role_id, role_instruction, cache_key, scope,
+                user_id=user_id, shared_key=shared_key,
+            )
+    else:
+        outcome = await _run_question_pipeline(
+            question, model, current_role_id, role_instruction, cache_key, scope, emit,
+            user_id=user_id, shared_key=shared_key,
+        )
+
+    if "response" in outcome:
+        return outcome["response"]
+
+    job_id = await _finalize_query(
+        current_user, db, question, outcome["sql"], outcome["data"], outcome["answer"]
+    )
+    return _build_answer_response(
+        outcome["answer"], outcome["follow_ups"], job_id, outcome["data"], outcome["attempt_count"]
+    )
+
+
+async def _run_question_pipeline(
+    question: str,
+    model: str,
+    current_role_id: int,
+    role_instruction: str,
+    cache_key: str,
+    scope: Optional[dict] = None,
+    emit: Optional[EmitFn] = None,
+    user_id: str = None,
+    shared_key: bool = True,
+) -> dict:
+    """
+    Role-independent part of the pipeline: intent -> schema -> SQL (with retries)
+    -> execution -> synthesis. Shared by coalesced callers, so it has no
+    per-user side effects. Template intents skip schema analysis and SQL
+    generation when `scope` lets the template answer for the caller's role.
+    Returns {"response": {...}} for early exits, otherwise
+    {"sql", "data", "answer", "follow_ups", "attempt_count", "owner"}; owner is
+    the asking user's id when the generated SQL filters by it, else None.
+    """
     # STEP 1.5: Query Intent Classification (zero API cost)
-    intent = query_classifier.classify(question)
+    with stage_timer("classification"):
+        intent = query_classifier.classify(question)
     logger.info(f"🎯 Intent: {intent.intent} (conf={intent.confidence}) | {intent.metadata.get('reason', '')}")
+    await _emit(emit, "intent", {"intent": intent.intent, "confidence": intent.confidence})
 
     # Short-circuit: answer general knowledge directly without touching DB
     if query_classifier.should_skip_db(intent):
         follow_ups = ["Show my performance", "List available courses", "Top performers in my batch"]
-        return {
+        return {"response": {
             "answer": (
                 "That's a general knowledge question — I can answer it without the database.\n\n"
                 "Please re-ask me and I'll answer using my AI knowledge directly!"
@@ -254,30 +376,63 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
             "data_quality": "complete",
             "row_count": 0,
             "attempt_count": 0,
-        }
+        }}
+
+    # STEP 1.55: Vetted SQL template (one DB round trip instead of the LLM SQL stages)
+    template = sql_template_library.render(intent, scope or {}) if intent.sql_template else None
+    if template:
+        outcome = await _answer_from_template(
+            question, model, current_role_id, cache_key, intent, *template, emit
+        )
+        if outcome:
+            return outcome
 
     intent_hint = query_classifier.get_intent_hint_for_prompt(intent)
 
-    # STEP 1.6: Deep Schema Analysis (only for complex queries)
-    if query_classifier.should_skip_schema_analysis(intent):
+    # STEP 1.6: Table selection — lexical retrieval first (sub-millisecond),
+    # DeepSeek schema analysis only when the retrieval is low-confidence
+    skip_analysis = query_classifier.should_skip_schema_analysis(intent)
+    retrieval = None
+    if not skip_analysis and settings.TABLE_RETRIEVAL_ENABLED:
+        with stage_timer("table_retrieval"):
+            retrieval = table_retriever.retrieve(
+                question, schema_context.available_tables or None
+            )
+        logger.info(
+            f"🔎 Table retrieval (coverage={retrieval['coverage']}, "
+            f"confident={retrieval['confident']}): {retrieval['tables']}"
+        )
+
+    if skip_analysis:
         # Fast path: skip the DeepSeek schema analysis API call
         logger.info(f"⚡ Skipping schema analysis for intent: {intent.intent}")
         table_hint = intent.table_hint or ""
-        detailed_schema = schema_context.get_detailed_schema(
+        schema_tables = (
             [t for t in schema_context.get_all_table_names() if table_hint in t]
-        ) if table_hint else ""
+            if table_hint
+            else None
+        )
         analysis_summary = f"Intent: {intent.intent} | Table hint: {table_hint}"
+        await _emit(emit, "tables", {"tables": [table_hint] if table_hint else [], "source": "intent"})
+    elif retrieval and retrieval["confident"]:
+        schema_tables = retrieval["tables"]
+        analysis_summary = (
+            f"Query Type: {intent.intent} | "
+            f"Tables (ranked by relevance): {schema_tables}"
+        )
+        await _emit(emit, "tables", {"tables": schema_tables, "source": "retrieval"})
     else:
-        # Full path: schema analysis via DeepSeek
+        # Full path: schema analysis via DeepSeek (low-confidence retrieval)
         all_table_names = schema_context.get_all_table_names()
-        analysis_result = await run_in_threadpool(
-            ai_service.analyze_question_with_schema,
-            question,
-            all_table_names,
-            model
-        )
+        with stage_timer("schema_analysis"):
+            analysis_result = await ai_service.analyze_question_with_schema_async(
+                question,
+                all_table_names,
+                model
+            )
         recommended_tables = analysis_result.get("recommended_tables", [])
-        detailed_schema = schema_context.get_detailed_schema(recommended_tables)
+        await _emit(emit, "tables", {"tables": recommended_tables, "source": "analysis"})
+        schema_tables = recommended_tables
         analysis_summary = (
             f"Query Type: {analysis_result.get('query_type')} | "
             f"Tables: {recommended_tables} | "
@@ -285,11 +440,17 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
         )
 
     # Construct Final Prompt
-    final_system_prompt = f"""{detailed_schema}
-
-{'='*20}
-{role_instruction}
-{'='*20}
+    with stage_timer("prompt_build"):
+        detailed_schema = (
+            schema_context.get_detailed_schema(schema_tables)
+            if schema_tables is not None
+            else ""
+        )
+        # Static rules + role prompt form the system message (a prefix shared
+        # across requests, so DeepSeek's context cache hits); everything
+        # request-specific goes in the user message
+        sql_system_prompt = schema_context.build_sql_system_prompt(role_instruction)
+        request_prompt = f"""{detailed_schema}
 
 ### QUERY ANALYSIS
 {analysis_summary}
@@ -299,23 +460,26 @@ async def _process_ai_query(request: AIQueryRequest, db: Session) -> dict:
 ### USER TASK
 Generate SQL for: "{question}"
 """
-    print('final_system_prompt', final_system_prompt)
+    log_payload(prompt_logger, "SQL request prompt", request_prompt)
     # STEP 2 & 3: Generate and Execute SQL (with Self-Correction Loop)
     max_retries = 3
     generated_sql = ""
     execution_result = {}
     error_message = None
+    previous_attempts = []  # [{"sql", "error"}] replayed as turns on retry
     attempt_count = 0
+    timeout_count = 0
 
     for attempt in range(max_retries):
-        generated_sql = await run_in_threadpool(
-            ai_service.generate_sql, 
-            final_system_prompt, 
-            question, 
-            model,
-            None, # result_table
-            error_message
-        )
+        with stage_timer(f"sql_generation_{attempt + 1}"):
+            generated_sql = await ai_service.generate_sql_async(
+                sql_system_prompt,
+                question, 
+                model,
+                None, # result_table
+                previous_attempts=previous_attempts,
+                request_context=request_prompt,
+            )
 
         import re
         # Extract only the SQL block
@@ -327,30 +491,62 @@ Generate SQL for: "{question}"
 
         # Clean markdown
         generated_sql = generated_sql.replace("```sql", "").replace("```", "").strip()
+        await _emit(
+            emit,
+            "sql",
+            {"attempt": attempt + 1, "sql": generated_sql if current_role_id in [1, 2] else None},
+        )
 
         # STEP 3: Execute SQL
-        execution_result = await run_in_threadpool(
-            sql_executor.execute_query, generated_sql
-        )
+        with stage_timer("sql_execution"):
+            execution_result = await sql_executor.execute_query_async(generated_sql)
 
         attempt_count += 1
+        SQL_ATTEMPTS.inc(
+            attempt=attempt + 1, outcome=execution_result.get("error_code", "ok")
+        )
 
         # If success, break loop
         if "error" not in execution_result:
             logger.info(f"✅ SQL execution succeeded on attempt {attempt + 1}")
+            await _emit(
+                emit,
+                "execution",
+                {
+                    "attempt": attempt + 1,
+                    "row_count": execution_result.get("count", 0),
+                    "execution_time_ms": execution_result.get("execution_time_ms"),
+                    "cached": execution_result.get("cached", False),
+                },
+            )
             break
         
         # If error, log and prepare for correction
         error_message = execution_result.get("error")
+        correction_message = error_message
+        await _emit(
+            emit,
+            "execution_error",
+            {"attempt": attempt + 1, "error_code": execution_result.get("error_code")},
+        )
+        if execution_result.get("error_code") == "QUERY_TIMEOUT":
+            # Each timeout costs the full time budget; allow one cheaper rewrite only
+            timeout_count += 1
+            if timeout_count > 1:
+                logger.warning(f"⏱️ SQL Attempt {attempt + 1} timed out again, giving up")
+                break
+            correction_message = f"{error_message} {QUERY_TIMEOUT_CORRECTION}"
+        previous_attempts.append({"sql": generated_sql, "error": correction_message})
         logger.warning(f"⚠️ SQL Attempt {attempt + 1} failed: {error_message}. Retrying with correction...")
 
     # Final Failure Handling
     if "error" in execution_result:
-        # Debug logging for persistent failures
-        with open("debug_ai.log", "a", encoding="utf-8") as f:
-            f.write(f"\n[{datetime.now()}] PERSISTENT FAILURE | QUESTION: {question}\n")
-            f.write(f"LAST SQL: {generated_sql}\n")
-            f.write(f"LAST ERROR: {error_message}\n")
+        # Debug logging for persistent failures (logs/debug_ai.log)
+        failure_logger.error(
+            f"PERSISTENT FAILURE | QUESTION: {question}\n"
+            f"LAST SQL: {generated_sql}\n"
+            f"LAST ERROR: {error_message}"
+        )
 
         debug_data = (
             [{"error": error_message}]
@@ -361,13 +557,15 @@ Generate SQL for: "{question}"
 
         if current_role_id in [1, 2]:
             # Admins get the actual error for debugging
-            answer = f"Query failed after {max_retries} attempts. Last error: {error_message}"
+            answer = f"Query failed after {attempt_count} attempts. Last error: {error_message}"
+        elif execution_result.get("error_code") in ("QUERY_TIMEOUT", "QUERY_TOO_EXPENSIVE"):
+            answer = "That question needs more data than I can scan right now. Try narrowing it to a specific college, batch or semester."
         elif "doesn't exist" in (error_message or "").lower():
             answer = "I couldn't find the specific data requested. The information may not be recorded yet."
         else:
             answer = "I couldn't retrieve that information right now. Try rephrasing your question or asking about a specific college or student."
 
-        return {
+        return {"response": {
             "answer": answer,
             "sql": debug_sql,
             "data": debug_data,
@@ -376,50 +574,153 @@ Generate SQL for: "{question}"
             "data_quality": "failed",
             "row_count": 0,
             "attempt_count": attempt_count,
-        }
+        }}
 
     data = execution_result["data"]
-    row_count = len(data) if isinstance(data, list) else 0
 
-    # Compute confidence based on attempts needed
-    confidence_map = {1: 1.0, 2: 0.8, 3: 0.6}
-    confidence = confidence_map.get(attempt_count, 0.5)
+    # STEP 4: Synthesize Answer
+    human_answer, follow_ups, synthesized = await _synthesize_answer(
+        question, generated_sql, data, model, current_role_id, emit
+    )
+    # The role prompt may have scoped the SQL to the asker's id; such an answer
+    # must not be cached under (or coalesced onto) a key other users share
+    owner = user_id if answer_cache.references_user(generated_sql, user_id) else None
+    if synthesized and not (owner and shared_key):
+        answer_cache.set(
+            cache_key, generated_sql, human_answer, follow_ups, data, attempt_count
+        )
 
-    # Compute data quality
-    if row_count == 0:
-        data_quality = "empty"
-        confidence = round(confidence * 0.8, 2)  # penalise empty result
-    elif attempt_count > 1:
-        data_quality = "partial"   # succeeded but needed retries
-    else:
-        data_quality = "complete"
+    return {
+        "sql": generated_sql,
+        "data": data,
+        "answer": human_answer,
+        "follow_ups": follow_ups,
+        "attempt_count": attempt_count,
+        "owner": owner,
+    }
 
-    # STEP 4: Synthesize Answer
-    async def run_parallel_tasks():
-        task_answer = asyncio.to_thread(
-            ai_service.synthesize_answer,
-            question,
-            generated_sql,
-            data,
-            model,
-            current_role_id,
+
+async def _answer_from_template(
+    question: str,
+    model: str,
+    current_role_id: int,
+    cache_key: str,
+    intent,
+    sql: str,
+    params: dict,
+    emit: Optional[EmitFn] = None,
+) -> Optional[dict]:
+    """
+    Answers from a classifier SQL template run with bind parameters.
+    Returns None if it fails, so the caller falls back to SQL generation.
+    """
+    display_sql = sql_executor.inline_params(sql, params)
+    await _emit(emit, "tables", {"tables": [intent.table_hint] if intent.table_hint else [], "source": "template"})
+    await _emit(
+        emit,
+        "sql",
+        {
+            "attempt": 1,
+            "template": intent.sql_template,
+            "sql": display_sql if current_role_id in [1, 2] else None,
+        },
+    )
+
+    with stage_timer("sql_execution"):
+        execution_result = await sql_executor.execute_query_async(sql, params=params)
+    SQL_ATTEMPTS.inc(attempt="template", outcome=execution_result.get("error_code", "ok"))
+
+    if "error" in execution_result:
+        logger.warning(
+            f"🧩 SQL template '{intent.sql_template}' failed "
+            f"({execution_result.get('error_code')}), falling back to SQL generation"
         )
-        task_followups = asyncio.to_thread(
-            ai_service.generate_follow_ups,
+        return None
+
+    logger.info(f"🧩 Answered with SQL template '{intent.sql_template}'")
+    await _emit(
+        emit,
+        "execution",
+        {
+            "attempt": 1,
+            "row_count": execution_result.get("count", 0),
+            "execution_time_ms": execution_result.get("execution_time_ms"),
+            "cached": execution_result.get("cached", False),
+        },
+    )
+
+    data = execution_result["data"]
+    human_answer, follow_ups, synthesized = await _synthesize_answer(
+        question, display_sql, data, model, current_role_id, emit
+    )
+    if synthesized:
+        answer_cache.set(cache_key, sql, human_answer, follow_ups, data, 1, params=params)
+
+    return {
+        "sql": display_sql,
+        "data": data,
+        "answer": human_answer,
+        "follow_ups": follow_ups,
+        "attempt_count": 1,
+    }
+
+
+async def _synthesize_answer(
+    question: str,
+    generated_sql: str,
+    data,
+    model: str,
+    current_role_id: int,
+    emit: Optional[EmitFn] = None,
+) -> tuple:
+    """
+    Runs answer synthesis and follow-up generation in parallel.
+    In streaming mode the answer is emitted token by token as "token" events.
+    Returns (answer, follow_ups, succeeded).
+    """
+    async def stream_answer() -> str:
+        chunks = []
+        async for chunk in ai_service.stream_synthesize_answer_async(
+            question, generated_sql, data, model, current_role_id
+        ):
+            chunks.append(chunk)
+            await emit("token", {"text": chunk})
+        return "".join(chunks)
+
+    async def run_parallel_tasks():
+        if emit is not None:
+            task_answer = stream_answer()
+        else:
+            task_answer = ai_service.synthesize_answer_async(
+                question,
+                generated_sql,
+                data,
+                model,
+                current_role_id,
+            )
+        task_followups = ai_service.generate_follow_ups_async(
             question,
             generated_sql,
             data,
             None,
             current_role_id,
         )
-        return await asyncio.gather(task_answer, task_followups)
+        return await asyncio.gather(
+            time_awaitable("synthesis", task_answer),
+            time_awaitable("follow_ups", task_followups),
+        )
 
     try:
         human_answer, follow_ups = await run_parallel_tasks()
+        return human_answer, follow_ups, True
     except Exception as e:
-        human_answer = "Here is the data."
-        follow_ups = []
+        return "Here is the data.", [], False
 
+
+async def _finalize_query(
+    current_user: Users, db: AsyncSession, question: str, generated_sql: str, data, human_answer: str
+) -> str:
+    """Updates user stats and stores the job for Saved Queries. Returns the job id."""
     # 7. Update User Stats
     if str(current_user.id) != "0":
         try:
@@ -428,21 +729,47 @@ Generate SQL for: "{question}"
             current_user.stats_words_generated = (
                 current_user.stats_words_generated or 0
             ) + words
-            db.commit()
+            await db.commit()
         except:
-            db.rollback()
+            await db.rollback()
 
     # Final Job Storage for persistence (Saved Queries)
     job_id = str(uuid.uuid4())
-    JOB_STORE[job_id] = {
+    await run_in_threadpool(job_store.set, job_id, {
         "status": "completed",
         "sql": generated_sql,
         "question": question,
         "data_count": len(data) if isinstance(data, list) else 0,
         "created_at": time.time(),
-    }
+    })
+    return job_id
+
+
+def _build_answer_response(
+    human_answer: str,
+    follow_ups: list,
+    job_id: str,
+    data,
+    attempt_count: int,
+    cached: bool = None,
+) -> dict:
+    """Builds the /ask response, scoring confidence from attempts and row count."""
+    row_count = len(data) if isinstance(data, list) else 0
 
-    return {
+    # Compute confidence based on attempts needed
+    confidence_map = {1: 1.0, 2: 0.8, 3: 0.6}
+    confidence = confidence_map.get(attempt_count, 0.5)
+
+    # Compute data quality
+    if row_count == 0:
+        data_quality = "empty"
+        confidence = round(confidence * 0.8, 2)  # penalise empty result
+    elif attempt_count > 1:
+        data_quality = "partial"   # succeeded but needed retries
+    else:
+        data_quality = "complete"
+
+    response = {
         "answer": human_answer,
         "follow_ups": follow_ups,
         "job_id": job_id,
@@ -451,6 +778,68 @@ Generate SQL for: "{question}"
         "row_count": row_count,
         "attempt_count": attempt_count,
     }
+    if cached is not None:
+        response["cached"] = cached
+    return response
+
+
+async def _answer_from_cache(
+    cache_key: str,
+    cached_entry: dict,
+    question: str,
+    model: str,
+    current_user: Users,
+    current_role_id: int,
+    db: AsyncSession,
+    emit: Optional[EmitFn] = None,
+) -> Optional[dict]:
+    """
+    Serves a question from the answer cache: re-runs only the cached SQL.
+    The cached answer is reused when the data is unchanged, otherwise only
+    synthesis is repeated. Returns None when the cached SQL no longer works.
+    """
+    params = cached_entry.get("params")
+    execution_result = await sql_executor.execute_query_async(cached_entry["sql"], params=params)
+    generated_sql = sql_executor.inline_params(cached_entry["sql"], params)
+    if "error" in execution_result:
+        logger.warning(
+            f"♻️ Cached SQL failed ({execution_result.get('error_code')}), dropping cache entry"
+        )
+        answer_cache.invalidate(cache_key)
+        return None
+
+    data = execution_result["data"]
+    await _emit(
+        emit,
+        "execution",
+        {
+            "attempt": cached_entry["attempt_count"],
+            "row_count": execution_result.get("count", 0),
+            "execution_time_ms": execution_result.get("execution_time_ms"),
+            "cached": True,
+        },
+    )
+    if answer_cache.data_fingerprint(data) == cached_entry["data_fingerprint"]:
+        logger.info("♻️ Answer cache hit — data unchanged, reusing cached answer")
+        human_answer = cached_entry["answer"]
+        follow_ups = cached_entry["follow_ups"]
+    else:
+        logger.info("♻️ Answer cache hit — data changed, re-synthesizing answer")
+        human_answer, follow_ups, synthesized = await _synthesize_answer(
+            question, generated_sql, data, model, current_role_id, emit
+        )
+        if synthesized:
+            answer_cache.update_answer(cache_key, human_answer, follow_ups, data)
+
+    job_id = await _finalize_query(current_user, db, question, generated_sql, data, human_answer)
+    return _build_answer_response(
+        human_answer,
+        follow_ups,
+        job_id,
+        data,
+        cached_entry["attempt_count"],
+        cached=True,
+    )
 
 
 @router.get("/tables")
@@ -460,8 +849,51 @@ async def get_available_tables(current_user: Users = Depends(get_current_user)):
     return {"tables": tables, "count": len(tables)}
 
 
+@router.post("/schema/reload")
+async def reload_schema(current_user: Users = Depends(RoleChecker([1, 2]))):
+    """Reload schema context after a DB schema change and drop cached answers."""
+    await run_in_threadpool(schema_context.reload)
+    return {
+        "status": "reloaded",
+        "tables": len(schema_context.available_tables),
+        "answer_cache": answer_cache.get_stats(),
+    }
+
+
+@router.post("/admin/cache/invalidate")
+async def invalidate_result_cache(
+    table: Optional[str] = Query(None, description="Drop only results reading this table"),
+    current_user: Users = Depends(RoleChecker([1, 2])),
+):
+    """
+    Invalidate cached SQL results after a data change.
+    With ?table=..., only entries that read that table are dropped; otherwise everything.
+    """
+    if table:
+        dropped = query_cache.invalidate_table(table)
+    else:
+        dropped = len(query_cache.cache)
+        query_cache.clear()
+    logger.info(f"Result cache invalidated by user {current_user.id} | table={table} | dropped={dropped}")
+    return {"table": table, "dropped": dropped, "cache": query_cache.get_stats()}
+
+
+@router.get("/admin/usage")
+async def get_token_usage(
+    days: int = Query(7, ge=1, le=90),
+    group_by: str = Query(
+        ",".join(GROUP_FIELDS),
+        description="Comma-separated subset of: " + ", ".join(GROUP_FIELDS),
+    ),
+    current_user: Users = Depends(RoleChecker([1, 2])),
+):
+    """LLM tokens and estimated cost per day, stage, model, role and college."""
+    fields = [f.strip() for f in group_by.split(",") if f.strip()]
+    return await run_in_threadpool(usage_recorder.aggregate, days, fields)
+
+
 @router.post("/ask", response_model=AIQueryResponse, response_model_exclude_none=True)
-async def ask_database(request: AIQueryRequest, db: Session = Depends(get_db)):
+async def ask_database(request: AIQueryRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Synchronous entry point.
     """
@@ -475,32 +907,83 @@ async def ask_database(request: AIQueryRequest, db: Session = Depends(get_db)):
 
 
 
+def _format_sse(event: str, data: dict) -> str:
+    """Serialize one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/ask/stream")
+async def ask_database_stream(request: AIQueryRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Streaming entry point (Server-Sent Events).
+    Emits stage events (intent, tables, sql, execution) as each stage finishes,
+    then the answer as "token" events, and finally a "done" event with the
+    same payload /ask returns.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: dict):
+        await queue.put((event, data))
+
+    async def run_pipeline():
+        try:
+            result = await _process_ai_query(request, db, emit=emit)
+            await queue.put(("done", result))
+        except Exception as e:
+            logger.error(f"Streaming query failed: {e}")
+            await queue.put(("error", {"detail": f"Internal Error: {str(e)}"}))
+        finally:
+            await queue.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run_pipeline())
+        try:
+            yield _format_sse("start", {"question": request.question})
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield _format_sse(*item)
+        finally:
+            # Client went away: stop the pipeline instead of finishing it for nobody
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/ask/async")
 async def ask_database_async(
     request: AIQueryRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Asynchronous entry point. Returns a job ID immediately.
     """
     job_id = str(uuid.uuid4())
-    JOB_STORE[job_id] = {"status": "processing", "created_at": time.time()}
+    await run_in_threadpool(
+        job_store.set, job_id, {"status": "processing", "created_at": time.time()}
+    )
 
     async def task_wrapper():
         try:
             result = await _process_ai_query(request, db)
-            JOB_STORE[job_id] = {
+            await run_in_threadpool(job_store.set, job_id, {
                 "status": "completed",
                 "result": result,
                 "updated_at": time.time(),
-            }
+            })
         except Exception as e:
-            JOB_STORE[job_id] = {
+            await run_in_threadpool(job_store.set, job_id, {
                 "status": "failed",
                 "error": str(e),
                 "updated_at": time.time(),
-            }
+            })
 
     background_tasks.add_task(task_wrapper)
     return {"job_id": job_id, "status": "processing"}
@@ -509,25 +992,25 @@ async def ask_database_async(
 @router.get("/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """Check status of an async job."""
-    if job_id not in JOB_STORE:
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    return JOB_STORE[job_id]
+    return job
 
 
 @router.post("/save-query")
 async def save_verified_query(
     request: SaveQueryRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Users = Depends(get_current_user),
 ):
     """Save a successful query from the Job Store to the permanent database."""
-    if request.job_id not in JOB_STORE:
+    job_data = await run_in_threadpool(job_store.get, request.job_id)
+    if job_data is None:
         raise HTTPException(
             status_code=404, detail="Original query job not found or expired"
         )
 
-    job_data = JOB_STORE[request.job_id]
-
     # Create saved query entry
     new_saved = SavedQuery(
         name=request.name,
@@ -539,41 +1022,80 @@ async def save_verified_query(
 
     try:
         db.add(new_saved)
-        db.commit()
-        db.refresh(new_saved)
+        await db.commit()
+        await db.refresh(new_saved)
         return {
             "status": "success",
             "slug": new_saved.slug,
             "message": "Query saved as API endpoint",
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Failed to save query: {str(e)}")
 
 
+def _stream_saved_query_body(name: str, columns: list, batches, fmt: str):
+    """
+    Serializes streamed row batches.
+    ndjson: a {"name", "columns"} header line, one line per row, then a {"count"} trailer.
+    json:   the same {"name", "data", "count"} object the buffered endpoint returned,
+            written incrementally.
+    """
+    count = 0
+    if fmt == "ndjson":
+        yield json.dumps({"name": name, "columns": columns}) + "\n"
+        for batch in batches:
+            count += len(batch)
+            yield "".join(json.dumps(row) + "\n" for row in jsonable_encoder(batch))
+        yield json.dumps({"count": count}) + "\n"
+        return
+
+    yield f'{{"name": {json.dumps(name)}, "data": ['
+    for batch in batches:
+        rows = ", ".join(json.dumps(row) for row in jsonable_encoder(batch))
+        if rows:
+            yield (", " if count else "") + rows
+        count += len(batch)
+    yield f'], "count": {count}}}'
+
+
 @router.get("/query/{slug}")
 async def execute_saved_query(
     slug: str,
-    db: Session = Depends(get_db),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Users = Depends(get_current_user),
 ):
-    """Execute a previously saved query by its slug."""
-    saved = db.query(SavedQuery).filter(SavedQuery.slug == slug).first()
+    """
+    Execute a previously saved query by its slug.
+    Rows are streamed from a server-side cursor, so memory stays bounded
+    regardless of result size. Use ?format=ndjson for one row per line.
+    """
+    saved = (
+        await db.execute(select(SavedQuery).where(SavedQuery.slug == slug).limit(1))
+    ).scalars().first()
     if not saved:
         raise HTTPException(status_code=404, detail="Saved query not found")
 
-    # Execute the saved SQL
-    execution_result = await run_in_threadpool(
-        sql_executor.execute_query, saved.sql_query
+    # Validate and start the query before any bytes are sent, so errors keep their status code
+    stream_result = await run_in_threadpool(
+        sql_executor.stream_query,
+        saved.sql_query,
+        str(current_user.id),
+        settings.SQL_STREAM_BATCH_SIZE,
     )
 
-    if "error" in execution_result:
+    if "error" in stream_result:
         raise HTTPException(
-            status_code=500, detail=f"Execution error: {execution_result['error']}"
+            status_code=500, detail=f"Execution error: {stream_result['error']}"
         )
 
-    return {
-        "name": saved.name,
-        "data": execution_result["data"],
-        "count": len(execution_result["data"]),
-    }
+    # Runs after the response ends, including on client disconnect, so an
+    # abandoned stream releases its session and server-side cursor
+    return StreamingResponse(
+        _stream_saved_query_body(
+            saved.name, stream_result["columns"], stream_result["batches"], format
+        ),
+        media_type="application/x-ndjson" if format == "ndjson" else "application/json",
+        background=BackgroundTask(stream_result["batches"].close),
+    )
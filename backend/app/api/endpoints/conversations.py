@@ -1,51 +1,71 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.core.db import get_db
+from app.core.db import get_async_db
 from app.models.profile_models import Users, Conversations
 from app.schemas.conversation import ConversationCreate, ConversationUpdate, ConversationResponse
 from app.core.security import get_current_user
 
 router = APIRouter()
 
+
+async def _get_user_conversation(db: AsyncSession, conversation_id: int, user_id) -> Conversations:
+    """Load one of the user's conversations or raise 404"""
+    result = await db.execute(
+        select(Conversations).where(
+            Conversations.id == conversation_id,
+            Conversations.user_id == user_id
+        )
+    )
+    conversation = result.scalars().first()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+
+async def _update_chat_count(db: AsyncSession, current_user: Users):
+    """Update user's chat count"""
+    current_user.stats_chat_count = await db.scalar(
+        select(func.count()).select_from(Conversations).where(
+            Conversations.user_id == current_user.id
+        )
+    )
+    await db.commit()
+
+
 @router.get("/", response_model=List[ConversationResponse])
 async def get_conversations(
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all conversations for the current user"""
-    conversations = db.query(Conversations).filter(
-        Conversations.user_id == current_user.id
-    ).order_by(Conversations.updated_at.desc()).all()
-    return conversations
+    result = await db.execute(
+        select(Conversations)
+        .where(Conversations.user_id == current_user.id)
+        .order_by(Conversations.updated_at.desc())
+    )
+    return result.scalars().all()
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific conversation"""
-    conversation = db.query(Conversations).filter(
-        Conversations.id == conversation_id,
-        Conversations.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    return conversation
+    return await _get_user_conversation(db, conversation_id, current_user.id)
 
 @router.post("/", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
     conversation: ConversationCreate,
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new conversation"""
     # Convert Pydantic models to dicts for JSON storage
     messages_data = [msg.dict() for msg in conversation.messages]
-    
+
     db_conversation = Conversations(
         user_id=current_user.id,
         title=conversation.title,
@@ -53,15 +73,11 @@ async def create_conversation(
         message_count=len(messages_data)
     )
     db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
-    
-    # Update user's chat count
-    current_user.stats_chat_count = db.query(Conversations).filter(
-        Conversations.user_id == current_user.id
-    ).count()
-    db.commit()
-    
+    await db.commit()
+    await db.refresh(db_conversation)
+
+    await _update_chat_count(db, current_user)
+
     return db_conversation
 
 @router.put("/{conversation_id}", response_model=ConversationResponse)
@@ -69,51 +85,35 @@ async def update_conversation(
     conversation_id: int,
     conversation: ConversationUpdate,
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing conversation"""
-    db_conversation = db.query(Conversations).filter(
-        Conversations.id == conversation_id,
-        Conversations.user_id == current_user.id
-    ).first()
-    
-    if not db_conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
+    db_conversation = await _get_user_conversation(db, conversation_id, current_user.id)
+
     if conversation.title is not None:
         db_conversation.title = conversation.title
-    
+
     if conversation.messages is not None:
         messages_data = [msg.dict() for msg in conversation.messages]
         db_conversation.messages = messages_data
         db_conversation.message_count = len(messages_data)
-    
-    db.commit()
-    db.refresh(db_conversation)
+
+    await db.commit()
+    await db.refresh(db_conversation)
     return db_conversation
 
 @router.delete("/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_conversation(
     conversation_id: int,
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a conversation"""
-    db_conversation = db.query(Conversations).filter(
-        Conversations.id == conversation_id,
-        Conversations.user_id == current_user.id
-    ).first()
-    
-    if not db_conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    db.delete(db_conversation)
-    db.commit()
-    
-    # Update user's chat count
-    current_user.stats_chat_count = db.query(Conversations).filter(
-        Conversations.user_id == current_user.id
-    ).count()
-    db.commit()
-    
+    db_conversation = await _get_user_conversation(db, conversation_id, current_user.id)
+
+    await db.delete(db_conversation)
+    await db.commit()
+
+    await _update_chat_count(db, current_user)
+
     return None
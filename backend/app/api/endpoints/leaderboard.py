@@ -1,23 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.core.db import get_db
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.core.db import get_db, get_async_db
 from app.core.security import get_current_user, RoleChecker
 from app.models.profile_models import Users, UserAcademics, Colleges, Departments
 from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.leaderboard_store import leaderboard_store, CATEGORIES
+import json
 
 router = APIRouter()
+logger = get_logger("leaderboard")
+
+async def _get_user_academics(db: AsyncSession, user_id) -> UserAcademics:
+    result = await db.execute(
+        select(UserAcademics).where(UserAcademics.user_id == user_id).limit(1)
+    )
+    return result.scalars().first()
+
 
 @router.post("/analytics/leaderboard")
 async def get_leaderboard(
     filter_data: dict,
+    response: Response,
     current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get Leaderboard Data with weighted scoring.
     Filters: college_id (mandatory), department_id, batch_id, section_id, course_id.
-    Logic: Aggregate marks from college-specific result tables.
+    Paging (non-students): page_size, cursor (from the X-Next-Cursor response header).
+    Logic: Served from the precomputed per-college board (see leaderboard_store).
     """
     college_id = filter_data.get("college_id")
     department_id = filter_data.get("department_id")
@@ -26,29 +41,39 @@ async def get_leaderboard(
     course_id = filter_data.get("course_id")
     category = filter_data.get("category", "all") # 'mcq', 'coding', or 'all'
     
-    # DEBUG: Log incoming filter data
-    with open("leaderboard_request_log.txt", "a", encoding="utf-8") as f:
-        import json
-        f.write(f"\n=== New Request ===\n")
-        f.write(f"User: {current_user.id}, Role: {current_user.role}\n")
-        f.write(f"Filters: {json.dumps(filter_data, indent=2)}\n")
+    # DEBUG: Log incoming filter data (logs/leaderboard_request_log.txt)
+    logger.debug(
+        f"Request | User: {current_user.id}, Role: {current_user.role} | "
+        f"Filters: {json.dumps(filter_data, default=str)}"
+    )
     
-    # Role-based limit: Students see top 10 + their rank, Admins see all
+    # Role-based limit: Students see top 10 + their rank, others page through the board
     if current_user.role == 7:  # Student
         limit = 10
-    else:  # Admin (Role 2) or Super Admin (Role 1)
-        limit = 999999  # Effectively show all results
+        cursor = None
+    else:
+        try:
+            limit = int(filter_data.get("page_size") or settings.LEADERBOARD_PAGE_SIZE)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid page_size")
+        limit = max(1, min(limit, settings.LEADERBOARD_MAX_PAGE_SIZE))
+        cursor = filter_data.get("cursor")
+
+    user_academic = None
+    if not college_id or current_user.role == 7:
+        user_academic = await _get_user_academics(db, current_user.id)
 
     if not college_id:
         # Default to current user's college
-        user_academic = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
         if user_academic and user_academic.college_id:
             college_id = user_academic.college_id
         else:
              raise HTTPException(status_code=400, detail="College ID is required")
 
     # 1. Get College Short Name for Table Lookup
-    college = db.query(Colleges).filter(Colleges.id == college_id).first()
+    college = (
+        await db.execute(select(Colleges).where(Colleges.id == college_id).limit(1))
+    ).scalars().first()
     if not college:
         raise HTTPException(status_code=404, detail="College not found")
     
@@ -56,179 +81,105 @@ async def get_leaderboard(
 
     # Security: Ensure Student can only view their own college
     if current_user.role == 7:
-        user_acad = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
-        if user_acad and user_acad.college_id != int(college_id):
+        if user_academic and user_academic.college_id != int(college_id):
             raise HTTPException(status_code=403, detail="Access denied to other college leaderboard")
 
-    # 2. Identify Result Tables
-    # We look for tables starting with college_code and ending with _coding_result or _mcq_result
-    semesters = ["2025_1", "2025_2", "2026_1", "2026_2"]
-    
-    tables_to_query = []
-    
-    for sem in semesters:
-        current_tables = []
-        if category in ["all", "coding"]:
-            current_tables.append(f"{college_code}_{sem}_coding_result")
-        if category in ["all", "mcq"]:
-            current_tables.append(f"{college_code}_{sem}_mcq_result")
-        
-        tables_to_query.extend(current_tables)
-
-    # 3. Build the Big Aggregation Query
-    # We need to UNION ALL these tables, then join with users and user_academics for filtering.
-    
-    union_parts = []
-    for table in tables_to_query:
-        # We check if table exists by trying to select from it. 
-        # In SQL, we can't easily check existence inside a query without dynamic SQL or stored procs.
-        # Better: Query information_schema.tables
-        check_sql = text(f"SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = '{settings.DB_NAME}' AND table_name = '{table}'")
-        result = db.execute(check_sql).scalar()
-        if result > 0:
-            # Check for course_allocation_id column to enable course-specific filtering
-            check_col_sql = text(f"SELECT COUNT(*) FROM information_schema.columns WHERE table_schema = '{settings.DB_NAME}' AND table_name = '{table}' AND column_name = 'course_allocation_id'")
-            has_course_col = db.execute(check_col_sql).scalar() > 0
-            
-            # Pre-aggregate in the UNION to reduce rows for the main sort
-            col_select = "course_allocation_id" if has_course_col else "NULL"
-            group_by = "GROUP BY user_id, course_allocation_id" if has_course_col else "GROUP BY user_id"
-            
-            union_parts.append(f"""
-                SELECT 
-                    user_id, 
-                    SUM(mark) as sub_mark, 
-                    COUNT(*) as sub_attempts,
-                    SUM(CASE WHEN solve_status = 2 THEN 1 ELSE 0 END) as sub_solved,
-                    {col_select} as course_allocation_id
-                FROM {table}
-                WHERE status = 1
-                {group_by}
-            """)
+    if category not in CATEGORIES:
+        return []
 
-    if not union_parts:
-         return [] # No data found for this college
+    # Students can't narrow by batch/section
+    if current_user.role == 7:
+        batch_id = section_id = None
 
-    union_query = " UNION ALL ".join(union_parts)
+    try:
+        # Course filtering uses enrollment (course_wise_segregations), since
+        # course_allocation_id in result tables may be unreliable/corrupted
+        if course_id and current_user.role == 7:
+            members = await run_in_threadpool(leaderboard_store.course_members, int(course_id))
+            if current_user.id not in members:
+                raise HTTPException(status_code=403, detail="You are not enrolled in this course")
 
-    # Main Query using Window Functions for Ranking
-    # 1. user_stats: Aggregate raw data from pre-aggregated subqueries
-    # 2. scored_stats: Calculate WPI Score
-    
-    filters = []
-    params = {"college_id": college_id, "limit": limit}
-    
-    # Base College Filter
-    filters.append("ua.college_id = :college_id")
-    
-    if department_id:
-        filters.append("ua.department_id = :department_id")
-        params["department_id"] = department_id
-        
-    if current_user.role != 7:
-        if batch_id:
-            filters.append("ua.batch_id = :batch_id")
-            params["batch_id"] = batch_id
-            
-        if section_id:
-            filters.append("ua.section_id = :section_id")
-            params["section_id"] = section_id
+        # 2. Serve from the precomputed board (built/refreshed from the result tables as needed)
+        page = await run_in_threadpool(
+            leaderboard_store.page,
+            college_id=int(college_id),
+            college_code=college_code,
+            category=category,
+            department_id=department_id,
+            batch_id=batch_id,
+            section_id=section_id,
+            course_id=course_id,
+            limit=limit,
+            cursor=cursor,
+            user_id=current_user.id,
+        )
+    except HTTPException:
+        raise
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor or filter value")
+    except Exception as e:
+        logger.error(f"Leaderboard Query Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # Course Filtering Logic
-    # Note: course_allocation_id in result tables may be unreliable/corrupted
-    # Instead, we filter by ensuring users are enrolled in the selected course
-    if course_id:
-        if current_user.role == 7:
-            # Verify student is enrolled
-            student_segment = db.execute(
-                text("SELECT batch_id FROM course_wise_segregations WHERE user_id = :uid AND course_id = :cid LIMIT 1"), 
-                {"uid": current_user.id, "cid": course_id}
-            ).fetchone()
-            
-            if not student_segment:
-                raise HTTPException(status_code=403, detail="You are not enrolled in this course")
+    rows = page["rows"]
+    # Always include the current user's own rank on the first page
+    user_row = page["user_row"]
+    if cursor is None and user_row and all(r["user_id"] != user_row["user_id"] for r in rows):
+        rows = rows + [user_row]
 
-        # Filter to only show users enrolled in this specific course
-        # We do this by checking if user_id exists in course_wise_segregations for this course
-        params["course_id"] = course_id
-        filters.append("u.id IN (SELECT user_id FROM course_wise_segregations WHERE course_id = :course_id)")
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    response.headers["X-Total-Count"] = str(page["total"])
 
-    where_clause = " AND ".join(filters)
-    
-    params["current_user_id"] = current_user.id
+    leaderboard = []
+    for row in rows:
+        leaderboard.append({
+            "rank": row["rank"],
+            "student_name": row["student_name"],
+            "is_current_user": row["user_id"] == current_user.id,
+            "avatar_seed": row["student_name"],
+            "metrics": {
+                "score": round(row["wpi_score"], 2),
+                "total_marks": row["total_marks"],
+                "questions_attended": row["total_attempts"],
+                "accuracy": f"{round(row['accuracy'] or 0, 1)}%"
+            }
+        })
+        
+    return leaderboard
 
-    final_sql = f"""
-    WITH combined_results AS (
-        {union_query}
-    ),
-    user_stats AS (
-        SELECT 
-            u.id as user_id,
-            u.name as student_name,
-            SUM(sub_mark) as total_marks,
-            SUM(sub_attempts) as total_attempts,
-            SUM(sub_solved) as solved_count,
-            (SUM(sub_solved) * 100.0 / NULLIF(SUM(sub_attempts), 0)) as accuracy
-        FROM combined_results
-        JOIN users u ON combined_results.user_id = u.id
-        JOIN user_academics ua ON u.id = ua.user_id
-        WHERE {where_clause}
-        GROUP BY u.id, u.name
-    ),
-    scored_stats AS (
-        SELECT 
-            *,
-            (total_marks * 0.7) + (COALESCE(accuracy, 0) * 0.2) + (total_attempts * 0.1) as wpi_score
-        FROM user_stats
-    ),
-    ranked_stats AS (
-        SELECT 
-            *,
-            ROW_NUMBER() OVER (ORDER BY wpi_score DESC, total_marks DESC) as student_rank
-        FROM scored_stats
-    )
-    SELECT * FROM ranked_stats
-    WHERE student_rank <= :limit OR user_id = :current_user_id
-    ORDER BY student_rank ASC
+@router.post("/analytics/leaderboard/refresh")
+def refresh_leaderboard(
+    college_id: int,
+    full: bool = False,
+    current_user: Users = Depends(RoleChecker([1, 2]))
+):
+    """
+    Refresh a college's precomputed leaderboard now (e.g. after a bulk result import).
+    full=true also re-reads every user profile and drops deleted results.
     """
-    
     try:
-        result = db.execute(text(final_sql), params).fetchall()
-        
-        leaderboard = []
-        for row in result:
-            leaderboard.append({
-                "rank": row.student_rank,
-                "student_name": row.student_name,
-                "is_current_user": row.user_id == current_user.id,
-                "avatar_seed": row.student_name,
-                "metrics": {
-                    "score": round(row.wpi_score, 2),
-                    "total_marks": row.total_marks,
-                    "questions_attended": row.total_attempts,
-                    "accuracy": f"{round(row.accuracy or 0, 1)}%"
-                }
-            })
-            
-        return leaderboard
-        
+        refreshed = leaderboard_store.refresh(college_id, full=full)
     except Exception as e:
-        print(f"Leaderboard Query Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Refresh failed: {e}")
+    return {"college_id": college_id, "refreshed": refreshed, "full": full}
 
 @router.get("/analytics/leaderboard/courses")
 async def get_college_courses(
     college_id: int = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Users = Depends(get_current_user)
 ):
     """
     Get list of courses available in a college.
     """
     
+    user_academic = None
+    if not college_id or current_user.role == 7:
+        user_academic = await _get_user_academics(db, current_user.id)
+
     if not college_id:
          # Default to current user's college
-        user_academic = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
         if user_academic and user_academic.college_id:
             college_id = user_academic.college_id
         else:
@@ -236,7 +187,6 @@ async def get_college_courses(
 
     # Enforce same college for students and filter by enrolled courses
     if current_user.role == 7: # Student
-        user_academic = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
         if not user_academic or user_academic.college_id != college_id:
              raise HTTPException(status_code=403, detail="Access denied to other college data")
 
@@ -264,7 +214,7 @@ async def get_college_courses(
         params = {"college_id": int(college_id)}
 
     try:
-        result = db.execute(query, params).fetchall()
+        result = (await db.execute(query, params)).fetchall()
         
         courses = []
         for row in result:
@@ -276,7 +226,7 @@ async def get_college_courses(
         return courses
         
     except Exception as e:
-        print(f"Error fetching courses: {e}")
+        logger.error(f"Error fetching courses: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/leaderboard/colleges")
@@ -297,8 +247,7 @@ def get_leaderboard_metadata(
     db: Session = Depends(get_db),
     current_user: Users = Depends(RoleChecker([1, 2]))
 ):
-    with open("debug_log.txt", "a") as f:
-        f.write(f"Metadata Request: college_id={college_id}, Role={current_user.role}\n")
+    logger.debug(f"Metadata Request: college_id={college_id}, Role={current_user.role}")
     if not college_id:
         user_acad = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
         if user_acad and user_acad.college_id:
@@ -349,26 +298,3 @@ def get_leaderboard_metadata(
         "batches": [{"id": row.id, "name": row.batch_name} for row in batches],
         "sections": [{"id": row.id, "name": row.section_name} for row in sections]
     }
-
-@router.get("/analytics/leaderboard/courses")
-def get_leaderboard_courses(
-    college_id: int = None,
-    db: Session = Depends(get_db),
-    current_user: Users = Depends(get_current_user)
-):
-    if not college_id:
-        if current_user.role == 1:
-            return [] # SuperAdmin needs to select college first
-            
-        user_acad = db.query(UserAcademics).filter(UserAcademics.user_id == current_user.id).first()
-        if user_acad and user_acad.college_id:
-            college_id = user_acad.college_id
-        else:
-            raise HTTPException(status_code=400, detail="College ID required")
-
-    # Fetch courses for this college
-    courses = db.query(Courses).join(CourseAcademicMaps, Courses.id == CourseAcademicMaps.course_id)\
-                .filter(CourseAcademicMaps.college_id == college_id)\
-                .distinct().all()
-    
-    return [{"id": c.id, "title": c.course_name} for c in courses]
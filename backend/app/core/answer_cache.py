@@ -0,0 +1,171 @@
+"""
+Answer Cache
+Question-level cache in front of the AI pipeline (analysis -> SQL -> synthesis).
+Stores the verified SQL and synthesized answer so repeat questions skip the LLM.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import json
+import re
+import threading
+import time
+
+from app.core.config import settings
+
+# Questions about "me" / "my ..." depend on the asking user, not just the scope
+_PERSONAL_PATTERN = re.compile(r"\b(my|me|mine|myself|i|am i)\b")
+
+
+class AnswerCache:
+    """
+    In-memory TTL + LRU cache keyed on normalized question, role and scope.
+    Format: {key: {"sql", "answer", "follow_ups", "data_fingerprint", ...}}
+    """
+
+    def __init__(self, ttl_seconds: int = 600, max_entries: int = 500):
+        self.cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, drop punctuation (keeping c++/c#) and collapse whitespace"""
+        q = question.lower().strip()
+        q = re.sub(r"[^\w\s\+#]", " ", q)
+        return re.sub(r"\s+", " ", q).strip()
+
+    @classmethod
+    def make_key(
+        cls,
+        question: str,
+        role_id: int,
+        user_id: str = None,
+        college_id=None,
+        department_id=None,
+        batch_id=None,
+        section_id=None,
+    ) -> str:
+        """Build cache key from the question and the role/scope it was answered in"""
+        normalized = cls.normalize_question(question)
+        # Personal questions are only shareable with the same user
+        owner = user_id if cls.is_personal(question, role_id) else "*"
+        combined = (
+            f"{normalized}|r:{role_id}|u:{owner}|c:{college_id}|d:{department_id}"
+            f"|b:{batch_id}|s:{section_id}"
+        )
+        return hashlib.md5(combined.encode()).hexdigest()
+
+    @classmethod
+    def is_personal(cls, question: str, role_id: int) -> bool:
+        """
+        True if the answer belongs to the asking user: the question is about
+        "me"/"my", or the role's prompt filters every query by the user id
+        """
+        if role_id in settings.ANSWER_CACHE_PER_USER_ROLES:
+            return True
+        return bool(_PERSONAL_PATTERN.search(cls.normalize_question(question)))
+
+    @staticmethod
+    def references_user(sql: str, user_id) -> bool:
+        """True if the SQL filters an id column by this user id (user_id = 42, u.id = '42')"""
+        if not sql or user_id in (None, ""):
+            return False
+        pattern = rf"\b\w*id`?\s*=\s*['\"]?{re.escape(str(user_id))}['\"]?(?![\w.])"
+        return re.search(pattern, sql, re.IGNORECASE) is not None
+
+    @staticmethod
+    def data_fingerprint(data) -> str:
+        """Stable hash of a result set, used to decide if a cached answer is still valid"""
+        payload = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.md5(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Get cached entry if present and not expired (marks it most recently used)"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry["stored_at"] >= self.ttl_seconds:
+                del self.cache[key]
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(
+        self,
+        key: str,
+        sql: str,
+        answer: str,
+        follow_ups: list,
+        data,
+        attempt_count: int = 1,
+        params: dict = None,
+    ):
+        """Store a successfully answered question (params: bind parameters of a SQL template)"""
+        with self._lock:
+            self.cache[key] = {
+                "sql": sql,
+                "params": params,
+                "answer": answer,
+                "follow_ups": follow_ups,
+                "data_fingerprint": self.data_fingerprint(data),
+                "attempt_count": attempt_count,
+                "stored_at": time.time(),
+            }
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+    def update_answer(self, key: str, answer: str, follow_ups: list, data):
+        """Refresh the stored answer after the cached SQL returned new data"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return
+            entry["answer"] = answer
+            entry["follow_ups"] = follow_ups
+            entry["data_fingerprint"] = self.data_fingerprint(data)
+
+    def invalidate(self, key: str):
+        """Drop a single entry (e.g. its SQL stopped working)"""
+        with self._lock:
+            if self.cache.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_all(self):
+        """Drop every entry. Call whenever the database schema changes."""
+        with self._lock:
+            self.invalidations += len(self.cache)
+            self.cache.clear()
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "total_entries": len(self.cache),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Global singleton
+answer_cache = AnswerCache(
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
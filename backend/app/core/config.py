@@ -1,9 +1,14 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# backend/ (relative data file paths resolve here, not against the CWD)
+BACKEND_DIR = Path(__file__).parent.parent.parent
+
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI Application Backend"
     PROJECT_VERSION: str = "1.0.0"
@@ -16,6 +21,17 @@ class Settings(BaseSettings):
     DB_PASSWORD: str 
     DB_NAME: str 
 
+    # Connection pools (per worker, per engine): persistent size, burst overflow,
+    # seconds to wait for a free connection, recycle age, and how many TLS
+    # connections to open at startup
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 3600
+    DB_ASYNC_POOL_SIZE: int = 10
+    DB_ASYNC_MAX_OVERFLOW: int = 10
+    DB_POOL_WARM_CONNECTIONS: int = 3
+
     # API Keys (Required in production, no defaults)
     GROQ_API_KEY: Optional[str] = None
     DEEPSEEK_API_KEY: Optional[str] = None
@@ -29,6 +45,119 @@ class Settings(BaseSettings):
     MAX_TOKEN_LIMIT: int = 32000
     AI_MAX_OUTPUT_TOKENS: int = 8000
 
+    # Question-level answer cache (skips LLM stages for repeat questions)
+    ANSWER_CACHE_TTL_SECONDS: int = 600
+    ANSWER_CACHE_MAX_ENTRIES: int = 500
+    # Roles whose prompt filters every query by the asking user's id (students);
+    # their answers are cached and coalesced per user, never per scope
+    ANSWER_CACHE_PER_USER_ROLES: list[int] = [7]
+
+    # SQL result cache (LRU bounded by entry count and approximate size)
+    QUERY_CACHE_TTL_SECONDS: int = 300
+    QUERY_CACHE_MAX_ENTRIES: int = 1000
+    QUERY_CACHE_MAX_MB: int = 64
+    QUERY_CACHE_MAX_ENTRY_MB: int = 8
+    # Per-table-class TTLs: reference data changes rarely, result tables constantly
+    QUERY_CACHE_STATIC_TABLES: list[str] = [
+        "colleges",
+        "departments",
+        "batches",
+        "sections",
+        "courses",
+        "topics",
+    ]
+    QUERY_CACHE_STATIC_TTL_SECONDS: int = 3600
+    QUERY_CACHE_HOT_TABLE_PATTERNS: list[str] = ["*_coding_result", "*_mcq_result"]
+    QUERY_CACHE_HOT_TTL_SECONDS: int = 60
+
+    # Token budget for the per-request table schema section of the SQL prompt
+    SCHEMA_PROMPT_TOKEN_BUDGET: int = 6000
+
+    # Lexical (BM25) table retrieval in place of the schema analysis LLM call;
+    # below these thresholds the LLM analysis picks the tables instead
+    TABLE_RETRIEVAL_ENABLED: bool = True
+    TABLE_RETRIEVAL_TOP_K: int = 6
+    TABLE_RETRIEVAL_MIN_SCORE: float = 4.0
+    TABLE_RETRIEVAL_MIN_COVERAGE: float = 0.6
+
+    # Per-query time budget by estimated complexity (MAX_EXECUTION_TIME hint),
+    # plus the grace period before the client issues KILL QUERY itself
+    SQL_TIMEOUT_SECONDS: dict[str, float] = {"LOW": 5, "MEDIUM": 10, "HIGH": 15, "VERY_HIGH": 20}
+    SQL_TIMEOUT_KILL_GRACE_SECONDS: float = 2.0
+
+    # EXPLAIN cost gate for generated SQL: reject plans estimated to produce/read
+    # more rows than this, or to full-scan a table larger than this
+    SQL_COST_GATE_ENABLED: bool = True
+    SQL_COST_MAX_EST_ROWS: int = 10_000_000
+    SQL_COST_MAX_FULL_SCAN_ROWS: int = 2_000_000
+
+    # Rows fetched per round trip when streaming saved-query results
+    SQL_STREAM_BATCH_SIZE: int = 500
+
+    # Job store for /ask/async results and /save-query handoff ("sqlite" or "memory");
+    # relative paths here and in RATE_LIMIT_PATH are resolved against backend/
+    JOB_STORE_BACKEND: str = "sqlite"
+    JOB_STORE_PATH: str = "data/job_store.sqlite3"
+    JOB_STORE_TTL_SECONDS: int = 3600
+    JOB_STORE_MAX_ENTRIES: int = 5000
+
+    # Rate limiting on the /ask endpoints (sliding-window counter, per role)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "sqlite"  # "sqlite" (shared across workers) or "memory"
+    RATE_LIMIT_PATH: str = "data/rate_limit.sqlite3"
+    RATE_LIMIT_WINDOW_SECONDS: int = 60
+    RATE_LIMIT_DEFAULT_PER_MINUTE: int = 20
+    # role_id -> requests per window (1/2 Admin, 3 College Admin, 4 Staff, 5 Trainer, 6 Content, 7 Student)
+    RATE_LIMIT_ROLE_LIMITS: dict[int, int] = {1: 120, 2: 120, 3: 60, 4: 60, 5: 60, 6: 60, 7: 20}
+    RATE_LIMIT_SWEEP_INTERVAL_SECONDS: int = 120
+    # Per-client-IP floor applied to every request (campus NATs share one IP),
+    # how many X-Forwarded-For entries our own proxies append (Render: 1), and
+    # how long a user's DB role is cached for tier selection
+    RATE_LIMIT_IP_PER_MINUTE: int = 300
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: int = 1
+    RATE_LIMIT_ROLE_CACHE_SECONDS: int = 300
+    RATE_LIMIT_PATHS: list[str] = [
+        "/api/v1/ai/ask",
+        "/api/v1/ai/ask/async",
+        "/api/v1/ai/ask/stream",
+    ]
+
+    # Result table catalog (per-college result tables + columns) refresh interval
+    RESULT_CATALOG_REFRESH_SECONDS: int = 600
+
+    # Materialized leaderboards (per worker): incremental refresh interval,
+    # full rebuild interval, and page sizes for admin/staff listings
+    LEADERBOARD_REFRESH_SECONDS: int = 60
+    LEADERBOARD_FULL_REBUILD_SECONDS: int = 3600
+    LEADERBOARD_BACKGROUND_REFRESH: bool = True
+    LEADERBOARD_PAGE_SIZE: int = 100
+    LEADERBOARD_MAX_PAGE_SIZE: int = 1000
+
+    # Logging: messages longer than this are truncated; fraction of large
+    # payloads (prompts, full SQL) written by log_payload()
+    LOG_MAX_MESSAGE_CHARS: int = 4000
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.1
+
+    # LLM usage accounting (JSONL per day, dir relative to backend/) and pricing
+    # in USD per million tokens
+    USAGE_LOG_DIR: str = "logs/usage"
+    LLM_PRICING: dict[str, dict[str, float]] = {
+        "deepseek-chat": {"input": 0.27, "cached_input": 0.07, "output": 1.10},
+        "deepseek-reasoner": {"input": 0.55, "cached_input": 0.14, "output": 2.19},
+    }
+
+    # Async DeepSeek client (shared connection pool + per-worker concurrency cap).
+    # The cap defaults to the pool size, so a call holding a slot never queues
+    # again inside httpx for a connection
+    AI_MAX_CONCURRENCY: Optional[int] = None
+    AI_HTTP_MAX_CONNECTIONS: int = 32
+    AI_HTTP_MAX_KEEPALIVE: int = 16
+    AI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    AI_TIMEOUT_ANALYSIS_SECONDS: float = 30.0
+    AI_TIMEOUT_SQL_SECONDS: float = 60.0
+    AI_TIMEOUT_SYNTHESIS_SECONDS: float = 60.0
+    AI_TIMEOUT_FOLLOW_UPS_SECONDS: float = 15.0
+
     # Frontend Bearer Token (Long-lived) - MUST be set in environment variables
     FRONTEND_BEARER_TOKEN: Optional[str] = None
 
@@ -54,6 +183,17 @@ class Settings(BaseSettings):
             return f"mysql+pymysql://{self.DB_USER}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         return f"mysql+pymysql://{self.DB_USER}:{quote_plus(self.DB_PASSWORD)}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        # Same database through the aiomysql driver (SQLAlchemy asyncio)
+        return self.DATABASE_URL.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+
+    @model_validator(mode="after")
+    def _default_ai_concurrency(self):
+        if not self.AI_MAX_CONCURRENCY:
+            self.AI_MAX_CONCURRENCY = self.AI_HTTP_MAX_CONNECTIONS
+        return self
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
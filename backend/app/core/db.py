@@ -1,11 +1,52 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.core.metrics import (
+    DB_POOL_WAIT,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_SIZE,
+    DB_POOL_OVERFLOW,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_CONNECTIONS,
+)
+
+import asyncio
+import time
 
 import os
+import ssl
 import certifi
 
+logger = get_logger("db")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time and exhaustion timeouts"""
+
+    pool_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc(pool=self.pool_label)
+            logger.warning(f"⚠️ {self.pool_label} DB pool exhausted: {self.status()}")
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, pool=self.pool_label)
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Same checkout timing for the asyncio engine's pool"""
+
+    pool_label = "async"
+
+
 # Create database engine
 connect_args = {}
 # TiDB Cloud requires SSL. 
@@ -21,21 +62,129 @@ else:
 # Add connection timeout
 connect_args["connect_timeout"] = 10
 
+# aiomysql takes an SSLContext rather than PyMySQL's ssl dict
+async_connect_args = {
+    "ssl": ssl.create_default_context(cafile=connect_args["ssl"]["ca"]),
+    "connect_timeout": 10,
+}
+
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args=connect_args,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
     pool_pre_ping=True,
-    pool_recycle=3600,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
     echo=False
 )
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request path (aiomysql). The sync engine stays for
+# scripts, background threads and code run in the threadpool.
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    connect_args=async_connect_args,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.DB_ASYNC_POOL_SIZE,
+    max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    echo=False
+)
+
+# expire_on_commit=False: objects stay readable after commit without a lazy (blocking) refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Create Base class for models
 Base = declarative_base()
 
 
+# ─────────────────────────────────────────────
+# Pool monitoring and warm-up
+# ─────────────────────────────────────────────
+
+def _instrument_pool(pool, label: str):
+    """Expose pool size/usage gauges and count connection lifecycle events"""
+    DB_POOL_SIZE.set_function(pool.size, pool=label)
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout, pool=label)
+    DB_POOL_OVERFLOW.set_function(pool.overflow, pool=label)
+
+    @event.listens_for(pool, "connect")
+    def receive_connect(dbapi_conn, connection_record):
+        DB_POOL_CONNECTIONS.inc(pool=label, event="connect")
+
+    @event.listens_for(pool, "invalidate")
+    def receive_invalidate(dbapi_conn, connection_record, exception):
+        DB_POOL_CONNECTIONS.inc(pool=label, event="invalidate")
+        logger.warning(f"⚠️ {label} DB connection invalidated: {exception}")
+
+
+_instrument_pool(engine.pool, "sync")
+_instrument_pool(async_engine.sync_engine.pool, "async")
+
+
+def pool_stats() -> dict:
+    """Current size/usage of both pools (for /metrics)"""
+    timeouts = DB_POOL_TIMEOUTS.values()
+    stats = {}
+    for label, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        stats[label] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeouts": int(timeouts.get((label,), 0)),
+        }
+    return stats
+
+
+def warm_pool(count: int) -> int:
+    """Open up to `count` sync connections (TLS handshake included) and return them to the pool"""
+    conns = []
+    try:
+        for _ in range(min(count, settings.DB_POOL_SIZE)):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+async def _open_async_connection():
+    conn = await async_engine.connect()
+    try:
+        await conn.exec_driver_sql("SELECT 1")
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
+async def warm_async_pool(count: int) -> int:
+    """Open up to `count` async connections concurrently and return them to the pool"""
+    results = await asyncio.gather(
+        *(_open_async_connection() for _ in range(min(count, settings.DB_ASYNC_POOL_SIZE))),
+        return_exceptions=True,
+    )
+    conns = [r for r in results if not isinstance(r, BaseException)]
+    for conn in conns:
+        await conn.close()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors and not conns:
+        raise errors[0]
+    return len(conns)
+
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
@@ -43,3 +192,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
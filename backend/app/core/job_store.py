@@ -0,0 +1,208 @@
+"""
+Job Store
+Holds /ask/async job state and the SQL handed off to /save-query.
+Entries expire after a TTL and the store is capped in size.
+
+Backends:
+- sqlite: a WAL-mode file shared by every worker on the host (default)
+- memory: per-process only, for single-worker/dev runs
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import BACKEND_DIR, settings
+from app.core.logging_config import get_logger
+
+logger = get_logger("job_store")
+
+
+class JobStore:
+    """Interface shared by the job store backends"""
+
+    backend = "base"
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job record, or None if missing/expired"""
+        raise NotImplementedError
+
+    def set(self, job_id: str, record: Dict):
+        """Create or replace a job record"""
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """Number of stored (possibly not yet swept) jobs"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        """Get store statistics"""
+        return {
+            "backend": self.backend,
+            "total_entries": self.size(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryJobStore(JobStore):
+    """In-process TTL + size-bounded store (not shared between workers)"""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 5000):
+        super().__init__(ttl_seconds, max_entries)
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            item = self.jobs.get(job_id)
+            if item is None:
+                return None
+            stored_at, record = item
+            if time.time() - stored_at >= self.ttl_seconds:
+                del self.jobs[job_id]
+                self.evictions += 1
+                return None
+            return record
+
+    def set(self, job_id: str, record: Dict):
+        with self._lock:
+            self.jobs[job_id] = (time.time(), record)
+            self.jobs.move_to_end(job_id)
+            # Oldest first, so expired entries and overflow both pop from the front
+            now = time.time()
+            while self.jobs:
+                oldest_id, (stored_at, _) = next(iter(self.jobs.items()))
+                if (
+                    len(self.jobs) <= self.max_entries
+                    and now - stored_at < self.ttl_seconds
+                ):
+                    break
+                del self.jobs[oldest_id]
+                self.evictions += 1
+
+    def size(self) -> int:
+        return len(self.jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    File-backed store shared across gunicorn workers on the same host.
+    Records are stored as JSON; one connection per thread.
+    """
+
+    backend = "sqlite"
+
+    # Sweep expired/overflow rows every N writes rather than on every write
+    SWEEP_EVERY = 50
+
+    def __init__(self, path: str, ttl_seconds: int = 3600, max_entries: int = 5000):
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)"
+        )
+        logger.info(f"✅ Job store ready (sqlite: {self.path})")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT payload, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        payload, updated_at = row
+        if time.time() - updated_at >= self.ttl_seconds:
+            return None
+        return json.loads(payload)
+
+    def set(self, job_id: str, record: Dict):
+        payload = json.dumps(record, default=str)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (job_id, payload, updated_at) VALUES (?, ?, ?)",
+            (job_id, payload, time.time()),
+        )
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired rows, then the oldest rows beyond max_entries"""
+        try:
+            conn = self._conn()
+            expired = conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ?",
+                (time.time() - self.ttl_seconds,),
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM jobs WHERE job_id IN ("
+                " SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.evictions += expired + overflow
+        except sqlite3.Error as e:
+            logger.warning(f"Job store sweep failed: {e}")
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+def _create_job_store() -> JobStore:
+    if settings.JOB_STORE_BACKEND == "sqlite":
+        try:
+            return SQLiteJobStore(
+                str(BACKEND_DIR / settings.JOB_STORE_PATH),
+                ttl_seconds=settings.JOB_STORE_TTL_SECONDS,
+                max_entries=settings.JOB_STORE_MAX_ENTRIES,
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"SQLite job store unavailable, falling back to memory: {e}")
+    return MemoryJobStore(
+        ttl_seconds=settings.JOB_STORE_TTL_SECONDS,
+        max_entries=settings.JOB_STORE_MAX_ENTRIES,
+    )
+
+
+# Global singleton
+job_store = _create_job_store()
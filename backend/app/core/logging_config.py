@@ -1,23 +1,71 @@
 """
 Production-Grade Logging Configuration
 Provides structured logging with rotation, error tracking, and audit trails
+
+All file/console output goes through one QueueListener thread: loggers only
+get a QueueHandler, so request threads never block on disk I/O. Large
+messages (prompts, SQL) are capped, and bulky debug payloads can be sampled.
 """
 
 import logging
 import logging.handlers
-import os
-from datetime import datetime
+import atexit
+import queue
+import random
 from pathlib import Path
 
+from app.core.config import settings
+
 # Create logs directory if it doesn't exist
 LOGS_DIR = Path(__file__).parent.parent.parent / "logs"
 LOGS_DIR.mkdir(exist_ok=True)
 
+MAX_MESSAGE_CHARS = settings.LOG_MAX_MESSAGE_CHARS
+PAYLOAD_SAMPLE_RATE = settings.LOG_PAYLOAD_SAMPLE_RATE
+
+_log_queue = None
+_listener = None
+
+
+class CappedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that truncates oversized messages before enqueueing"""
+
+    def __init__(self, log_queue, max_chars: int = MAX_MESSAGE_CHARS):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        if isinstance(record.msg, str) and len(record.msg) > self.max_chars:
+            dropped = len(record.msg) - self.max_chars
+            record.msg = f"{record.msg[:self.max_chars]}... [truncated {dropped} chars]"
+        return record
+
+
+def _rotating(filename: str, max_mb: int, backups: int, level, formatter, only: str = None):
+    handler = logging.handlers.RotatingFileHandler(
+        LOGS_DIR / filename,
+        maxBytes=max_mb * 1024 * 1024,
+        backupCount=backups,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setLevel(level)
+    handler.setFormatter(formatter)
+    if only:
+        # The listener receives every logger's records; keep each file to its logger
+        handler.addFilter(logging.Filter(only))
+    return handler
+
 
 # Configure main application logger
 def setup_logging():
-    """Initialize production-grade logging"""
+    """Initialize production-grade logging (idempotent)"""
+    global _log_queue, _listener
     app_logger = logging.getLogger("ai_app")
+    if _log_queue is not None:
+        return app_logger
+
     app_logger.setLevel(logging.DEBUG)
 
     # Format for all handlers
@@ -26,50 +74,70 @@ def setup_logging():
         datefmt="%Y-%m-%d %H:%M:%S",
     )
 
-    # 1. INFO + WARNINGS -> application.log (rotating, 10MB)
-    info_handler = logging.handlers.RotatingFileHandler(
-        LOGS_DIR / "application.log", maxBytes=10 * 1024 * 1024, backupCount=5  # 10MB
-    )
-    info_handler.setLevel(logging.INFO)
-    info_handler.setFormatter(detailed_format)
-    app_logger.addHandler(info_handler)
-
-    # 2. ERRORS -> error.log (rotating, 10MB)
-    error_handler = logging.handlers.RotatingFileHandler(
-        LOGS_DIR / "error.log", maxBytes=10 * 1024 * 1024, backupCount=5
-    )
-    error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(detailed_format)
-    app_logger.addHandler(error_handler)
-
-    # 3. SQL QUERIES -> sql.log (rotating, 20MB) - For audit trail
-    sql_handler = logging.handlers.RotatingFileHandler(
-        LOGS_DIR / "sql.log", maxBytes=20 * 1024 * 1024, backupCount=10
-    )
-    sql_handler.setLevel(logging.DEBUG)
-    sql_handler.setFormatter(detailed_format)
-    sql_logger = logging.getLogger("sql_queries")
-    sql_logger.addHandler(sql_handler)
-
-    # 4. AI INTERACTIONS -> ai.log (rotating, 20MB)
-    ai_handler = logging.handlers.RotatingFileHandler(
-        LOGS_DIR / "ai.log", maxBytes=20 * 1024 * 1024, backupCount=10
-    )
-    ai_handler.setLevel(logging.DEBUG)
-    ai_handler.setFormatter(detailed_format)
-    ai_logger = logging.getLogger("ai_service")
-    ai_logger.addHandler(ai_handler)
-
     # 5. CONSOLE (INFO level only - avoid spam in production)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_formatter = logging.Formatter("%(levelname)s | %(name)s | %(message)s")
     console_handler.setFormatter(console_formatter)
-    app_logger.addHandler(console_handler)
+    console_handler.addFilter(logging.Filter("ai_app"))
+
+    handlers = [
+        # 1. INFO + WARNINGS -> application.log (rotating, 10MB)
+        _rotating("application.log", 10, 5, logging.INFO, detailed_format, only="ai_app"),
+        # 2. ERRORS -> error.log (rotating, 10MB)
+        _rotating("error.log", 10, 5, logging.ERROR, detailed_format, only="ai_app"),
+        # 3. SQL QUERIES -> sql.log (rotating, 20MB) - For audit trail
+        _rotating("sql.log", 20, 10, logging.DEBUG, detailed_format, only="sql_queries"),
+        # 4. AI INTERACTIONS -> ai.log (rotating, 20MB), incl. sampled prompts
+        _rotating("ai.log", 20, 10, logging.DEBUG, detailed_format, only="ai_service"),
+        # 6. Persistent pipeline failures -> debug_ai.log
+        _rotating("debug_ai.log", 10, 3, logging.DEBUG, detailed_format, only="ai_failures"),
+        # 7. Leaderboard request audit -> leaderboard_request_log.txt
+        _rotating("leaderboard_request_log.txt", 10, 3, logging.DEBUG, detailed_format, only="leaderboard"),
+        console_handler,
+    ]
+
+    # Single writer thread for every handler above
+    _log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        _log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+    for name in ("ai_app", "sql_queries", "ai_service", "ai_failures", "leaderboard"):
+        target = logging.getLogger(name)
+        target.setLevel(logging.DEBUG)
+        # Replace the handler left by an earlier setup/stop cycle
+        for handler in [h for h in target.handlers if isinstance(h, CappedQueueHandler)]:
+            target.removeHandler(handler)
+        target.addHandler(CappedQueueHandler(_log_queue))
+        target.propagate = False
 
     return app_logger
 
 
+def stop_logging():
+    """Flush queued records and stop the writer thread (safe to call more than once)"""
+    global _log_queue, _listener
+    listener, _listener = _listener, None
+    _log_queue = None
+    if listener is not None:
+        listener.stop()
+
+
+def log_payload(logger: logging.Logger, label: str, payload, sample_rate: float = None):
+    """
+    Log a large payload (prompt, SQL, result preview) at DEBUG. Only a sample
+    of calls is written, and the queue handler caps the message length.
+    """
+    rate = PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= rate:
+        return
+    text = payload if isinstance(payload, str) else str(payload)
+    logger.debug(f"{label} ({len(text)} chars): {text}")
+
+
 # Initialize on import
 logger = setup_logging()
 
@@ -0,0 +1,320 @@
+"""
+Metrics
+Minimal in-process counters, gauges and histograms with a Prometheus text
+exposition (format 0.0.4), so stage latency and token usage can be scraped
+without an extra dependency.
+
+Every series carries a `worker` label (the process id): each gunicorn worker
+keeps its own registry and Prometheus sees them as separate series.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Sequence, Tuple
+import os
+import threading
+import time
+
+_WORKER = str(os.getpid())
+
+# Seconds; covers ~5ms classification up to multi-minute LLM stalls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Seconds; pool checkout should normally be ~0
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.append(f'worker="{_WORKER}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time (one callback per label set)"""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        fn: Callable[[], float] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._fns: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        if fn is not None:
+            self.set_function(fn)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        self._fns[self._key(labels)] = fn
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, fn in list(self._fns.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound) if bound != float("inf") else "+Inf"}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per label set: count, avg and bucket-approximated p50/p95 (ms)"""
+        result = {}
+        for key, series in self._snapshot().items():
+            count = series[-1]
+            if not count:
+                continue
+
+            def quantile(q):
+                target = q * count
+                cumulative = 0
+                for bound, c in zip(self.buckets, series):
+                    cumulative += c
+                    if cumulative >= target:
+                        return bound
+                return self.buckets[-1]
+
+            def ms(seconds):
+                return None if seconds == float("inf") else round(seconds * 1000, 1)
+
+            result["/".join(key) or "all"] = {
+                "count": count,
+                "avg_ms": round(series[-2] / count * 1000, 1),
+                "p50_ms_le": ms(quantile(0.5)),
+                "p95_ms_le": ms(quantile(0.95)),
+            }
+        return result
+
+
+class MetricsRegistry:
+    """Holds metrics and renders the Prometheus text exposition"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and metrics
+metrics_registry = MetricsRegistry()
+
+STAGE_DURATION = metrics_registry.register(
+    Histogram(
+        "ai_stage_duration_seconds",
+        "Duration of each /ask pipeline stage",
+        ["stage"],
+    )
+)
+LLM_TOKENS = metrics_registry.register(
+    Counter(
+        "ai_llm_tokens_total",
+        "LLM tokens used per pipeline stage",
+        ["stage", "kind"],
+    )
+)
+SQL_ATTEMPTS = metrics_registry.register(
+    Counter(
+        "ai_sql_attempts_total",
+        "Generated SQL execution attempts by outcome (ok or error code)",
+        ["attempt", "outcome"],
+    )
+)
+DB_POOL_WAIT = metrics_registry.register(
+    Histogram(
+        "db_pool_checkout_wait_seconds",
+        "Time spent waiting to check a connection out of the pool",
+        ["pool"],
+        buckets=POOL_WAIT_BUCKETS,
+    )
+)
+DB_POOL_CHECKED_OUT = metrics_registry.register(
+    Gauge("db_pool_checked_out", "Connections currently checked out of the pool", ["pool"])
+)
+DB_POOL_SIZE = metrics_registry.register(
+    Gauge("db_pool_size", "Configured persistent connections in the pool", ["pool"])
+)
+DB_POOL_OVERFLOW = metrics_registry.register(
+    Gauge("db_pool_overflow", "Overflow connections open beyond pool_size (negative while filling)", ["pool"])
+)
+DB_POOL_TIMEOUTS = metrics_registry.register(
+    Counter("db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout (pool exhausted)", ["pool"])
+)
+DB_POOL_CONNECTIONS = metrics_registry.register(
+    Counter("db_pool_connections_total", "Pool connection lifecycle events (connect, invalidate)", ["pool", "event"])
+)
+
+
+def stage_timer(stage: str):
+    """Context manager timing one pipeline stage"""
+    return STAGE_DURATION.time(stage=stage)
+
+
+def timed_stage(stage: str):
+    """Decorator timing an async function as one pipeline stage"""
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def time_awaitable(stage: str, awaitable):
+    """Await and time one pipeline stage (for stages run inside asyncio.gather)"""
+    with stage_timer(stage):
+        return await awaitable
+
+
+def record_llm_usage(stage: str, usage):
+    """Count prompt/completion tokens from an OpenAI-style usage object"""
+    if not usage:
+        return
+    stage = stage.lower()
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, stage=stage, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, stage=stage, kind="completion")
+    # Prompt tokens served from the provider's prefix cache (subset of "prompt")
+    LLM_TOKENS.inc(cached_prompt_tokens(usage), stage=stage, kind="cached")
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Prefix-cache hits: DeepSeek's prompt_cache_hit_tokens, else OpenAI's prompt_tokens_details"""
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+    return cached or 0
@@ -3,143 +3,645 @@ Rate Limiting & Request Throttling
 Prevents API abuse and ensures fair resource usage
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
-from functools import lru_cache
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fnmatch import fnmatch
+import json
+import os
+import sqlite3
+import threading
 import time
 
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app.core.config import BACKEND_DIR, settings
+from app.core.logging_config import get_logger
+from app.core.sql_validator import sql_validator
+from app.core.sql_canonicalizer import sql_canonicalizer
+
+logger = get_logger("rate_limiter")
+
+
+# ─────────────────────────────────────────────
+# Sliding-window counter backends
+# ─────────────────────────────────────────────
+
+
+def _slide(state: Optional[tuple], window_index: int) -> Tuple[int, int]:
+    """
+    Roll a (window_index, current, previous) state forward to window_index.
+    Returns (current, previous) counts for the window.
+    """
+    if state is None:
+        return 0, 0
+    stored_index, current, previous = state
+    if stored_index == window_index:
+        return current, previous
+    if stored_index == window_index - 1:
+        return 0, current
+    return 0, 0
+
+
+class MemoryCounterBackend:
+    """Per-process counters: one fixed-size entry per identifier"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.counters: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> Tuple[bool, float, float]:
+        window_index = int(now // window)
+        weight = 1 - (now % window) / window
+        with self._lock:
+            current, previous = _slide(self.counters.get(key), window_index)
+            estimate = previous * weight + current
+            allowed = estimate + 1 <= limit
+            if allowed:
+                current += 1
+                estimate += 1
+            self.counters[key] = (window_index, current, previous)
+        return allowed, estimate, previous / window
+
+    def sweep(self, window: int, now: float) -> int:
+        stale_before = int(now // window) - 1
+        with self._lock:
+            stale = [k for k, (idx, _, _) in self.counters.items() if idx < stale_before]
+            for key in stale:
+                del self.counters[key]
+        return len(stale)
+
+    def size(self) -> int:
+        return len(self.counters)
+
+
+class SQLiteCounterBackend:
+    """
+    Counters in a WAL-mode SQLite file so limits hold across gunicorn workers.
+    Each hit is one short IMMEDIATE transaction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY,"
+            " window_index INTEGER NOT NULL,"
+            " current INTEGER NOT NULL,"
+            " previous INTEGER NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=2.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> Tuple[bool, float, float]:
+        window_index = int(now // window)
+        weight = 1 - (now % window) / window
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ?",
+                (key,),
+            ).fetchone()
+            current, previous = _slide(row, window_index)
+            estimate = previous * weight + current
+            allowed = estimate + 1 <= limit
+            if allowed:
+                current += 1
+                estimate += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous)"
+                " VALUES (?, ?, ?, ?)",
+                (key, window_index, current, previous),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, estimate, previous / window
+
+    def sweep(self, window: int, now: float) -> int:
+        return self._conn().execute(
+            "DELETE FROM rate_limits WHERE window_index < ?",
+            (int(now // window) - 1,),
+        ).rowcount
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
 
 class RateLimiter:
     """
-    Simple in-memory rate limiter using sliding window
-    For production, consider using Redis instead
+    Sliding-window counter rate limiter with per-role limits.
+    Memory per identifier is constant (two counters), and the estimate is
+    previous_window_count * overlap + current_window_count.
     """
 
-    def __init__(self, requests_per_minute: int = 60):
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        role_limits: Dict[int, int] = None,
+        window_seconds: int = 60,
+        backend=None,
+    ):
         self.requests_per_minute = requests_per_minute
-        self.window = 60  # seconds
-        self.requests: Dict[str, list] = {}
+        self.role_limits = role_limits or {}
+        self.window = window_seconds
+        self.backend = backend or MemoryCounterBackend()
+        self.allowed_count = 0
+        self.rejected_count = 0
+        self._sweeper: Optional[threading.Thread] = None
+
+    def limit_for(self, role_id: Optional[int]) -> int:
+        """Requests per window for a role; unknown roles get the lowest tier"""
+        if role_id in self.role_limits:
+            return self.role_limits[role_id]
+        return min([self.requests_per_minute, *self.role_limits.values()])
 
-    def is_allowed(self, identifier: str) -> Tuple[bool, Dict]:
+    def is_allowed(
+        self, identifier: str, role_id: Optional[int] = None, limit: int = None
+    ) -> Tuple[bool, Dict]:
         """
-        Check if a request from identifier is allowed
+        Check if a request from identifier is allowed (limit overrides the role tier)
         Returns: (allowed: bool, info: dict with remaining/reset_time)
         """
         now = time.time()
+        limit = limit or self.limit_for(role_id)
+        try:
+            allowed, estimate, decay_per_second = self.backend.hit(
+                identifier, limit, self.window, now
+            )
+        except Exception as e:
+            # Never fail a request because the limiter store is unavailable
+            logger.warning(f"Rate limiter backend error, allowing request: {e}")
+            return True, {"limit": limit, "remaining": limit, "reset_in_seconds": self.window}
 
-        # Initialize if new identifier
-        if identifier not in self.requests:
-            self.requests[identifier] = []
-
-        # Remove old requests outside the window
-        self.requests[identifier] = [
-            req_time
-            for req_time in self.requests[identifier]
-            if now - req_time < self.window
-        ]
-
-        # Check if limit exceeded
-        if len(self.requests[identifier]) >= self.requests_per_minute:
-            oldest_request = self.requests[identifier][0]
-            reset_time = oldest_request + self.window
-            remaining_wait = reset_time - now
+        reset_in = self.window - (now % self.window)
+        if not allowed:
+            self.rejected_count += 1
+            # Time until the weighted previous-window share decays enough for one more request
+            if decay_per_second > 0:
+                wait = min(reset_in, (estimate + 1 - limit) / decay_per_second)
+            else:
+                wait = reset_in
             return False, {
-                "limit": self.requests_per_minute,
+                "limit": limit,
                 "remaining": 0,
-                "reset_in_seconds": max(0, int(remaining_wait) + 1),
-                "retry_after": int(remaining_wait) + 1,
+                "reset_in_seconds": max(0, int(reset_in) + 1),
+                "retry_after": int(wait) + 1,
             }
 
-        # Allow and record request
-        self.requests[identifier].append(now)
+        self.allowed_count += 1
         return True, {
-            "limit": self.requests_per_minute,
-            "remaining": self.requests_per_minute - len(self.requests[identifier]),
-            "reset_in_seconds": self.window,
+            "limit": limit,
+            "remaining": max(0, int(limit - estimate)),
+            "reset_in_seconds": int(reset_in) + 1,
         }
 
     def cleanup(self):
-        """Remove old entries to prevent memory leak"""
+        """Remove counters from windows that no longer affect any estimate"""
+        removed = self.backend.sweep(self.window, time.time())
+        if removed:
+            logger.debug(f"Rate limiter sweep removed {removed} idle identifiers")
+
+    def start_sweeper(self, interval_seconds: int = 120):
+        """Run cleanup() periodically on a daemon thread (idempotent)"""
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.cleanup()
+                except Exception as e:
+                    logger.warning(f"Rate limiter sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="rate-limit-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def get_stats(self) -> Dict:
+        """Get limiter statistics"""
+        return {
+            "backend": self.backend.name,
+            "window_seconds": self.window,
+            "default_limit": self.requests_per_minute,
+            "role_limits": self.role_limits,
+            "tracked_identifiers": self.backend.size(),
+            "allowed": self.allowed_count,
+            "rejected": self.rejected_count,
+        }
+
+
+# ─────────────────────────────────────────────
+# ASGI Middleware
+# ─────────────────────────────────────────────
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing the rate limiter on the /ask endpoints.
+
+    Two buckets apply to every request: one per client IP (a floor that body
+    fields can't dodge) and one per user_id from the JSON body. The user's
+    tier comes from their role in the database, never from the body; unknown
+    users get the lowest tier. The body is buffered once and replayed to the
+    app, and the counter/role lookups run off the event loop.
+    """
+
+    # Bodies larger than this are not parsed (the caller is limited by IP)
+    MAX_INSPECT_BYTES = 64 * 1024
+
+    def __init__(
+        self,
+        app,
+        limiter: "RateLimiter",
+        paths: list,
+        ip_limit: int = None,
+        trusted_proxy_hops: int = None,
+        role_cache_seconds: int = None,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.paths = set(paths)
+        self.ip_limit = ip_limit or settings.RATE_LIMIT_IP_PER_MINUTE
+        self.trusted_proxy_hops = (
+            settings.RATE_LIMIT_TRUSTED_PROXY_HOPS if trusted_proxy_hops is None else trusted_proxy_hops
+        )
+        self.role_cache_seconds = (
+            settings.RATE_LIMIT_ROLE_CACHE_SECONDS if role_cache_seconds is None else role_cache_seconds
+        )
+        # user_id -> (role_id or None, expires_at)
+        self._roles: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
+        self._roles_lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"].rstrip("/") not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the request body
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away before sending the body
+                await self.app(scope, receive, send)
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        # SQLite counters and the role lookup block, so keep them off the loop
+        allowed, info, identifier, role_id = await run_in_threadpool(self._check, scope, body)
+
+        if not allowed:
+            logger.warning(f"🚫 Rate limit exceeded for {identifier} (role {role_id})")
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "detail": "Rate limit exceeded. Please slow down.",
+                    "retry_after": info["retry_after"],
+                },
+                headers={
+                    "Retry-After": str(info["retry_after"]),
+                    "X-RateLimit-Limit": str(info["limit"]),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-ratelimit-limit", str(info["limit"]).encode()))
+                headers.append((b"x-ratelimit-remaining", str(info["remaining"]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, replay_receive, send_with_headers)
+
+    def _check(self, scope, body: bytes) -> Tuple[bool, Dict, str, Optional[int]]:
+        """IP floor first, then the user's bucket. Returns (allowed, info, identifier, role_id)"""
+        ip_key = f"ip:{self._client_ip(scope)}"
+        allowed, info = self.limiter.is_allowed(ip_key, limit=self.ip_limit)
+        if not allowed:
+            return False, info, ip_key, None
+
+        user_id = self._user_id(body)
+        if not user_id:
+            # Anonymous callers share the IP's lowest-tier bucket
+            user_key, role_id = f"anon:{ip_key}", None
+        else:
+            user_key, role_id = f"user:{user_id}", self._role_for(user_id)
+        allowed, info = self.limiter.is_allowed(user_key, role_id)
+        return allowed, info, user_key, role_id
+
+    def _user_id(self, body: bytes) -> Optional[str]:
+        """user_id from the JSON body, if any (only selects the bucket, never the tier)"""
+        if not body or len(body) > self.MAX_INSPECT_BYTES:
+            return None
+        try:
+            payload = json.loads(body)
+        except (ValueError, TypeError):
+            return None
+        user_id = payload.get("user_id") if isinstance(payload, dict) else None
+        return str(user_id) if user_id not in (None, "") else None
+
+    def _client_ip(self, scope) -> str:
+        """
+        Client address as seen by our proxy: the X-Forwarded-For entry the
+        trusted proxy appended (the Nth from the right), not the first hop,
+        which the client controls.
+        """
+        headers = dict(scope.get("headers") or [])
+        forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1")
+        hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+        if self.trusted_proxy_hops and len(hops) >= self.trusted_proxy_hops:
+            return hops[-self.trusted_proxy_hops]
+        if scope.get("client"):
+            return scope["client"][0]
+        return "unknown"
+
+    def _role_for(self, user_id: str) -> Optional[int]:
+        """Role from the users table (cached); None if unknown or the lookup fails"""
         now = time.time()
-        expired_keys = []
+        with self._roles_lock:
+            cached = self._roles.get(user_id)
+            if cached and cached[1] > now:
+                return cached[0]
 
-        for identifier, timestamps in self.requests.items():
-            # Keep only recent timestamps
-            self.requests[identifier] = [
-                t for t in timestamps if now - t < self.window * 2
-            ]
-            # Remove completely empty entries
-            if not self.requests[identifier]:
-                expired_keys.append(identifier)
+        role_id = None
+        from app.core.db import SessionLocal
+
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                text("SELECT role FROM users WHERE id = :id LIMIT 1"), {"id": user_id}
+            ).fetchone()
+            role_id = int(row[0]) if row and row[0] is not None else None
+        except Exception as e:
+            logger.warning(f"Rate limiter role lookup failed for user {user_id}: {e}")
+        finally:
+            db.close()
 
-        for key in expired_keys:
-            del self.requests[key]
+        with self._roles_lock:
+            self._roles[user_id] = (role_id, now + self.role_cache_seconds)
+            self._roles.move_to_end(user_id)
+            while len(self._roles) > 10000:
+                self._roles.popitem(last=False)
+        return role_id
 
 
 class QueryCache:
     """
-    Simple in-memory cache for database query results
-    Format: {query_hash: (result, timestamp, ttl)}
+    In-memory LRU cache for database query results, bounded by entry count
+    and by an approximate byte budget.
+    Each entry is tagged with the tables it reads: its TTL is the shortest TTL
+    of those tables' class (static / hot / default), and it can be dropped
+    when one of those tables changes.
+    Format: {query_hash: (result, timestamp, ttl, size_bytes, tables)}
     For production, use Redis for distributed caching
     """
 
-    def __init__(self, ttl_seconds: int = 300):  # 5 minutes default
-        self.cache: Dict[str, Tuple] = {}
+    def __init__(
+        self,
+        ttl_seconds: int = 300,  # 5 minutes default
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: int = 8 * 1024 * 1024,
+        static_tables: list = None,
+        static_ttl_seconds: int = 3600,
+        hot_table_patterns: list = None,
+        hot_ttl_seconds: int = 60,
+    ):
+        self.cache: "OrderedDict[str, Tuple]" = OrderedDict()
         self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.static_tables = {t.lower() for t in (static_tables or [])}
+        self.static_ttl_seconds = static_ttl_seconds
+        self.hot_table_patterns = [p.lower() for p in (hot_table_patterns or [])]
+        self.hot_ttl_seconds = hot_ttl_seconds
+        # table name -> keys of entries reading it
+        self.table_index: Dict[str, set] = {}
+        self.current_bytes = 0
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected_oversize = 0
+        self._lock = threading.Lock()
 
     @staticmethod
     def _hash_query(sql: str, user_id: str = None) -> str:
-        """Create cache key from SQL and user context"""
+        """
+        Create cache key from canonical SQL and user context, so whitespace,
+        keyword case, quoting and table-alias differences outside the select
+        list share one entry (the select list decides the result's column names)
+        """
         import hashlib
 
-        combined = f"{sql}:{user_id or 'anonymous'}"
+        combined = f"{sql_canonicalizer.result_key(sql)}:{user_id or 'anonymous'}"
         return hashlib.md5(combined.encode()).hexdigest()
 
+    @staticmethod
+    def _estimate_size(result: Dict) -> int:
+        """Approximate in-memory footprint of a result, measured once at insert time"""
+        return len(json.dumps(result, default=str))
+
+    def ttl_for_tables(self, tables) -> int:
+        """Shortest TTL among the classes of the given tables"""
+        ttls = []
+        for table in tables:
+            if table in self.static_tables:
+                ttls.append(self.static_ttl_seconds)
+            elif any(fnmatch(table, p) for p in self.hot_table_patterns):
+                ttls.append(self.hot_ttl_seconds)
+            else:
+                ttls.append(self.ttl_seconds)
+        return min(ttls) if ttls else self.ttl_seconds
+
+    def _remove(self, key: str):
+        """Drop an entry, release its bytes and untag it (caller holds the lock)"""
+        _, _, _, size, tables = self.cache.pop(key)
+        self.current_bytes -= size
+        for table in tables:
+            keys = self.table_index.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.table_index[table]
+
     def get(self, sql: str, user_id: str = None) -> Dict | None:
-        """Get cached result if exists and not expired"""
+        """Get cached result if exists and not expired (marks it most recently used)"""
         key = self._hash_query(sql, user_id)
 
-        if key in self.cache:
-            result, timestamp, ttl = self.cache[key]
-            if time.time() - timestamp < ttl:
-                return result
-            else:
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                result, timestamp, ttl, _, _ = entry
+                if time.time() - timestamp < ttl:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    return result
                 # Expired, remove it
-                del self.cache[key]
+                self._remove(key)
 
+            self.misses += 1
         return None
 
-    def set(self, sql: str, result: Dict, user_id: str = None, ttl: int = None):
-        """Cache a query result"""
+    def set(
+        self,
+        sql: str,
+        result: Dict,
+        user_id: str = None,
+        ttl: int = None,
+        tables: list = None,
+    ):
+        """
+        Cache a query result, evicting least recently used entries to stay in budget.
+        Tables default to those referenced by the SQL; TTL defaults to their class TTL.
+        """
         key = self._hash_query(sql, user_id)
-        self.cache[key] = (result, time.time(), ttl or self.ttl_seconds)
+        size = self._estimate_size(result)
+        if tables is None:
+            tables = sql_validator.extract_tables(sql)
+        tables = frozenset(t.lower() for t in tables)
+        ttl = ttl or self.ttl_for_tables(tables)
+
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+
+            # A single huge result would flush the whole cache; don't keep it
+            if size > self.max_entry_bytes:
+                self.rejected_oversize += 1
+                return
+
+            self.cache[key] = (result, time.time(), ttl, size, tables)
+            self.current_bytes += size
+            for table in tables:
+                self.table_index.setdefault(table, set()).add(key)
+
+            while self.cache and (
+                len(self.cache) > self.max_entries
+                or self.current_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate_table(self, table: str) -> int:
+        """Drop every entry that reads the given table. Returns the number dropped."""
+        with self._lock:
+            keys = list(self.table_index.get(table.lower(), ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        if keys:
+            logger.info(f"🧹 Query cache: dropped {len(keys)} entries reading '{table}'")
+        return len(keys)
 
     def clear(self):
         """Clear all cache"""
-        self.cache.clear()
+        with self._lock:
+            self.invalidations += len(self.cache)
+            self.cache.clear()
+            self.table_index.clear()
+            self.current_bytes = 0
 
     def cleanup(self):
         """Remove expired entries"""
         now = time.time()
-        expired_keys = [
-            key
-            for key, (_, timestamp, ttl) in self.cache.items()
-            if now - timestamp > ttl
-        ]
-        for key in expired_keys:
-            del self.cache[key]
+        with self._lock:
+            expired_keys = [
+                key
+                for key, (_, timestamp, ttl, _, _) in self.cache.items()
+                if now - timestamp > ttl
+            ]
+            for key in expired_keys:
+                self._remove(key)
 
     def get_stats(self) -> Dict:
-        """Get cache statistics"""
+        """Get cache statistics (O(1): sizes are tracked incrementally)"""
+        total = self.hits + self.misses
         return {
             "total_entries": len(self.cache),
-            "size_approx_mb": sum(
-                len(str(result)) for result, _, _ in self.cache.values()
-            )
-            / (1024 * 1024),
+            "max_entries": self.max_entries,
+            "size_approx_mb": round(self.current_bytes / (1024 * 1024), 3),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 3),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "rejected_oversize": self.rejected_oversize,
+            "tables_tracked": len(self.table_index),
+            "ttl_seconds": {
+                "default": self.ttl_seconds,
+                "static": self.static_ttl_seconds,
+                "hot": self.hot_ttl_seconds,
+            },
         }
 
 
+def _create_counter_backend():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        try:
+            return SQLiteCounterBackend(str(BACKEND_DIR / settings.RATE_LIMIT_PATH))
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"SQLite rate limit store unavailable, falling back to memory: {e}")
+    return MemoryCounterBackend()
+
+
 # Global singletons
-rate_limiter = RateLimiter(requests_per_minute=100)
-query_cache = QueryCache(ttl_seconds=300)  # 5 minute cache
+rate_limiter = RateLimiter(
+    requests_per_minute=settings.RATE_LIMIT_DEFAULT_PER_MINUTE,
+    role_limits=settings.RATE_LIMIT_ROLE_LIMITS,
+    window_seconds=settings.RATE_LIMIT_WINDOW_SECONDS,
+    backend=_create_counter_backend(),
+)
+query_cache = QueryCache(
+    ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+    max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=settings.QUERY_CACHE_MAX_MB * 1024 * 1024,
+    max_entry_bytes=settings.QUERY_CACHE_MAX_ENTRY_MB * 1024 * 1024,
+    static_tables=settings.QUERY_CACHE_STATIC_TABLES,
+    static_ttl_seconds=settings.QUERY_CACHE_STATIC_TTL_SECONDS,
+    hot_table_patterns=settings.QUERY_CACHE_HOT_TABLE_PATTERNS,
+    hot_ttl_seconds=settings.QUERY_CACHE_HOT_TTL_SECONDS,
+)
@@ -5,9 +5,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import APIKeyHeader
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.db import get_db
+from app.core.db import get_async_db
 from app.models.profile_models import Users
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -42,7 +43,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(api_key_header), db: Session = Depends(get_db)) -> Users:
+async def get_current_user(token: str = Depends(api_key_header), db: AsyncSession = Depends(get_async_db)) -> Users:
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,7 +62,7 @@ async def get_current_user(token: str = Depends(api_key_header), db: Session = D
     
     if master_key and token == master_key:
         # Fetch the first admin user as a mock for master key access
-        user = db.query(Users).filter(Users.role == 1).first()
+        user = (await db.execute(select(Users).where(Users.role == 1).limit(1))).scalars().first()
         if user:
             return user
         raise HTTPException(
@@ -89,7 +90,7 @@ async def get_current_user(token: str = Depends(api_key_header), db: Session = D
     except JWTError:
         raise credentials_exception
     
-    user = db.query(Users).filter(Users.email == email).first()
+    user = (await db.execute(select(Users).where(Users.email == email).limit(1))).scalars().first()
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,123 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers with the same key share one execution instead of each
+running it. The first caller (leader) runs the work; callers arriving while
+it is in flight (followers) wait for and receive the same result or error.
+
+- AsyncSingleFlight: for coroutines on the event loop (question pipeline,
+  async SQL execution)
+- SingleFlight: for blocking calls on threadpool threads (SQL execution)
+
+Coalescing is per worker process; nothing is remembered after completion
+(the answer/result caches cover that).
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import threading
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutine calls by key"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple:
+        """
+        Run fn() once per key at a time; concurrent callers await the same result.
+        Returns (result, shared) where shared is True for followers.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+
+            def _release(done, key=key):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            task.add_done_callback(_release)
+
+        # Shielded so one caller disconnecting does not cancel the work for the others
+        return await asyncio.shield(task), shared
+
+    def get_stats(self) -> Dict:
+        """Get coalescing statistics"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent blocking calls by key (thread-safe)"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple:
+        """
+        Run fn() once per key at a time.
+        Returns (result, shared) where shared is True for followers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict:
+        """Get coalescing statistics"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+# Global singletons
+question_flight = AsyncSingleFlight()
+query_flight = SingleFlight()
+async_query_flight = AsyncSingleFlight()
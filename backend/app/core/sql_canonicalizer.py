@@ -0,0 +1,350 @@
+"""
+SQL Canonicalizer
+Tokenizes MySQL/TiDB SQL and produces:
+- canonical form: same semantics, stable text (whitespace, keyword case,
+  identifier quoting, string quoting, table aliases, trailing semicolons).
+  Used for result-cache keys and in-flight request coalescing.
+- result key: canonical form plus the select list as written. MySQL labels
+  an unaliased select expression with its text as typed (count(*) vs
+  COUNT(*)), so result-cache and coalescing keys must keep it verbatim.
+- fingerprint: canonical form with literals replaced by "?" (IN-lists
+  collapsed). Groups queries of the same shape for latency stats.
+"""
+
+from functools import lru_cache
+from typing import List, Tuple
+import hashlib
+import re
+
+# Token kinds
+WS, COMMENT, STRING, QUOTED, NUMBER, WORD, OP, OTHER = (
+    "ws", "comment", "string", "quoted", "number", "word", "op", "other"
+)
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![A-Za-z_]))
+  | (?P<word>[A-Za-z0-9_$@][A-Za-z0-9_$@]*)
+  | (?P<op><=>|->>|<=|>=|<>|!=|\|\||&&|:=|->|[-+*/%=<>!~^&|(),.;?:])
+  | (?P<other>.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+_PLAIN_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+
+KEYWORDS = {
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "CROSS",
+    "DESC", "DISTINCT", "ELSE", "END", "EXISTS", "FALSE", "FROM", "FULL",
+    "GROUP", "HAVING", "IN", "INNER", "INTERVAL", "IS", "JOIN", "LEFT",
+    "LIKE", "LIMIT", "NATURAL", "NOT", "NULL", "OFFSET", "ON", "OR", "ORDER",
+    "OUTER", "OVER", "PARTITION", "REGEXP", "RIGHT", "ROLLUP", "SELECT",
+    "SEPARATOR", "SHOW", "STRAIGHT_JOIN", "THEN", "TRUE", "UNION", "USING",
+    "WHEN", "WHERE", "WITH", "XOR", "DESCRIBE", "TABLES", "COLUMNS", "DIV",
+    "MOD", "RECURSIVE", "WINDOW", "ROWS", "RANGE", "PRECEDING", "FOLLOWING",
+    "UNBOUNDED", "CURRENT", "ROW", "DAY", "WEEK", "MONTH", "YEAR", "HOUR",
+    "MINUTE", "SECOND", "SIGNED", "UNSIGNED", "CHAR", "DECIMAL", "DATE",
+    "DATETIME", "TIME", "JSON",
+}
+
+FUNCTIONS = {
+    "AVG", "COUNT", "MAX", "MIN", "SUM", "GROUP_CONCAT", "COALESCE", "IFNULL",
+    "NULLIF", "IF", "ROUND", "FLOOR", "CEIL", "CEILING", "ABS", "CONCAT",
+    "CONCAT_WS", "LOWER", "UPPER", "TRIM", "LTRIM", "RTRIM", "LENGTH",
+    "CHAR_LENGTH", "SUBSTRING", "SUBSTR", "SUBSTRING_INDEX", "REPLACE",
+    "LOCATE", "INSTR", "NOW", "CURDATE", "CURRENT_DATE", "CURRENT_TIMESTAMP",
+    "DATE_FORMAT", "DATE_ADD", "DATE_SUB", "DATEDIFF", "TIMESTAMPDIFF",
+    "FROM_UNIXTIME", "UNIX_TIMESTAMP", "STR_TO_DATE", "JSON_EXTRACT",
+    "JSON_UNQUOTE", "JSON_LENGTH", "JSON_CONTAINS", "JSON_ARRAYAGG",
+    "JSON_OBJECT", "JSON_ARRAY", "ROW_NUMBER", "RANK", "DENSE_RANK", "LAG",
+    "LEAD", "NTILE", "PERCENT_RANK", "CONVERT", "GREATEST", "LEAST",
+    "FIELD", "FIND_IN_SET",
+}
+
+# Calls where AS introduces a type rather than an alias: CAST(x AS DATE)
+_TYPE_AS_CALLS = {"CAST", "CONVERT"}
+
+# Tokens after which a bare word (optionally preceded by AS) is a table alias
+_TABLE_INTRODUCERS = {"FROM", "JOIN", "STRAIGHT_JOIN"}
+# Words that can follow a table reference but are never aliases
+_NOT_ALIAS = KEYWORDS | {"USE", "FORCE", "IGNORE", "LATERAL"}
+
+# Top-level words that end the outer select list
+_SELECT_LIST_END = {
+    "FROM", "INTO", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION",
+    "WINDOW", "FOR", "LOCK",
+}
+
+_NO_SPACE_BEFORE = {",", ")", ".", ";"}
+_NO_SPACE_AFTER = {"(", "."}
+
+
+class SQLCanonicalizer:
+    """Tokenizer-based SQL normalizer (pure functions, results memoized)"""
+
+    @staticmethod
+    def tokenize(sql: str) -> List[Tuple[str, str]]:
+        """Split SQL into (kind, text) tokens. Never raises."""
+        return [(m.lastgroup, m.group()) for m in _TOKEN_RE.finditer(sql)]
+
+    # ─────────────────────────────────────────────
+    # Token normalization
+    # ─────────────────────────────────────────────
+
+    @staticmethod
+    def _normalize_string(text: str) -> str:
+        """Re-quote a string literal with single quotes and backslash escapes"""
+        quote = text[0]
+        body = text[1:-1]
+        out = []
+        i = 0
+        while i < len(body):
+            ch = body[i]
+            if ch == "\\" and i + 1 < len(body):
+                nxt = body[i + 1]
+                if nxt == "'":
+                    out.append("\\'")
+                elif nxt == '"':
+                    out.append('"')
+                else:
+                    out.append(ch + nxt)
+                i += 2
+                continue
+            if ch == quote and i + 1 < len(body) and body[i + 1] == quote:
+                out.append("\\'" if quote == "'" else '"')
+                i += 2
+                continue
+            out.append("\\'" if ch == "'" else ch)
+            i += 1
+        return "'" + "".join(out) + "'"
+
+    @staticmethod
+    def _normalize_quoted(text: str) -> Tuple[str, str]:
+        """Drop backticks from identifiers that don't need them"""
+        name = text[1:-1].replace("``", "`")
+        if _PLAIN_IDENTIFIER.match(name) and name.upper() not in KEYWORDS:
+            return WORD, name
+        return QUOTED, text
+
+    def _normalized_tokens(self, sql: str) -> List[Tuple[str, str]]:
+        """
+        Significant tokens with case, quoting and operator spelling normalized.
+        A word after AS is an alias and kept verbatim (AS date and AS DATE
+        name different result columns), except for the type in CAST/CONVERT.
+        """
+        tokens = []
+        calls = []  # word before each open parenthesis
+        for kind, text in self.tokenize(sql):
+            if kind in (WS, COMMENT):
+                continue
+            if kind == OP and text == "(":
+                calls.append(tokens[-1][1] if tokens and tokens[-1][0] == WORD else "")
+            elif kind == OP and text == ")" and calls:
+                calls.pop()
+            if kind == STRING:
+                text = self._normalize_string(text)
+            elif kind == QUOTED:
+                kind, text = self._normalize_quoted(text)
+            elif kind == WORD:
+                upper = text.upper()
+                is_alias = (
+                    tokens
+                    and tokens[-1] == (WORD, "AS")
+                    and not (calls and calls[-1] in _TYPE_AS_CALLS)
+                )
+                if not is_alias and (upper in KEYWORDS or upper in FUNCTIONS):
+                    text = upper
+            elif kind == OP and text == "!=":
+                text = "<>"
+            elif kind == NUMBER and text[:2] in ("0x", "0X"):
+                text = "0x" + text[2:].lower()
+            tokens.append((kind, text))
+
+        # Trailing semicolons don't change the statement
+        while tokens and tokens[-1] == (OP, ";"):
+            tokens.pop()
+
+        # INNER JOIN -> JOIN, LEFT OUTER JOIN -> LEFT JOIN
+        return [
+            tok
+            for i, tok in enumerate(tokens)
+            if not (
+                tok in ((WORD, "INNER"), (WORD, "OUTER"))
+                and i + 1 < len(tokens)
+                and tokens[i + 1] == (WORD, "JOIN")
+            )
+        ]
+
+    @staticmethod
+    def _canonicalize_aliases(tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Rename table aliases to _t1, _t2, ... in order of first definition and
+        drop the optional AS before them. Only the alias definition and
+        qualified references (alias.column) are renamed, so result column
+        names are unaffected.
+        """
+        aliases = {}
+        alias_positions = set()
+        as_positions = set()
+        for i, (kind, text) in enumerate(tokens):
+            if kind != WORD or text not in _TABLE_INTRODUCERS:
+                continue
+            # FROM <table>[.<table>] | FROM ( ... ) -> find the end of the table reference
+            j = i + 1
+            if j < len(tokens) and tokens[j] == (OP, "("):
+                depth = 0
+                while j < len(tokens):
+                    if tokens[j] == (OP, "("):
+                        depth += 1
+                    elif tokens[j] == (OP, ")"):
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    j += 1
+            elif j < len(tokens) and tokens[j][0] in (WORD, QUOTED):
+                while j + 2 < len(tokens) and tokens[j + 1] == (OP, "."):
+                    j += 2
+            else:
+                continue
+            k = j + 1
+            if k < len(tokens) and tokens[k] == (WORD, "AS"):
+                as_positions.add(k)
+                k += 1
+            if k < len(tokens) and tokens[k][0] == WORD and tokens[k][1].upper() not in _NOT_ALIAS:
+                name = tokens[k][1]
+                aliases.setdefault(name.lower(), f"_t{len(aliases) + 1}")
+                alias_positions.add(k)
+            else:
+                as_positions.discard(j + 1)
+
+        if not aliases:
+            return tokens
+        # Never rename into a name the query already uses
+        used = {text.lower() for kind, text in tokens if kind == WORD}
+        if used & set(aliases.values()):
+            return tokens
+
+        renamed = []
+        for i, (kind, text) in enumerate(tokens):
+            if i in as_positions:
+                continue
+            if kind == WORD and text.lower() in aliases and (
+                i in alias_positions
+                or (i + 1 < len(tokens) and tokens[i + 1] == (OP, "."))
+            ):
+                text = aliases[text.lower()]
+            renamed.append((kind, text))
+        return renamed
+
+    @staticmethod
+    def _render(tokens: List[Tuple[str, str]]) -> str:
+        """Join tokens with single spaces, tight around punctuation and calls"""
+        out = []
+        prev = None
+        for kind, text in tokens:
+            if prev is not None:
+                prev_kind, prev_text = prev
+                tight = (
+                    text in _NO_SPACE_BEFORE
+                    or prev_text in _NO_SPACE_AFTER
+                    or (
+                        text == "("
+                        and prev_kind == WORD
+                        and (prev_text not in KEYWORDS or prev_text in FUNCTIONS)
+                    )
+                )
+                if not tight:
+                    out.append(" ")
+            out.append(text)
+            prev = (kind, text)
+        return "".join(out)
+
+    @classmethod
+    def _select_list(cls, sql: str) -> List[str]:
+        """Items of the outermost select list, as written (comments dropped, ends trimmed)"""
+        items = []
+        current = None
+        depth = 0
+        for kind, text in cls.tokenize(sql):
+            if kind == COMMENT:
+                continue
+            if kind == OP and text == "(":
+                depth += 1
+            elif kind == OP and text == ")":
+                depth -= 1
+            if current is None:
+                if depth == 0 and kind == WORD and text.upper() == "SELECT":
+                    current = []
+                continue
+            if depth == 0 and (
+                (kind == WORD and text.upper() in _SELECT_LIST_END) or (kind == OP and text == ";")
+            ):
+                break
+            if depth == 0 and kind == OP and text == ",":
+                items.append("".join(current).strip())
+                current = []
+                continue
+            current.append(text)
+        if current:
+            items.append("".join(current).strip())
+        return items
+
+    # ─────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────
+
+    @lru_cache(maxsize=2048)
+    def canonicalize(self, sql: str) -> str:
+        """Semantics-preserving canonical text (keeps literals and column aliases)"""
+        tokens = self._canonicalize_aliases(self._normalized_tokens(sql))
+        return self._render(tokens)
+
+    @lru_cache(maxsize=2048)
+    def result_key(self, sql: str) -> str:
+        """
+        Key for cached or shared result rows: the canonical form, plus the select
+        list as written, since unaliased columns are labelled with their text
+        """
+        return f"{self.canonicalize(sql)}\x00{','.join(self._select_list(sql))}"
+
+    @lru_cache(maxsize=2048)
+    def fingerprint(self, sql: str) -> str:
+        """Canonical text with literals as "?" and IN-lists collapsed to "(?+)" """
+        tokens = self._canonicalize_aliases(self._normalized_tokens(sql))
+        masked = [
+            (OP, "?") if kind in (STRING, NUMBER) else (kind, text)
+            for kind, text in tokens
+        ]
+        collapsed = []
+        i = 0
+        while i < len(masked):
+            # IN (?, ?, ...) -> IN (?+)
+            if (
+                masked[i] == (WORD, "IN")
+                and i + 2 < len(masked)
+                and masked[i + 1] == (OP, "(")
+                and masked[i + 2] == (OP, "?")
+            ):
+                j = i + 2
+                while j + 2 < len(masked) and masked[j + 1] == (OP, ",") and masked[j + 2] == (OP, "?"):
+                    j += 2
+                if j + 1 < len(masked) and masked[j + 1] == (OP, ")"):
+                    collapsed.extend([masked[i], (OP, "("), (OP, "?+"), (OP, ")")])
+                    i = j + 2
+                    continue
+            collapsed.append(masked[i])
+            i += 1
+        return self._render(collapsed)
+
+    @staticmethod
+    def digest(text: str) -> str:
+        """Short stable hash of a canonical form or fingerprint"""
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+# Global singleton
+sql_canonicalizer = SQLCanonicalizer()
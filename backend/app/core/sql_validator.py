@@ -3,6 +3,7 @@ SQL Validator - Production Grade
 Validates and sanitizes SQL queries before execution
 """
 
+import difflib
 import re
 from typing import Dict, List, Tuple
 from enum import Enum
@@ -35,6 +36,31 @@ class SQLValidator:
         "CALL",
     }
 
+    # Words that can follow a table name without being its alias, or appear
+    # bare in a query without being a column
+    SQL_KEYWORDS = {
+        "all", "and", "any", "as", "asc", "between", "binary", "by", "case", "char",
+        "collate", "cross", "current", "current_date", "current_timestamp", "date",
+        "day", "decimal", "desc", "distinct", "div", "else", "end", "escape", "exists",
+        "false", "following", "for", "force", "from", "full", "group", "having", "hour",
+        "ignore", "in", "index", "inner", "int", "integer", "interval", "is", "join",
+        "json", "key", "lateral", "left", "like", "limit", "minute", "mod", "month",
+        "natural", "not", "null", "offset", "on", "or", "order", "outer", "over",
+        "partition", "preceding", "quarter", "range", "recursive", "regexp", "right",
+        "rlike", "row", "rows", "second", "select", "separator", "signed",
+        "straight_join", "then", "time", "timestamp", "true", "unbounded", "union",
+        "unknown", "unsigned", "use", "using", "values", "week", "when", "where",
+        "window", "with", "xor", "year",
+    }
+
+    # Column names the model keeps inventing -> the real column
+    COMMON_COLUMN_MISTAKES = {
+        "test_name": "testName",
+        "login_time": "created_at",
+        "language_id": "l_id",
+        "test_id": "topic_test_id",
+    }
+
     # Patterns that indicate syntax issues
     COMMON_SYNTAX_ERRORS = {
         r"(?i)near\s+['\"]": "Syntax error near quoted string",
@@ -98,6 +124,137 @@ class SQLValidator:
         # Return unique tables
         return list(set(tables))
 
+    @staticmethod
+    def _strip_literals(sql: str) -> str:
+        """SQL without comments and string literals (so JSON paths aren't read as columns)"""
+        sql = re.sub(r"--.*$", " ", sql, flags=re.MULTILINE)
+        sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+        return re.sub(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"", "''", sql)
+
+    @staticmethod
+    def resolve_aliases(sql: str) -> Dict[str, set]:
+        """Maps each table alias (and table name) in FROM/JOIN clauses to the table(s) it names"""
+        aliases: Dict[str, set] = {}
+        for table, alias in re.findall(
+            r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?",
+            sql,
+            re.IGNORECASE,
+        ):
+            aliases.setdefault(table.lower(), set()).add(table.lower())
+            if alias and alias.lower() not in SQLValidator.SQL_KEYWORDS:
+                aliases.setdefault(alias.lower(), set()).add(table.lower())
+        return aliases
+
+    @staticmethod
+    def find_unknown_columns(sql: str, columns: Dict[str, Dict[str, str]]) -> List[Dict]:
+        """
+        Checks column references against known table columns without touching the DB.
+
+        columns: table -> {lowercase column name: column name}; tables missing
+        from it (CTEs, derived tables, unknown tables) are not checked.
+        Qualified references (alias.column) are always checked. Bare columns
+        are only checked in single-table queries without subqueries, and only
+        flagged when there is a likely intended column.
+
+        Returns: [{"ref": str, "table": str, "column": str, "suggestion": str|None}]
+        """
+        body = SQLValidator._strip_literals(sql)
+        aliases = SQLValidator.resolve_aliases(body)
+        issues = []
+        seen = set()
+
+        for qualifier, column in re.findall(r"\b([A-Za-z_]\w*)`?\.`?([A-Za-z_]\w*)", body):
+            tables = [t for t in aliases.get(qualifier.lower(), ()) if t in columns]
+            if not tables or len(tables) != len(aliases[qualifier.lower()]):
+                continue
+            if any(column.lower() in columns[t] for t in tables):
+                continue
+            ref = f"{qualifier}.{column}"
+            if ref.lower() not in seen:
+                seen.add(ref.lower())
+                issues.append(SQLValidator._column_issue(ref, tables[0], column, columns[tables[0]]))
+
+        # Bare columns: only when there's exactly one table and one SELECT
+        tables = {t for names in aliases.values() for t in names}
+        if (
+            len(tables) == 1
+            and len(re.findall(r"\bSELECT\b", body, re.IGNORECASE)) == 1
+            and not re.search(r"\b(?:JOIN|WITH)\b", body, re.IGNORECASE)
+            and next(iter(tables)) in columns
+        ):
+            table = next(iter(tables))
+            known = columns[table]
+            output_aliases = {a.lower() for a in re.findall(r"\bAS\s+`?(\w+)`?", body, re.IGNORECASE)}
+            output_aliases |= SQLValidator._implicit_aliases(body)
+            for match in re.finditer(r"(?<![.\w`:@])`?([A-Za-z_]\w*)`?(?![\w.]|\s*\()", body):
+                name = match.group(1)
+                lower = name.lower()
+                if (
+                    lower in known
+                    or lower in SQLValidator.SQL_KEYWORDS
+                    or lower in output_aliases
+                    or lower in aliases
+                    or lower in seen
+                ):
+                    continue
+                issue = SQLValidator._column_issue(name, table, name, known)
+                # A bare word with no likely intended column may be an implicit alias
+                if issue["suggestion"] is None:
+                    continue
+                seen.add(lower)
+                issues.append(issue)
+
+        return issues
+
+    @staticmethod
+    def _implicit_aliases(sql: str) -> set:
+        """Select-list aliases written without AS (`COUNT(*) total`, `status stat`)"""
+        start = re.search(r"\bSELECT\b", sql, re.IGNORECASE)
+        if not start:
+            return set()
+
+        # Top-level select list: up to FROM at depth 0, split on depth-0 commas
+        items, depth, current = [], 0, []
+        for match in re.finditer(r"\(|\)|,|\bFROM\b|[^(),]", sql[start.end():], re.IGNORECASE):
+            token = match.group(0)
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+            elif depth == 0 and token == ",":
+                items.append("".join(current))
+                current = []
+                continue
+            elif depth == 0 and token.upper() == "FROM":
+                break
+            current.append(token)
+        items.append("".join(current))
+
+        aliases = set()
+        for item in items:
+            match = re.search(r"(\S+)\s+`?([A-Za-z_]\w*)`?\s*$", item.strip())
+            if not match:
+                continue
+            previous = match.group(1).strip("`").lower()
+            # `DISTINCT gender` is a column; `CASE ... END label` is an alias
+            if previous in SQLValidator.SQL_KEYWORDS and previous != "end":
+                continue
+            aliases.add(match.group(2).lower())
+        return aliases
+
+    @staticmethod
+    def _column_issue(ref: str, table: str, column: str, known: Dict[str, str]) -> Dict:
+        """Unknown column report with the nearest real column, if any"""
+        suggestion = None
+        mistake = SQLValidator.COMMON_COLUMN_MISTAKES.get(column.lower())
+        if mistake and mistake.lower() in known:
+            suggestion = known[mistake.lower()]
+        else:
+            close = difflib.get_close_matches(column.lower(), list(known), n=1, cutoff=0.75)
+            if close:
+                suggestion = known[close[0]]
+        return {"ref": ref, "table": table, "column": column, "suggestion": suggestion}
+
     @staticmethod
     def detect_common_errors(sql: str) -> List[str]:
         """Detect common SQL syntax issues"""
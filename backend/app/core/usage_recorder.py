@@ -0,0 +1,249 @@
+"""
+Usage Recorder
+Non-blocking LLM token/cost accounting. Callers enqueue a record and return;
+a background thread writes batches as JSON lines to one file per day
+(logs/usage/usage-YYYY-MM-DD.jsonl), shared by all workers via O_APPEND.
+
+Who a call is attributed to (role, college, user) comes from a contextvar
+set once per request, so the LLM layer doesn't need it passed down.
+"""
+
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import json
+import os
+import queue
+import threading
+import time
+
+from app.core.config import BACKEND_DIR, settings
+from app.core.logging_config import get_logger
+from app.core.metrics import cached_prompt_tokens
+
+logger = get_logger("usage_recorder")
+
+# Attribution for the current request: {"role_id", "college_id", "user_id"}
+usage_context: ContextVar[Optional[Dict]] = ContextVar("usage_context", default=None)
+
+GROUP_FIELDS = ("day", "stage", "model", "role_id", "college_id")
+
+
+def set_usage_context(role_id=None, college_id=None, user_id=None):
+    """Attribute LLM usage in the current request/task to this role and tenant"""
+    usage_context.set(
+        {"role_id": role_id, "college_id": college_id, "user_id": user_id}
+    )
+
+
+def estimate_cost(
+    model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0
+) -> float:
+    """USD cost from LLM_PRICING (per million tokens); unknown models cost 0"""
+    pricing = settings.LLM_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    cost = (
+        uncached * pricing.get("input", 0)
+        + cached_tokens * pricing.get("cached_input", pricing.get("input", 0))
+        + completion_tokens * pricing.get("output", 0)
+    )
+    return round(cost / 1_000_000, 8)
+
+
+class UsageRecorder:
+    """Queue-backed JSONL writer for per-call LLM usage records"""
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 1.0,
+        batch_size: int = 200,
+        max_queue: int = 10000,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self.recorded = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    # ─────────────────────────────────────────────
+    # Producer side (called on the request path)
+    # ─────────────────────────────────────────────
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        usage,
+        question: str = "",
+        input_breakdown: Dict = None,
+        attempt: int = None,
+    ):
+        """Enqueue one LLM call's usage. Never blocks and never raises."""
+        if not usage:
+            return
+        try:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            # Context-cache hits are reported separately from the prompt total
+            cached_tokens = cached_prompt_tokens(usage)
+            ctx = usage_context.get() or {}
+            now = datetime.now(timezone.utc)
+            rec = {
+                "ts": now.isoformat(timespec="milliseconds"),
+                "day": now.strftime("%Y-%m-%d"),
+                "stage": stage.lower(),
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cached_tokens": cached_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "cost_usd": estimate_cost(
+                    model, prompt_tokens, completion_tokens, cached_tokens
+                ),
+                "role_id": ctx.get("role_id"),
+                "college_id": ctx.get("college_id"),
+                "user_id": ctx.get("user_id"),
+                "question": (question or "")[:80],
+            }
+            if input_breakdown:
+                rec["input_breakdown"] = input_breakdown
+            if attempt is not None:
+                rec["attempt"] = attempt
+            self._ensure_started()
+            self._queue.put_nowait(rec)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+        except Exception as e:
+            logger.error(f"Failed to record token usage: {e}")
+
+    # ─────────────────────────────────────────────
+    # Writer thread
+    # ─────────────────────────────────────────────
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(
+                    target=self._run, name="usage-recorder", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._drain(block=True)
+        # Shutdown: write everything still queued, a batch at a time
+        while self._drain(block=False):
+            pass
+
+    def _drain(self, block: bool) -> int:
+        """Write up to one batch; returns the number of records written"""
+        batch: List[Dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def _write(self, batch: List[Dict]):
+        by_day = defaultdict(list)
+        for rec in batch:
+            by_day[rec["day"]].append(json.dumps(rec, default=str))
+        for day, lines in by_day.items():
+            try:
+                # One write() per day-batch; O_APPEND keeps workers from interleaving lines
+                with open(self._path(day), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError as e:
+                self.write_errors += 1
+                logger.error(f"Failed to write usage records: {e}")
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory, f"usage-{day}.jsonl")
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued records and stop the writer (called on app shutdown)"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stop.set()
+            thread.join(timeout)
+            self._stop.clear()
+
+    # ─────────────────────────────────────────────
+    # Aggregation
+    # ─────────────────────────────────────────────
+
+    def aggregate(self, days: int = 7, group_by: List[str] = None) -> Dict:
+        """
+        Sum tokens and cost over the last `days` days (UTC), grouped by any of
+        day, stage, model, role_id, college_id. Reads every worker's records.
+        """
+        group_by = [g for g in (group_by or list(GROUP_FIELDS)) if g in GROUP_FIELDS]
+        today = datetime.now(timezone.utc).date()
+        groups: Dict[tuple, Dict] = {}
+        totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                  "cached_tokens": 0, "total_tokens": 0, "cost_usd": 0.0}
+
+        for offset in range(days):
+            path = self._path((today - timedelta(days=offset)).strftime("%Y-%m-%d"))
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = tuple(rec.get(g) for g in group_by)
+                    row = groups.get(key)
+                    if row is None:
+                        row = {g: rec.get(g) for g in group_by}
+                        row.update({k: 0 for k in totals})
+                        row["cost_usd"] = 0.0
+                        groups[key] = row
+                    for target in (row, totals):
+                        target["calls"] += 1
+                        for k in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+                            target[k] += rec.get(k, 0) or 0
+                        target["cost_usd"] += rec.get("cost_usd", 0) or 0
+
+        rows = sorted(groups.values(), key=lambda r: r["cost_usd"], reverse=True)
+        for row in rows:
+            row["cost_usd"] = round(row["cost_usd"], 6)
+        totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return {"days": days, "group_by": group_by, "totals": totals, "rows": rows}
+
+    def get_stats(self) -> Dict:
+        """Get recorder statistics"""
+        return {
+            "recorded": self.recorded,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+
+# Global singleton
+usage_recorder = UsageRecorder(str(BACKEND_DIR / settings.USAGE_LOG_DIR))
@@ -31,6 +31,14 @@ app = FastAPI(
 
 print("✅ FastAPI App initialized.")
 
+# Rate limiting on /ask (registered before CORS so 429 responses still get CORS headers)
+from app.core.rate_limiter import rate_limiter, RateLimitMiddleware
+
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware, limiter=rate_limiter, paths=settings.RATE_LIMIT_PATHS
+    )
+
 # CORS Configuration (Production-Safe)
 allowed_origins = list(settings.ALLOWED_CORS_ORIGINS)
 
@@ -52,7 +60,7 @@ app.add_middleware(
 )
 
 
-from fastapi.responses import FileResponse as _FileResponse
+from fastapi.responses import FileResponse as _FileResponse, PlainTextResponse
 import os as _os
 
 @app.get("/")
@@ -86,7 +94,7 @@ def health_check(db: Session = Depends(get_db)):
         # AI Service check
         from app.services.ai_service import ai_service
 
-        ai_status = "configured" if ai_service.client else "unconfigured"
+        ai_status = "configured" if ai_service.deepseek_api_key else "unconfigured"
 
         # SQL Executor check
         from app.services.sql_executor import sql_executor
@@ -122,11 +130,36 @@ def get_metrics(db: Session = Depends(get_db)):
     """Get performance metrics and statistics"""
     try:
         from app.services.sql_executor import sql_executor
+        from app.core.rate_limiter import query_cache
+        from app.core.answer_cache import answer_cache
+        from app.core.job_store import job_store
+        from app.core.single_flight import question_flight, query_flight, async_query_flight
+        from app.core.metrics import STAGE_DURATION, DB_POOL_WAIT
+        from app.core.db import pool_stats
+        from app.core.usage_recorder import usage_recorder
+        from app.services.leaderboard_store import leaderboard_store
+        from app.services.result_table_catalog import result_table_catalog
+        from app.services.table_retriever import table_retriever
 
         metrics = {
             "timestamp": datetime.now().isoformat(),
             "executor": sql_executor.get_stats(),
             "cache": query_cache.get_stats(),
+            "answer_cache": answer_cache.get_stats(),
+            "job_store": job_store.get_stats(),
+            "rate_limiter": rate_limiter.get_stats(),
+            "usage_recorder": usage_recorder.get_stats(),
+            "leaderboard": leaderboard_store.get_stats(),
+            "result_tables": result_table_catalog.get_stats(),
+            "table_retriever": table_retriever.get_stats(),
+            "stages": STAGE_DURATION.summary(),
+            "db_pool": pool_stats(),
+            "db_pool_wait": DB_POOL_WAIT.summary(),
+            "single_flight": {
+                "questions": question_flight.get_stats(),
+                "sql": query_flight.get_stats(),
+                "sql_async": async_query_flight.get_stats(),
+            },
         }
 
         logger.debug(f"Metrics requested: {metrics}")
@@ -139,13 +172,108 @@ def get_metrics(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/metrics/prometheus")
+def get_prometheus_metrics():
+    """Stage latency, LLM token and DB pool metrics in Prometheus text format"""
+    from app.core.metrics import metrics_registry
+
+    return PlainTextResponse(
+        metrics_registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # Include Routers - Full Role-Based System
 from app.api.endpoints import ai_query
 from app.api.endpoints import auth
 from app.api.endpoints import conversations
+from app.api.endpoints import leaderboard
 
 app.include_router(ai_query.router, prefix="/api/v1/ai", tags=["AI Chat"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(
     conversations.router, prefix="/api/v1/conversations", tags=["Conversations"]
 )
+app.include_router(leaderboard.router, prefix="/api/v1", tags=["Leaderboard"])
+
+
+@app.on_event("startup")
+async def warm_db_pools():
+    """Open TLS connections up front so the first requests skip the handshake"""
+    count = settings.DB_POOL_WARM_CONNECTIONS
+    if count <= 0:
+        return
+
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    from app.core.db import warm_pool, warm_async_pool
+
+    sync_result, async_result = await asyncio.gather(
+        run_in_threadpool(warm_pool, count),
+        warm_async_pool(count),
+        return_exceptions=True,
+    )
+    for label, result in (("sync", sync_result), ("async", async_result)):
+        if isinstance(result, BaseException):
+            logger.warning(f"⚠️ {label} DB pool warm-up failed: {result}")
+        else:
+            logger.info(f"🔥 Warmed {result} {label} DB connections")
+
+
+@app.on_event("startup")
+async def start_rate_limit_sweeper():
+    """Periodically drop idle rate limit counters"""
+    if settings.RATE_LIMIT_ENABLED:
+        rate_limiter.start_sweeper(settings.RATE_LIMIT_SWEEP_INTERVAL_SECONDS)
+
+
+@app.on_event("startup")
+async def start_result_catalog_refresher():
+    """Pick up new result tables/columns without a restart"""
+    from app.services.result_table_catalog import result_table_catalog
+
+    result_table_catalog.start_refresher(settings.RESULT_CATALOG_REFRESH_SECONDS)
+
+
+@app.on_event("startup")
+async def start_leaderboard_refresher():
+    """Keep requested leaderboards fresh in the background"""
+    if settings.LEADERBOARD_BACKGROUND_REFRESH:
+        from app.services.leaderboard_store import leaderboard_store
+
+        leaderboard_store.start_refresher()
+
+
+@app.on_event("shutdown")
+async def close_ai_client():
+    """Release the pooled DeepSeek HTTP connections"""
+    from app.services.ai_service import ai_service
+
+    await ai_service.aclose()
+    logger.info("🔌 AI client connections closed")
+
+
+@app.on_event("shutdown")
+async def close_db_pools():
+    """Close pooled DB connections"""
+    from app.core.db import async_engine
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+@app.on_event("shutdown")
+def flush_usage_records():
+    """Write any queued token usage records before exit"""
+    from app.core.usage_recorder import usage_recorder
+
+    usage_recorder.close()
+
+
+@app.on_event("shutdown")
+def flush_logs():
+    """Drain the logging queue (runs last so shutdown messages are written)"""
+    from app.core.logging_config import stop_logging
+
+    logger.info("🛑 Shutting down, flushing logs")
+    stop_logging()
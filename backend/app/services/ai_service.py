@@ -13,17 +13,27 @@ FIXES & CHANGES:
 - Added confirmed schema for tests, srec result, standard_qb_codings tables
 - Added TYPE F (Trainer) and TYPE G (Assessment) query patterns
 - Token usage logging for monitoring
+- Self-correction retries continue the original conversation (failed SQL + error
+  appended as new turns) instead of rebuilding the system prompt, so the
+  provider's prefix cache covers the schema on every attempt
+- Prompt layout is static rules -> role prompt -> per-request content (schemas,
+  analysis, question) so requests share the longest possible cached prefix
+- The request pipeline is async-only: the blocking analysis / SQL / synthesis /
+  follow-up methods were removed in favour of their *_async variants
 """
 
 import os
 import re
 import json
-from datetime import datetime
-from openai import OpenAI
+import asyncio
+import httpx
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
 from app.core.config import settings
 from app.core.logging_config import get_logger
-from app.core.db import SessionLocal
-from sqlalchemy import text
+from app.core.metrics import record_llm_usage
+from app.core.usage_recorder import usage_recorder
+from app.services.result_table_catalog import result_table_catalog
 
 logger = get_logger("ai_service")
 
@@ -113,334 +123,8 @@ QUESTION_TABLES = [
 ]
 
 
-# ════════════════════════════════════════════════════════════════
-#  AI SERVICE
-# ════════════════════════════════════════════════════════════════
-
-
-class AIService:
-
-    def __init__(self):
-        self.deepseek_api_key = settings.DEEPSEEK_API_KEY or os.getenv(
-            "DEEPSEEK_API_KEY"
-        )
-
-        print(
-            f"DEBUG: DeepSeek API Key: {self.deepseek_api_key[:20]}..."
-            if self.deepseek_api_key
-            else "No DeepSeek key"
-        )
-
-        # Create DeepSeek client
-        if self.deepseek_api_key:
-            logger.info("DeepSeek API key configured")
-            self.deepseek_client = OpenAI(
-                api_key=self.deepseek_api_key,
-                base_url="https://api.deepseek.com",
-            )
-        else:
-            logger.warning("DeepSeek API key not found")
-            self.deepseek_client = None
-            print("⚠️ WARNING: DEEPSEEK_API_KEY is not set.")
-
-        # Always use DeepSeek
-        self.client = self.deepseek_client
-
-    def _estimate_tokens(self, text: str) -> int:
-        """Estimate token count (approx 4 chars per token)."""
-        if not text:
-            return 0
-        return len(text) // 4
-
-    def _log_token_usage(
-        self, 
-        interaction_type: str, 
-        usage, 
-        user_question: str, 
-        model: str,
-        input_breakdown: dict = None
-    ):
-        """Log token usage with optional breakdown."""
-        if not usage:
-            return
-
-        try:
-            breakdown_str = ""
-            if input_breakdown:
-                parts = [f"{k}: ~{v}" for k, v in input_breakdown.items()]
-                breakdown_str = f" ({', '.join(parts)})"
-
-            log_entry = (
-                f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {interaction_type.upper():<15} | "
-                f"Total: {usage.total_tokens:<5} "
-                f"(Input: {usage.prompt_tokens:<5}{breakdown_str}, Output: {usage.completion_tokens:<5}) | "
-                f"Model: {model:<15} | Q: {user_question[:50]}..."
-            )
-            
-            # Append to token_usage.log in the backend directory
-            with open("token_usage.log", "a", encoding="utf-8") as f:
-                f.write(log_entry + "\n")
-                
-        except Exception as e:
-            logger.error(f"Failed to log token usage: {e}")
-
-
-    def _get_client(self, model: str):
-        """Get the appropriate OpenAI client for the specified model"""
-        # For now, we only support DeepSeek
-        return self.deepseek_client
-
-    def _is_sql_truncated(self, sql: str) -> bool:
-        """
-        Check if the SQL query appears to be truncated/incomplete.
-        Signs of truncation:
-        - Missing closing parentheses
-        - Missing semicolon at end
-        - Ends with incomplete syntax (AND, OR, comma, etc.)
-        """
-        if not sql:
-            return True
-
-        sql = sql.strip()
-
-        # Check for unbalanced parentheses
-        if sql.count("(") != sql.count(")"):
-            return True
-
-        # Check for incomplete FROM/WHERE/JOIN (ends with keyword)
-        incomplete_endings = [" FROM", " WHERE", " AND", " OR", " JOIN", " ON", ","]
-        for ending in incomplete_endings:
-            if sql.upper().endswith(ending.upper()):
-                return True
-
-        # Query should end with semicolon or just be valid
-        if not sql.upper().startswith("SELECT"):
-            return True
-
-        return False
-
-    def _build_simplified_prompt(self, user_question: str) -> str:
-        """Build a simplified prompt for retry with fewer JOINs and simpler structure"""
-        return f"""
-You are a MySQL expert. Generate a SIMPLE, DIRECT SQL query for this question.
-Use minimal JOINs (max 2), no subqueries, no window functions.
-
-QUESTION: {user_question}
-
-Return ONLY the SELECT statement. Start with SELECT, end with semicolon.
-"""
-
-    # second update
-    def analyze_question_with_schema(
-        self,
-        user_question: str,
-        schema_context: str,
-        model: str = "deepseek-chat",
-        user_context_str: str = "",
-    ) -> dict:
-        """
-        Deep analysis of the question with FULL schema context.
-        The AI analyzes:
-        1. Question intent and what data is needed
-        2. Which tables and relationships can provide that data
-        3. Whether the query is answerable with available schema
-        4. Recommended query strategy
-
-        Returns: {
-            "can_answer": bool,
-            "query_type": str,
-            "recommended_tables": [...],
-            "reasoning": str,
-            "confidence": str,
-            "suggested_sql_approach": str
-        }
-        """
-        client = self._get_client(model)
-        if not client:
-            return {"can_answer": True, "error": "AI client not available"}
-
-        analysis_prompt = f"""You are an expert database analyst. Identify the best tables and strategy to answer the user's question.
-
-DATABASE SCHEMA:
-{schema_context}
-
-USER QUESTION: "{user_question}"
-
-USER CONTEXT:
-{user_context_str}
-
-YOUR TASK:
-1. Identify EVERYTHING the user is asking for.
-2. **DEEP SEARCH MODE**: The user requires a thorough analysis. Do not stop at the first match.
-   - Search for indirect relationships.
-   - If a table seems empty or irrelevant, check for mapping tables.
-   - If the data is not in the obvious table, look for related tables (e.g. `colleges` -> `users` -> `results`).
-3. CRITICAL: Data might be stored:
-   - DIRECTLY (e.g. user_id is in the table).
-   - HIERARCHICALLY (e.g. table is linked to a College, Dept, Batch, or Section mapping).
-   - If one table (like user_course_enrollments) is empty, a mapping table (like course_academic_maps) almost certainly contains the data.
-4. RECOMMENDED TABLES: List ALL tables needed for JOINs to answer the question accurately within the user's scope.
-5. BE OPTIMISTIC: If it sounds like data that should be in an LMS, it likely is. Find the closest match.
-
-Respond in this EXACT JSON format (no markdown, no extra text):
-Reply ONLY in this exact JSON format (no markdown, no extra text):
-{{
-    "can_answer": true/false,
-    "query_type": "simple|complex|general_knowledge",
-    "recommended_tables": ["table1", "table2"],
-    "suggested_sql_approach": "one-line description",
-    "reasoning": "detailed reasoning allowing for deep analysis"
-}}
-
-RULES:
-- Only recommend tables that exist in the schema above
-- Never use placeholder values like {{user_id}} — use literal values
-- "general_knowledge" only for: Companies, Skills, Educational Info, Career Advice
-- "Who am I?" / "My Profile" = database query (type: simple), NOT general_knowledge
-- tests.testName is camelCase — never suggest test_name
-- coding result FK to tests = topic_test_id (NOT test_id)
-- Bridge table between tests ↔ questions = test_question_maps
-- College result tables follow: [college]_[year]_[sem]_coding_result"""
-
-        try:
-            model_name = "deepseek-chat"
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a database schema expert. Respond with valid JSON only.",
-                    },
-                    {"role": "user", "content": analysis_prompt},
-                ],
-                max_tokens=getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),  # Fallback to 2000 if not set
-                temperature=0.1,
-                stream=False,
-            )
-
-            raw = response.choices[0].message.content.strip()
-
-            # Log token usage
-            if response.usage:
-                # Estimate breakdown
-                sys_tokens = self._estimate_tokens(analysis_prompt.split("DATABASE SCHEMA:")[0])
-                q_tokens = self._estimate_tokens(user_question)
-                schema_tokens = self._estimate_tokens(schema_context)
-                
-                self._log_token_usage(
-                    "SCHEMA_ANALYSIS", 
-                    response.usage, 
-                    user_question, 
-                    model_name,
-                    input_breakdown={
-                        "Schema": schema_tokens,
-                        "System": sys_tokens,
-                        "Q": q_tokens
-                    }
-                )
-
-            # Strip markdown fences if present
-            if "```json" in raw:
-                raw = raw.split("```json")[1].split("```")[0].strip()
-            elif "```" in raw:
-                raw = raw.split("```")[1].split("```")[0].strip()
-
-            if not raw.endswith("}"):
-                raw += "}"
-
-            try:
-                analysis = json.loads(raw)
-            except Exception:
-                logger.warning(f"Malformed JSON from schema analysis: {raw[:100]}")
-                return {
-                    "can_answer": True,
-                    "query_type": "simple",
-                    "recommended_tables": [],
-                    "reasoning": "JSON parse error — proceeding with direct SQL generation",
-                    "suggested_sql_approach": "Standard SQL",
-                    "confidence": "low",
-                }
-
-            logger.info(
-                f"Schema Analysis | "
-                f"can_answer={analysis.get('can_answer')} | "
-                f"type={analysis.get('query_type')} | "
-                f"tables={analysis.get('recommended_tables')}"
-            )
-
-            return {
-                "can_answer": analysis.get("can_answer", True),
-                "query_type": analysis.get("query_type", "unknown"),
-                "recommended_tables": analysis.get("recommended_tables", []),
-                "reasoning": analysis.get("reasoning", ""),
-                "suggested_sql_approach": analysis.get("suggested_sql_approach", ""),
-                "confidence": analysis.get("confidence", "medium"),
-            }
-
-        except Exception as e:
-            logger.error(f"Schema Analysis Error: {e}")
-            return {
-                "can_answer": True,
-                "error": str(e),
-                "query_type": "unknown",
-                "recommended_tables": [],
-                "reasoning": "Analysis failed — proceeding with direct SQL generation",
-                "confidence": "low",
-            }
-
-    # ────────────────────────────────────────────
-    # SQL Generation
-    # ────────────────────────────────────────────
-
-    def generate_sql(
-        self,
-        system_prompt: str,
-        user_question: str,
-        model: str = "deepseek-chat",
-        result_table: str = None,
-        error_message: str = None,
-    ) -> str:
-        """
-        Generates SQL from a natural language question.
-
-        Args:
-            system_prompt:  Admin/role prompt from get_admin_prompt()
-            user_question:  User's natural language question
-            model:          AI model (default: deepseek-chat)
-            result_table:   Optional college result table name.
-                            When provided, real columns are injected into
-                            the prompt so AI never guesses column names.
-            error_message:  Optional error message from a failed DB execution 
-                            to trigger self-correction.
-
-        Returns:
-            A complete, valid SQL SELECT string — or "Error: ..." on failure.
-        """
-        client = self._get_client(model)
-        if not client:
-            return f"Error: API key for '{model}' is missing"
-
-        # Inject verified column schema if result_table provided
-        schema_hint = ""
-        if result_table:
-            schema_hint = (
-                f"\n\n### VERIFIED RESULT TABLE SCHEMA:\n"
-                f"{self._build_result_table_schema_hint(result_table)}\n"
-            )
-
-        correction_hint = ""
-        if error_message:
-            correction_hint = (
-                f"\n\n### ⚠️ SELF-CORRECTION REQUIRED:\n"
-                f"Your previous attempt failed with the following error from the database:\n"
-                f"'{error_message}'\n\n"
-                f"Please analyze the error (e.g., missing column, syntax error, GROUP BY issue) "
-                f"and provide a corrected SQL query that resolves it."
-            )
-
-        safe_system_prompt = f"""{system_prompt}{schema_hint}{correction_hint}
-
-### CONFIRMED TABLE FACTS (verified via DESCRIBE — follow exactly):
+# Static rules appended to every SQL generation prompt (built once at import)
+SQL_GENERATION_RULES = """### CONFIRMED TABLE FACTS (verified via DESCRIBE — follow exactly):
 
 -- tests table:
 --   testName          VARCHAR(50)   ← camelCase, NEVER test_name
@@ -575,123 +259,577 @@ RULES:
     - For detailed analysis: use college result tables (coding_result, mcq_result)
 15. **Active record convention**: Always filter status = 1 for active enrollments/allocations unless querying inactive"""
 
-        model_name = "deepseek-chat" if "deepseek" in model else "gpt-4"
 
-        # ── Attempt 1 ──────────────────────────────────────────────────────
+# ════════════════════════════════════════════════════════════════
+#  AI SERVICE
+# ════════════════════════════════════════════════════════════════
+
+
+class AIService:
+
+    def __init__(self):
+        self.deepseek_api_key = settings.DEEPSEEK_API_KEY or os.getenv(
+            "DEEPSEEK_API_KEY"
+        )
+
+        print(
+            f"DEBUG: DeepSeek API Key: {self.deepseek_api_key[:20]}..."
+            if self.deepseek_api_key
+            else "No DeepSeek key"
+        )
+
+        if self.deepseek_api_key:
+            logger.info("DeepSeek API key configured")
+        else:
+            logger.warning("DeepSeek API key not found")
+            print("⚠️ WARNING: DEEPSEEK_API_KEY is not set.")
+
+        # Async client is created lazily inside the running event loop
+        self._async_client = None
+        self._http_client = None
+        self._semaphore = None
+
+    # ────────────────────────────────────────────
+    # Async Client
+    # ────────────────────────────────────────────
+
+    def _get_async_client(self):
+        """Shared AsyncOpenAI client over one pooled keep-alive httpx.AsyncClient."""
+        if not self.deepseek_api_key:
+            return None
+        if self._async_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+                timeout=httpx.Timeout(
+                    settings.AI_TIMEOUT_SQL_SECONDS, connect=10.0
+                ),
+            )
+            self._async_client = AsyncOpenAI(
+                api_key=self.deepseek_api_key,
+                base_url="https://api.deepseek.com",
+                http_client=self._http_client,
+            )
+        return self._async_client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Caps in-flight DeepSeek calls per worker."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        return self._semaphore
+
+    async def _acreate(self, timeout: float, **kwargs):
+        """
+        chat.completions.create() under the concurrency cap. The per-stage
+        timeout covers the wait for a slot as well as the call itself.
+        """
+        async def call():
+            async with self._get_semaphore():
+                return await self._get_async_client().chat.completions.create(
+                    timeout=timeout, **kwargs
+                )
+
+        return await asyncio.wait_for(call(), timeout)
+
+    async def aclose(self):
+        """Close the pooled HTTP connections (called on app shutdown)."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._async_client = None
+        self._http_client = None
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Estimate token count (approx 4 chars per token)."""
+        if not text:
+            return 0
+        return len(text) // 4
+
+    def _log_token_usage(
+        self, 
+        interaction_type: str, 
+        usage, 
+        user_question: str, 
+        model: str,
+        input_breakdown: dict = None,
+        attempt: int = None,
+    ):
+        """Record token usage (non-blocking) with optional breakdown."""
+        if not usage:
+            return
+
+        record_llm_usage(interaction_type, usage)
+        usage_recorder.record(
+            interaction_type, model, usage, user_question, input_breakdown, attempt
+        )
+
+    def _is_sql_truncated(self, sql: str) -> bool:
+        """
+        Check if the SQL query appears to be truncated/incomplete.
+        Signs of truncation:
+        - Missing closing parentheses
+        - Missing semicolon at end
+        - Ends with incomplete syntax (AND, OR, comma, etc.)
+        """
+        if not sql:
+            return True
+
+        sql = sql.strip()
+
+        # Check for unbalanced parentheses
+        if sql.count("(") != sql.count(")"):
+            return True
+
+        # Check for incomplete FROM/WHERE/JOIN (ends with keyword)
+        incomplete_endings = [" FROM", " WHERE", " AND", " OR", " JOIN", " ON", ","]
+        for ending in incomplete_endings:
+            if sql.upper().endswith(ending.upper()):
+                return True
+
+        # Query should end with semicolon or just be valid
+        if not sql.upper().startswith("SELECT"):
+            return True
+
+        return False
+
+    def _build_simplified_prompt(self, user_question: str) -> str:
+        """Build a simplified prompt for retry with fewer JOINs and simpler structure"""
+        return f"""
+You are a MySQL expert. Generate a SIMPLE, DIRECT SQL query for this question.
+Use minimal JOINs (max 2), no subqueries, no window functions.
+
+QUESTION: {user_question}
+
+Return ONLY the SELECT statement. Start with SELECT, end with semicolon.
+"""
+
+    # second update
+    def _build_analysis_prompt(
+        self,
+        user_question: str,
+        schema_context: str,
+        user_context_str: str = "",
+    ) -> str:
+        """Builds the Stage 1 schema analysis prompt."""
+        # Instructions first, then the table list, then the per-request parts,
+        # so consecutive analyses share a cached prompt prefix
+        return f"""You are an expert database analyst. Identify the best tables and strategy to answer the user's question.
+
+YOUR TASK:
+1. Identify EVERYTHING the user is asking for.
+2. **DEEP SEARCH MODE**: The user requires a thorough analysis. Do not stop at the first match.
+   - Search for indirect relationships.
+   - If a table seems empty or irrelevant, check for mapping tables.
+   - If the data is not in the obvious table, look for related tables (e.g. `colleges` -> `users` -> `results`).
+3. CRITICAL: Data might be stored:
+   - DIRECTLY (e.g. user_id is in the table).
+   - HIERARCHICALLY (e.g. table is linked to a College, Dept, Batch, or Section mapping).
+   - If one table (like user_course_enrollments) is empty, a mapping table (like course_academic_maps) almost certainly contains the data.
+4. RECOMMENDED TABLES: List ALL tables needed for JOINs to answer the question accurately within the user's scope.
+5. BE OPTIMISTIC: If it sounds like data that should be in an LMS, it likely is. Find the closest match.
+
+Reply ONLY in this exact JSON format (no markdown, no extra text):
+{{
+    "can_answer": true/false,
+    "query_type": "simple|complex|general_knowledge",
+    "recommended_tables": ["table1", "table2"],
+    "suggested_sql_approach": "one-line description",
+    "reasoning": "detailed reasoning allowing for deep analysis"
+}}
+
+RULES:
+- Only recommend tables that exist in the schema below
+- Never use placeholder values like {{user_id}} — use literal values
+- "general_knowledge" only for: Companies, Skills, Educational Info, Career Advice
+- "Who am I?" / "My Profile" = database query (type: simple), NOT general_knowledge
+- tests.testName is camelCase — never suggest test_name
+- coding result FK to tests = topic_test_id (NOT test_id)
+- Bridge table between tests ↔ questions = test_question_maps
+- College result tables follow: [college]_[year]_[sem]_coding_result
+
+DATABASE SCHEMA:
+{schema_context}
+
+USER CONTEXT:
+{user_context_str}
+
+USER QUESTION: "{user_question}"
+"""
+
+    def _analysis_request(self, analysis_prompt: str) -> dict:
+        """Chat completion kwargs for schema analysis."""
+        return {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a database schema expert. Respond with valid JSON only.",
+                },
+                {"role": "user", "content": analysis_prompt},
+            ],
+            "max_tokens": getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),  # Fallback to 2000 if not set
+            "temperature": 0.1,
+            "stream": False,
+        }
+
+    def _parse_analysis_response(
+        self,
+        response,
+        user_question: str,
+        schema_context: str,
+        analysis_prompt: str,
+    ) -> dict:
+        """Logs usage and parses the schema analysis JSON reply."""
+        raw = response.choices[0].message.content.strip()
+
+        # Log token usage
+        if response.usage:
+            # Estimate breakdown
+            sys_tokens = self._estimate_tokens(analysis_prompt.split("DATABASE SCHEMA:")[0])
+            q_tokens = self._estimate_tokens(user_question)
+            schema_tokens = self._estimate_tokens(schema_context)
+            
+            self._log_token_usage(
+                "SCHEMA_ANALYSIS", 
+                response.usage, 
+                user_question, 
+                "deepseek-chat",
+                input_breakdown={
+                    "Schema": schema_tokens,
+                    "System": sys_tokens,
+                    "Q": q_tokens
+                }
+            )
+
+        # Strip markdown fences if present
+        if "```json" in raw:
+            raw = raw.split("```json")[1].split("```")[0].strip()
+        elif "```" in raw:
+            raw = raw.split("```")[1].split("```")[0].strip()
+
+        if not raw.endswith("}"):
+            raw += "}"
+
+        try:
+            analysis = json.loads(raw)
+        except Exception:
+            logger.warning(f"Malformed JSON from schema analysis: {raw[:100]}")
+            return {
+                "can_answer": True,
+                "query_type": "simple",
+                "recommended_tables": [],
+                "reasoning": "JSON parse error — proceeding with direct SQL generation",
+                "suggested_sql_approach": "Standard SQL",
+                "confidence": "low",
+            }
+
+        logger.info(
+            f"Schema Analysis | "
+            f"can_answer={analysis.get('can_answer')} | "
+            f"type={analysis.get('query_type')} | "
+            f"tables={analysis.get('recommended_tables')}"
+        )
+
+        return {
+            "can_answer": analysis.get("can_answer", True),
+            "query_type": analysis.get("query_type", "unknown"),
+            "recommended_tables": analysis.get("recommended_tables", []),
+            "reasoning": analysis.get("reasoning", ""),
+            "suggested_sql_approach": analysis.get("suggested_sql_approach", ""),
+            "confidence": analysis.get("confidence", "medium"),
+        }
+
+    @staticmethod
+    def _analysis_error(e: Exception) -> dict:
+        logger.error(f"Schema Analysis Error: {e}")
+        return {
+            "can_answer": True,
+            "error": str(e),
+            "query_type": "unknown",
+            "recommended_tables": [],
+            "reasoning": "Analysis failed — proceeding with direct SQL generation",
+            "confidence": "low",
+        }
+
+    async def analyze_question_with_schema_async(
+        self,
+        user_question: str,
+        schema_context: str,
+        model: str = "deepseek-chat",
+        user_context_str: str = "",
+    ) -> dict:
+        """
+        Deep analysis of the question with FULL schema context.
+        The AI analyzes:
+        1. Question intent and what data is needed
+        2. Which tables and relationships can provide that data
+        3. Whether the query is answerable with available schema
+        4. Recommended query strategy
+
+        Returns: {
+            "can_answer": bool,
+            "query_type": str,
+            "recommended_tables": [...],
+            "reasoning": str,
+            "confidence": str,
+            "suggested_sql_approach": str
+        }
+        """
+        if not self._get_async_client():
+            return {"can_answer": True, "error": "AI client not available"}
+
+        analysis_prompt = self._build_analysis_prompt(
+            user_question, schema_context, user_context_str
+        )
         try:
-            logger.debug(f"SQL generation attempt 1: {user_question[:80]}")
+            response = await self._acreate(
+                settings.AI_TIMEOUT_ANALYSIS_SECONDS,
+                **self._analysis_request(analysis_prompt),
+            )
+            return self._parse_analysis_response(
+                response, user_question, schema_context, analysis_prompt
+            )
+        except Exception as e:
+            return self._analysis_error(e)
 
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": safe_system_prompt},
-                    {"role": "user", "content": user_question},
-                ],
-                max_tokens=getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),  # Fallback to 2000 if not set
-                temperature=0.0,
-                seed=42,
-                stream=False,
+    # ────────────────────────────────────────────
+    # SQL Generation
+    # ────────────────────────────────────────────
+
+    def _build_sql_system_prompt(self, system_prompt: str) -> str:
+        """
+        Builds the SQL generation system prompt: static rules first, then the
+        caller's role prompt. DeepSeek caches prompt prefixes, so nothing
+        request-specific goes here; corrections go in later turns.
+        """
+        return f"{SQL_GENERATION_RULES}\n\n{system_prompt}"
+
+    def _build_sql_user_prompt(
+        self,
+        user_question: str,
+        request_context: str = None,
+        result_table: str = None,
+    ) -> str:
+        """Per-request part of the SQL prompt (verified result table schema, context, question)."""
+        schema_hint = ""
+        if result_table:
+            schema_hint = (
+                f"### VERIFIED RESULT TABLE SCHEMA:\n"
+                f"{self._build_result_table_schema_hint(result_table)}\n\n"
             )
+        return f"{schema_hint}{request_context or user_question}"
 
-            generated = response.choices[0].message.content
-
-            # Log token usage
-            if hasattr(response, "usage") and response.usage:
-                u = response.usage
-                
-                # Estimate breakdown for SQL Gen
-                # prompt contains: detailed schema, role instruction, analysis result
-                # roughly:
-                schema_part = safe_system_prompt.split("CONFIRMED TABLE FACTS")[0] if "CONFIRMED TABLE FACTS" in safe_system_prompt else ""
-                sys_part = safe_system_prompt.split("CONFIRMED TABLE FACTS")[1] if "CONFIRMED TABLE FACTS" in safe_system_prompt else ""
-                
-                self._log_token_usage(
-                    "SQL_GENERATION", 
-                    u, 
-                    user_question, 
-                    model_name,
-                    input_breakdown={
-                        "Schema": self._estimate_tokens(schema_part),
-                        "System": self._estimate_tokens(sys_part),
-                        "Q": self._estimate_tokens(user_question)
-                    }
-                )
-                logger.info(
-                    f"SQL tokens | prompt={u.prompt_tokens} "
-                    f"completion={u.completion_tokens} total={u.total_tokens}"
-                )
-                limit = getattr(settings, "AI_MAX_OUTPUT_TOKENS", 2000)
-                if u.completion_tokens > (limit * 0.9):
-                    logger.warning(
-                        f"Completion near limit ({u.completion_tokens}/{limit}) - "
-                        "consider simplifying question or raising max_tokens further."
-                    )
+    @staticmethod
+    def _correction_turns(previous_attempts: list = None, error_message: str = None) -> list:
+        """
+        Conversation turns appended after the original question on a retry:
+        each failed SQL as an assistant turn, followed by its error as a user turn.
+        A bare error_message (no failed SQL known) becomes a single user turn.
+        """
+        attempts = list(previous_attempts or [])
+        if error_message and not attempts:
+            attempts = [{"sql": None, "error": error_message}]
+
+        turns = []
+        for failed in attempts:
+            if failed.get("sql"):
+                turns.append({"role": "assistant", "content": failed["sql"]})
+            turns.append({
+                "role": "user",
+                "content": (
+                    f"That query failed: {failed['error']}\n"
+                    "Fix only what the error points at and return the corrected SELECT statement."
+                ),
+            })
+        return turns
+
+    def _sql_request(
+        self,
+        model_name: str,
+        safe_system_prompt: str,
+        user_content: str,
+        max_tokens: int,
+        correction_turns: list = None,
+    ) -> dict:
+        """Chat completion kwargs for SQL generation (first attempt and simplified retry)."""
+        return {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": safe_system_prompt},
+                {"role": "user", "content": user_content},
+                *(correction_turns or []),
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.0,
+            "seed": 42,
+            "stream": False,
+        }
+
+    def _handle_sql_response(
+        self,
+        response,
+        user_question: str,
+        model_name: str,
+        safe_system_prompt: str,
+        user_content: str = "",
+        correction_turns: list = None,
+        attempt: int = 1,
+    ) -> str:
+        """Logs usage for one generation attempt and returns the raw generated SQL."""
+        generated = response.choices[0].message.content
 
-            logger.debug(f"SQL attempt 1: {generated[:150]}")
+        # Log token usage
+        if hasattr(response, "usage") and response.usage:
+            u = response.usage
+            
+            # Estimate breakdown for SQL Gen
+            # system = static rules + role prompt (cacheable prefix),
+            # user = selected schemas + analysis + question
+            breakdown = {
+                "Rules": self._estimate_tokens(SQL_GENERATION_RULES),
+                "System": self._estimate_tokens(safe_system_prompt) - self._estimate_tokens(SQL_GENERATION_RULES),
+                "Request": self._estimate_tokens(user_content),
+                "Q": self._estimate_tokens(user_question)
+            }
+            if correction_turns:
+                breakdown["Correction"] = sum(
+                    self._estimate_tokens(t["content"]) for t in correction_turns
+                )
 
-            if self._is_sql_truncated(generated):
+            self._log_token_usage(
+                "SQL_GENERATION" if attempt == 1 else "SQL_CORRECTION",
+                u, 
+                user_question, 
+                model_name,
+                input_breakdown=breakdown,
+                attempt=attempt,
+            )
+            logger.info(
+                f"SQL tokens (attempt {attempt}) | prompt={u.prompt_tokens} "
+                f"cached={getattr(u, 'prompt_cache_hit_tokens', 0) or 0} "
+                f"completion={u.completion_tokens} total={u.total_tokens}"
+            )
+            limit = getattr(settings, "AI_MAX_OUTPUT_TOKENS", 2000)
+            if u.completion_tokens > (limit * 0.9):
                 logger.warning(
-                    "SQL truncated on attempt 1 — retrying with simplified prompt"
-                )
-                return self._generate_sql_retry(
-                    client, model_name, user_question, safe_system_prompt
+                    f"Completion near limit ({u.completion_tokens}/{limit}) - "
+                    "consider simplifying question or raising max_tokens further."
                 )
 
-            return generated
+        logger.debug(f"SQL attempt {attempt}: {generated[:150]}")
+        return generated
 
-        except Exception as e:
-            logger.error(f"SQL generation error: {e}")
-            return f"Error: {e}"
+    def _handle_sql_retry_response(self, response, user_question: str, model_name: str) -> str:
+        """Logs usage for the simplified retry and rejects still-truncated SQL."""
+        generated = response.choices[0].message.content
+
+        if hasattr(response, "usage") and response.usage:
+            self._log_token_usage(
+                "SQL_RETRY", response.usage, user_question, model_name
+            )
+            logger.info(
+                f"SQL retry tokens | completion={response.usage.completion_tokens}/1200"
+            )
+
+        if self._is_sql_truncated(generated):
+            logger.error(
+                "SQL still truncated after retry — returning error to caller"
+            )
+            return (
+                "Error: Unable to generate a complete SQL query for this request. "
+                "Please try a simpler or more specific question."
+            )
+
+        logger.info("SQL attempt 2 succeeded.")
+        return generated
 
-    def _generate_sql_retry(
+    async def generate_sql_async(
         self,
-        client,
-        model_name: str,
+        system_prompt: str,
         user_question: str,
-        safe_system_prompt: str,
+        model: str = "deepseek-chat",
+        result_table: str = None,
+        error_message: str = None,
+        previous_attempts: list = None,
+        request_context: str = None,
     ) -> str:
         """
-        Attempt 2 - retries with a simplified prompt when attempt 1 was truncated.
-        Forces fewer JOINs, no correlated subqueries, simpler structure.
+        Generates SQL from a natural language question (one retry with a
+        simplified prompt if the first attempt is truncated).
+
+        Args:
+            system_prompt:  Stable role prompt (e.g. from get_admin_prompt());
+                            placed after the static rules in the system message
+            user_question:  User's natural language question
+            model:          AI model (default: deepseek-chat)
+            result_table:   Optional college result table name.
+                            When provided, real columns are injected into
+                            the prompt so AI never guesses column names.
+            error_message:  Optional error message from a failed DB execution 
+                            to trigger self-correction.
+            previous_attempts: Optional [{"sql", "error"}] from earlier failed
+                            attempts, replayed as conversation turns after the
+                            unchanged system/user messages.
+            request_context: Optional per-request prompt (selected schemas,
+                            analysis, task) sent as the user message instead
+                            of the bare question.
+
+        Returns:
+            A complete, valid SQL SELECT string — or "Error: ..." on failure.
         """
-        simplified = self._build_simplified_prompt(user_question)
+        if not self._get_async_client():
+            return f"Error: API key for '{model}' is missing"
+
+        safe_system_prompt = self._build_sql_system_prompt(system_prompt)
+        user_content = self._build_sql_user_prompt(user_question, request_context, result_table)
+        correction_turns = self._correction_turns(previous_attempts, error_message)
+        attempt = len(previous_attempts or []) + 1
+        model_name = "deepseek-chat" if "deepseek" in model else "gpt-4"
 
+        # ── Attempt 1 ──────────────────────────────────────────────────────
         try:
-            logger.debug(f"SQL generation attempt 2 (simplified): {user_question[:80]}")
+            logger.debug(f"SQL generation attempt {attempt}: {user_question[:80]}")
 
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": safe_system_prompt},
-                    {"role": "user", "content": simplified},
-                ],
-                max_tokens=1200,
-                temperature=0.0,
-                seed=42,
-                stream=False,
+            response = await self._acreate(
+                settings.AI_TIMEOUT_SQL_SECONDS,
+                **self._sql_request(
+                    model_name,
+                    safe_system_prompt,
+                    user_content,
+                    getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),
+                    correction_turns,
+                ),
             )
+            generated = self._handle_sql_response(
+                response, user_question, model_name, safe_system_prompt,
+                user_content, correction_turns, attempt,
+            )
+            if not self._is_sql_truncated(generated):
+                return generated
 
-            generated = response.choices[0].message.content
-
-            if hasattr(response, "usage") and response.usage:
-                self._log_token_usage(
-                    "SQL_RETRY", response.usage, user_question, model_name
-                )
-                logger.info(
-                    f"SQL retry tokens | completion={response.usage.completion_tokens}/1200"
-                )
+            logger.warning(
+                "SQL truncated on attempt 1 — retrying with simplified prompt"
+            )
+        except Exception as e:
+            logger.error(f"SQL generation error: {e}")
+            return f"Error: {e}"
 
-            if self._is_sql_truncated(generated):
-                logger.error(
-                    "SQL still truncated after retry — returning error to caller"
-                )
-                return (
-                    "Error: Unable to generate a complete SQL query for this request. "
-                    "Please try a simpler or more specific question."
-                )
+        # ── Attempt 2 (simplified) ─────────────────────────────────────────
+        try:
+            logger.debug(f"SQL generation attempt 2 (simplified): {user_question[:80]}")
 
-            logger.info("SQL attempt 2 succeeded.")
-            return generated
+            response = await self._acreate(
+                settings.AI_TIMEOUT_SQL_SECONDS,
+                **self._sql_request(
+                    model_name,
+                    safe_system_prompt,
+                    self._build_simplified_prompt(user_question),
+                    1200,
+                ),
+            )
+            return self._handle_sql_retry_response(response, user_question, model_name)
 
         except Exception as e:
             logger.error(f"SQL retry error: {e}")
@@ -756,27 +894,21 @@ RULES:
     # Answer Synthesis
     # ────────────────────────────────────────────
 
-    def synthesize_answer(
+    def _build_synthesis_request(
         self,
         user_question: str,
-        sql_result: str,
         row_data: list,
-        model: str = "deepseek-chat",
         role_id: int = None,
-    ) -> str:
+    ) -> tuple:
         """
-        Converts raw query results into a human-readable Markdown summary.
-        Admins (role 1, 2) receive executive-level structured output.
+        Builds the synthesis chat messages.
+        Returns (messages, result_prefix), or (None, answer) when no LLM call is needed.
         """
-        client = self._get_client(model)
-        if not client:
-            return f"Data retrieved: {row_data}\n(AI unavailable - missing API key)"
-
         validation = self._validate_result_completeness(user_question, row_data)
 
         # Early exit - empty result
         if validation["data_quality"] == "empty":
-            return (
+            return None, (
                 "❌ No data found. Possible reasons:\n"
                 "1. The requested data doesn't exist in the database\n"
                 "2. Search filters are too restrictive\n"
@@ -827,14 +959,8 @@ RULES:
         row_json = json.dumps(display_rows, indent=2, default=str)[:10000]
         total_records = len(row_data) if isinstance(row_data, list) else 1
 
+        # Role-level instructions first, request data last (stable cached prefix)
         prompt = f"""
-User Question: "{user_question}"
-Role ID: {role_id}
-Total Records: {total_records}
-
-Retrieved Data:
-{row_json}{truncation_note}
-
 Task: {persona}
 
 {guidance}
@@ -844,33 +970,64 @@ Output Guidelines:
 - Use Markdown formatting (tables, **bold**, bullet points)
 - Base ONLY on the retrieved data - no hallucination
 - If data is partial, label it [PARTIAL RESULTS] but still present it fully
+
+Role ID: {role_id}
+User Question: "{user_question}"
+Total Records: {total_records}
+
+Retrieved Data:
+{row_json}{truncation_note}
 """
 
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are a professional data analyst. "
+                    "Output comprehensive, well-formatted Markdown summaries. "
+                    "Present ALL data received. Be thorough and strategic."
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ]
+        return messages, result_prefix
+
+    async def synthesize_answer_async(
+        self,
+        user_question: str,
+        sql_result: str,
+        row_data: list,
+        model: str = "deepseek-chat",
+        role_id: int = None,
+    ) -> str:
+        """
+        Converts raw query results into a human-readable Markdown summary.
+        Admins (role 1, 2) receive executive-level structured output.
+        """
+        if not self._get_async_client():
+            return f"Data retrieved: {row_data}\n(AI unavailable - missing API key)"
+
+        messages, result_prefix = self._build_synthesis_request(
+            user_question, row_data, role_id
+        )
+        if messages is None:
+            return result_prefix
+
         try:
             model_name = "deepseek-chat"
-            response = client.chat.completions.create(
+            response = await self._acreate(
+                settings.AI_TIMEOUT_SYNTHESIS_SECONDS,
                 model=model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a professional data analyst. "
-                            "Output comprehensive, well-formatted Markdown summaries. "
-                            "Present ALL data received. Be thorough and strategic."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+                messages=messages,
                 max_tokens=getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),
                 temperature=0.2,
                 seed=42,
             )
-            # Log token usage
             if response.usage:
                 self._log_token_usage(
-                    "ANSWER_SYNTHESIS", 
-                    response.usage, 
-                    user_question, 
+                    "ANSWER_SYNTHESIS",
+                    response.usage,
+                    user_question,
                     model_name,
                     input_breakdown={
                         "Data": self._estimate_tokens(json.dumps(row_data, default=str)),
@@ -887,27 +1044,133 @@ Output Guidelines:
                 f"```json\n{json.dumps(row_data, indent=2, default=str)}\n```"
             )
 
+    @staticmethod
+    def _stream_usage(chunk):
+        """Usage object of a stream chunk, if any (openai 1.3.7 leaves it an untyped dict)"""
+        usage = getattr(chunk, "usage", None)
+        if isinstance(usage, dict):
+            usage = CompletionUsage.construct(**usage)
+        return usage
+
+    async def stream_synthesize_answer_async(
+        self,
+        user_question: str,
+        sql_result: str,
+        row_data: list,
+        model: str = "deepseek-chat",
+        role_id: int = None,
+    ):
+        """
+        Streaming variant of synthesize_answer_async().
+        Yields answer text chunks as the model produces them (stream=True).
+        """
+        if not self._get_async_client():
+            yield f"Data retrieved: {row_data}\n(AI unavailable - missing API key)"
+            return
+
+        messages, result_prefix = self._build_synthesis_request(
+            user_question, row_data, role_id
+        )
+        if messages is None:
+            yield result_prefix
+            return
+        if result_prefix:
+            yield result_prefix
+
+        try:
+            # The concurrency slot is held for the whole stream, not just the first
+            # byte; waiting for it counts against the synthesis timeout
+            semaphore = self._get_semaphore()
+            await asyncio.wait_for(semaphore.acquire(), settings.AI_TIMEOUT_SYNTHESIS_SECONDS)
+            try:
+                stream = await self._get_async_client().chat.completions.create(
+                    model="deepseek-chat",
+                    messages=messages,
+                    max_tokens=getattr(settings, "AI_MAX_OUTPUT_TOKENS", 3000),
+                    temperature=0.2,
+                    seed=42,
+                    stream=True,
+                    # Usage arrives on a final chunk with no choices
+                    extra_body={"stream_options": {"include_usage": True}},
+                    timeout=settings.AI_TIMEOUT_SYNTHESIS_SECONDS,
+                )
+                usage = None
+                async for chunk in stream:
+                    usage = self._stream_usage(chunk) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                semaphore.release()
+
+            if usage:
+                self._log_token_usage(
+                    "ANSWER_SYNTHESIS",
+                    usage,
+                    user_question,
+                    "deepseek-chat",
+                    input_breakdown={
+                        "Data": self._estimate_tokens(json.dumps(row_data, default=str)),
+                        "SQL": self._estimate_tokens(sql_result),
+                        "System": 800  # Approx
+                    }
+                )
+
+        except Exception as e:
+            logger.error(f"Streaming answer synthesis error: {e}")
+            yield (
+                f"\n\nRetrieved data:\n"
+                f"```json\n{json.dumps(row_data, indent=2, default=str)}\n```"
+            )
+
 
 
     # ────────────────────────────────────────────
     # Follow-up Generation
     # ────────────────────────────────────────────
 
-    def generate_follow_ups(
+    FOLLOW_UP_FALLBACKS = {
+        "assessment": [
+            "Which students scored highest in this assessment?",
+            "Show questions that most students failed",
+            "Compare this assessment with the previous one",
+        ],
+        "trainer": [
+            "Show trainer-wise course assignments",
+            "Which trainers are currently inactive?",
+            "Show trainer workload by number of batches",
+        ],
+        "course": [
+            "Show enrollment numbers for these courses",
+            "Which course has the lowest completion rate?",
+            "List students who haven't started any course",
+        ],
+        "student": [
+            "Show performance breakdown by department",
+            "List at-risk students needing support",
+            "Which skills do top performers have in common?",
+        ],
+        "recruitment": [
+            "Show other companies with similar eligibility criteria",
+            "What training would improve eligibility rates?",
+            "Department-wise eligibility breakdown",
+        ],
+        "analytics": [
+            "Show trends over the past two semesters",
+            "Identify underperforming departments",
+            "Compare batch-wise performance",
+        ],
+    }
+
+    def _build_follow_up_request(
         self,
         user_question: str,
-        sql_query: str,
         data: list = None,
-        answer: str = None,
         role_id: int = None,
-    ) -> list:
+    ) -> tuple:
         """
-        Generates 3 intelligent follow-up questions based on query type.
-        Admins get strategic, institutional follow-ups.
+        Builds the follow-up prompt.
+        Returns (chat completion kwargs, fallback category).
         """
-        if not self.client:
-            return ["View more details", "Filter by department", "Show trends"]
-
         q = user_question.lower()
 
         is_assessment = any(
@@ -954,6 +1217,19 @@ Output Guidelines:
         else:
             ctx = "GENERAL: trends, breakdowns, top/bottom performers"
 
+        if is_assessment:
+            category = "assessment"
+        elif is_trainer:
+            category = "trainer"
+        elif is_course:
+            category = "course"
+        elif is_student:
+            category = "student"
+        elif is_recruitment:
+            category = "recruitment"
+        else:
+            category = "analytics"
+
         prompt = f"""
 Question: "{user_question}"
 Data: {data_preview}
@@ -962,92 +1238,70 @@ Context: {ctx}
 
 Generate exactly 3 follow-up questions. One per line. No numbering, no bullets, no extra formatting.
 """
+        request = {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "Generate 3 practical follow-up questions. "
+                        "One per line. No numbering or special formatting."
+                    ),
+                },
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.6,
+        }
+        return request, category
 
-        try:
-            model_name = "deepseek-chat"
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Generate 3 practical follow-up questions. "
-                            "One per line. No numbering or special formatting."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=1000,
-                temperature=0.6,
+    def _parse_follow_ups(self, response, user_question: str) -> list:
+        """Logs usage and cleans the follow-up lines."""
+        lines = response.choices[0].message.content.strip().split("\n")
+        
+        # Log token usage
+        if response.usage:
+            self._log_token_usage(
+                "FOLLOW_UPS", 
+                response.usage, 
+                user_question, 
+                "deepseek-chat",
+                input_breakdown={
+                   "Context": 50,
+                   "DataPreview": 20
+                }
             )
 
-            lines = response.choices[0].message.content.strip().split("\n")
-            
-            # Log token usage
-            if response.usage:
-                self._log_token_usage(
-                    "FOLLOW_UPS", 
-                    response.usage, 
-                    user_question, 
-                    model_name,
-                    input_breakdown={
-                       "Context": 50,
-                       "DataPreview": 20
-                    }
-                )
+        cleaned = [
+            re.sub(r"^[\d\.\-\)\:\s]*", "", line).strip()
+            for line in lines
+            if line.strip() and len(line.strip()) > 5
+        ]
+        return cleaned[:3] if len(cleaned) >= 3 else cleaned
+
+    async def generate_follow_ups_async(
+        self,
+        user_question: str,
+        sql_query: str,
+        data: list = None,
+        answer: str = None,
+        role_id: int = None,
+    ) -> list:
+        """
+        Generates 3 intelligent follow-up questions based on query type.
+        Admins get strategic, institutional follow-ups.
+        """
+        if not self._get_async_client():
+            return ["View more details", "Filter by department", "Show trends"]
 
-            cleaned = [
-                re.sub(r"^[\d\.\-\)\:\s]*", "", line).strip()
-                for line in lines
-                if line.strip() and len(line.strip()) > 5
-            ]
-            return cleaned[:3] if len(cleaned) >= 3 else cleaned
+        request, category = self._build_follow_up_request(user_question, data, role_id)
+        try:
+            response = await self._acreate(settings.AI_TIMEOUT_FOLLOW_UPS_SECONDS, **request)
+            return self._parse_follow_ups(response, user_question)
 
         except Exception as e:
             logger.error(f"Follow-up generation error: {e}")
-            fallbacks = {
-                "assessment": [
-                    "Which students scored highest in this assessment?",
-                    "Show questions that most students failed",
-                    "Compare this assessment with the previous one",
-                ],
-                "trainer": [
-                    "Show trainer-wise course assignments",
-                    "Which trainers are currently inactive?",
-                    "Show trainer workload by number of batches",
-                ],
-                "course": [
-                    "Show enrollment numbers for these courses",
-                    "Which course has the lowest completion rate?",
-                    "List students who haven't started any course",
-                ],
-                "student": [
-                    "Show performance breakdown by department",
-                    "List at-risk students needing support",
-                    "Which skills do top performers have in common?",
-                ],
-                "recruitment": [
-                    "Show other companies with similar eligibility criteria",
-                    "What training would improve eligibility rates?",
-                    "Department-wise eligibility breakdown",
-                ],
-                "analytics": [
-                    "Show trends over the past two semesters",
-                    "Identify underperforming departments",
-                    "Compare batch-wise performance",
-                ],
-            }
-            if is_assessment:
-                return fallbacks["assessment"]
-            if is_trainer:
-                return fallbacks["trainer"]
-            if is_course:
-                return fallbacks["course"]
-            if is_student:
-                return fallbacks["student"]
-            if is_recruitment:
-                return fallbacks["recruitment"]
-            return fallbacks["analytics"]
+            return self.FOLLOW_UP_FALLBACKS[category]
 
     # ────────────────────────────────────────────
     # Utilities
@@ -1063,80 +1317,69 @@ Generate exactly 3 follow-up questions. One per line. No numbering, no bullets,
                 return True
         return False
 
+    # Verified result table columns, used when the live catalog doesn't know the table
+    RESULT_TABLE_COLUMNS = [
+        ("id", "BIGINT UNSIGNED"),
+        ("user_id", "BIGINT UNSIGNED"),
+        ("topic_test_id", "BIGINT UNSIGNED"),
+        ("question_id", "INT UNSIGNED"),
+        ("course_allocation_id", "BIGINT UNSIGNED"),
+        ("allocate_id", "INT UNSIGNED"),
+        ("topic_type", "INT UNSIGNED"),
+        ("mark", "FLOAT"),
+        ("total_mark", "FLOAT"),
+        ("solve_status", "INT"),
+        ("status", "TINYINT"),
+        ("created_at", "TIMESTAMP"),
+        ("updated_at", "TIMESTAMP"),
+    ]
+    RESULT_COLUMN_NOTES = {
+        "id": "(primary key)",
+        "user_id": "(foreign key to users.id)",
+        "topic_test_id": "(foreign key to tests.id) - NEVER use test_id!",
+        "question_id": "(foreign key to standard_qb_codings.id)",
+        "course_allocation_id": "(foreign key to course_academic_maps.id)",
+        "allocate_id": "(internal allocation reference)",
+        "topic_type": "(1=coding, 2=mcq, etc.)",
+        "mark": "(student score)",
+        "total_mark": "(maximum possible mark)",
+        "solve_status": "(0=unsolved, 1=partial, 2=solved)",
+        "status": "(1=active, 0=inactive)",
+    }
+
     def _build_result_table_schema_hint(self, result_table: str) -> str:
         """
         Build a dynamic schema hint for a specific college result table.
         Injects verified column names so AI never guesses wrong column names.
+        Columns come from the live result table catalog when it knows the table.
         """
-        standard_columns = f"""
-Confirmed columns in {result_table}:
-- id: BIGINT UNSIGNED (primary key)
-- user_id: BIGINT UNSIGNED (foreign key to users.id)
-- topic_test_id: BIGINT UNSIGNED (foreign key to tests.id) - NEVER use test_id!
-- question_id: INT UNSIGNED (foreign key to standard_qb_codings.id)
-- course_allocation_id: BIGINT UNSIGNED (foreign key to course_academic_maps.id)
-- allocate_id: INT UNSIGNED (internal allocation reference)
-- topic_type: INT UNSIGNED (1=coding, 2=mcq, etc.)
-- mark: FLOAT (student score)
-- total_mark: FLOAT (maximum possible mark)
-- solve_status: INT (0=unsolved, 1=partial, 2=solved)
-- status: TINYINT (1=active, 0=inactive)
-- created_at: TIMESTAMP
-- updated_at: TIMESTAMP
-
-CRITICAL RULES for this table:
-1. When filtering solved problems: Use solve_status = 2 in JOIN ON (not WHERE) to preserve LEFT JOINs
-2. To get user info: JOIN users ON {result_table}.user_id = users.id
-3. To get test info: JOIN tests ON {result_table}.topic_test_id = tests.id (use topic_test_id, NOT test_id!)
-4. To get course: JOIN course_academic_maps ON {result_table}.course_allocation_id = course_academic_maps.id
-5. Use SELECT DISTINCT to avoid duplicates when joining multiple tables
-"""
-        
-        return standard_columns
-
-    def answer_general_question(
-        self,
-        user_question: str,
-        model: str = "deepseek-chat",
-    ) -> str:
-        """
-        Answers general knowledge questions via LLM (no DB query needed).
-        Restricted to: Companies, Skills, Educational Info, Recruitment.
-        Refuses all other topics with a standard message.
-        """
-        client = self._get_client(model)
-        if not client:
-            return "I cannot answer this question as the AI service is unavailable."
-
-        try:
-            model_name = "deepseek-chat"
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a specialized IT and Educational Consultant.\n"
-                            "You ONLY answer questions about:\n"
-                            "  1. Companies (tech companies, hiring trends, culture)\n"
-                            "  2. Professional Skills (programming, soft skills, career)\n"
-                            "  3. Educational Information (academic advice, learning paths)\n"
-                            "  4. Recruitment & Interviews (process, aptitude, preparation)\n\n"
-                            "For ANY other topic, respond exactly with:\n"
-                            "  'I am only authorized to provide general knowledge on "
-                            "Companies, Professional Skills, Educational Information, and Recruitment.'"
-                        ),
-                    },
-                    {"role": "user", "content": user_question},
-                ],
-                max_tokens=500,
-                temperature=0.7,
-            )
-            return response.choices[0].message.content
-
-        except Exception as e:
-            logger.error(f"General answer error: {e}")
-            return "I encountered an error while processing your request."
+        info = result_table_catalog.get(result_table)
+        if info and info["columns"]:
+            columns = [(name, col["type"].upper()) for name, col in info["columns"].items()]
+        else:
+            columns = self.RESULT_TABLE_COLUMNS
+
+        lines = [f"Confirmed columns in {result_table}:"]
+        for name, col_type in columns:
+            note = self.RESULT_COLUMN_NOTES.get(name)
+            lines.append(f"- {name}: {col_type} {note}" if note else f"- {name}: {col_type}")
+
+        names = {name for name, _ in columns}
+        rules = []
+        if "solve_status" in names:
+            rules.append("When filtering solved problems: Use solve_status = 2 in JOIN ON (not WHERE) to preserve LEFT JOINs")
+        if "user_id" in names:
+            rules.append(f"To get user info: JOIN users ON {result_table}.user_id = users.id")
+        if "topic_test_id" in names:
+            rules.append(f"To get test info: JOIN tests ON {result_table}.topic_test_id = tests.id (use topic_test_id, NOT test_id!)")
+        if "course_allocation_id" in names:
+            rules.append(f"To get course: JOIN course_academic_maps ON {result_table}.course_allocation_id = course_academic_maps.id")
+        rules.append("Use SELECT DISTINCT to avoid duplicates when joining multiple tables")
+
+        lines.append("")
+        lines.append("CRITICAL RULES for this table:")
+        lines.extend(f"{i}. {rule}" for i, rule in enumerate(rules, 1))
+        return "\n" + "\n".join(lines) + "\n"
 
 
 # ════════════════════════════════════════════════════════════════
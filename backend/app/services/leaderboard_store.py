@@ -0,0 +1,504 @@
+"""
+Leaderboard Store
+Precomputed per-college leaderboards, so /analytics/leaderboard no longer
+UNIONs and window-ranks every result table on each request.
+
+- Per result table, per-user partial sums (marks, attempts, solved) are kept
+  in memory. A refresh only re-aggregates users that have rows with
+  updated_at >= the table's watermark.
+- Each (college, category) board is sorted by (score desc, marks desc,
+  user_id). Pages are served by keyset (bisect on the cursor's sort key) and
+  a user's rank is a position lookup.
+- Department/batch/section/course views are filtered slices of a board,
+  memoized until the next refresh.
+- A periodic full rebuild picks up hard deletes and profile changes of users
+  without new results.
+
+Boards are kept per worker process and refreshed on demand or by a
+background thread.
+"""
+
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import re
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.logging_config import get_logger
+from app.services.result_table_catalog import result_table_catalog
+
+logger = get_logger("leaderboard_store")
+
+CATEGORIES = ("all", "coding", "mcq")
+
+_SAFE_IDENTIFIER = re.compile(r"^[a-z0-9_]+$")
+# Users per IN (...) batch when re-aggregating changed users
+_CHUNK = 1000
+# Memoized filtered views per college
+_MAX_VIEWS = 256
+
+
+def wpi_score(total_marks: float, total_attempts: int, accuracy: Optional[float]) -> float:
+    """Weighted performance index used for ranking"""
+    return (total_marks * 0.7) + ((accuracy or 0) * 0.2) + (total_attempts * 0.1)
+
+
+def encode_cursor(key: tuple) -> str:
+    return f"{key[0]!r}:{key[1]!r}:{key[2]}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Parse a cursor from encode_cursor(); raises ValueError if malformed"""
+    neg_score, neg_marks, user_id = cursor.split(":")
+    return (float(neg_score), float(neg_marks), int(user_id))
+
+
+class _View:
+    """Ranked entries with sort keys (for keyset seeks) and user positions"""
+
+    __slots__ = ("entries", "keys", "positions")
+
+    def __init__(self, entries: List[Dict]):
+        self.entries = entries
+        self.keys = [e["key"] for e in entries]
+        self.positions = {e["user_id"]: i for i, e in enumerate(entries)}
+
+
+class _Snapshot:
+    """Ranked boards per category plus the views derived from them (swapped as one)"""
+
+    __slots__ = ("boards", "views")
+
+    def __init__(self, boards: Dict[str, _View] = None):
+        self.boards = boards or {}
+        self.views: "OrderedDict[tuple, _View]" = OrderedDict()
+
+
+class _CollegeBoards:
+    """Partial sums, profiles and ranked boards for one college"""
+
+    def __init__(self, college_id: int, college_code: str):
+        self.college_id = college_id
+        self.college_code = college_code
+        self.tables: Dict[str, str] = {}  # result table -> "coding" | "mcq"
+        self.parts: Dict[str, Dict[int, tuple]] = {}  # table -> user_id -> (marks, attempts, solved)
+        self.watermarks: Dict[str, object] = {}  # table -> max updated_at seen
+        self.profiles: Dict[int, Dict] = {}  # user_id -> name/department/batch/section
+        self.snapshot = _Snapshot()
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+        self.last_access = time.time()
+        self.lock = threading.Lock()
+
+
+class LeaderboardStore:
+    """In-memory materialized leaderboards with incremental refresh"""
+
+    def __init__(
+        self,
+        refresh_seconds: int = 60,
+        full_rebuild_seconds: int = 3600,
+        session_factory=SessionLocal,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.full_rebuild_seconds = full_rebuild_seconds
+        self._session_factory = session_factory
+        self._colleges: Dict[int, _CollegeBoards] = {}
+        self._courses: Dict[int, tuple] = {}  # course_id -> (loaded_at, member ids)
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.full_rebuilds = 0
+        self.users_recomputed = 0
+        self.stale_served = 0
+        self.refresh_errors = 0
+
+    # ─────────────────────────────────────────────
+    # Reads
+    # ─────────────────────────────────────────────
+
+    def page(
+        self,
+        college_id: int,
+        college_code: str,
+        category: str = "all",
+        department_id=None,
+        batch_id=None,
+        section_id=None,
+        course_id=None,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> Dict:
+        """
+        One page of a leaderboard.
+        Returns {"rows", "next_cursor", "user_row", "total"}; rows carry "rank".
+        Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        department_id, batch_id, section_id, course_id = (
+            int(v) if v else None for v in (department_id, batch_id, section_id, course_id)
+        )
+        board = self._fresh_board(college_id, college_code)
+        view = self._view(board, category, department_id, batch_id, section_id, course_id)
+
+        start = bisect_right(view.keys, after) if after else 0
+        rows = [
+            dict(entry, rank=start + i + 1)
+            for i, entry in enumerate(view.entries[start:start + limit])
+        ]
+        next_cursor = None
+        if start + limit < len(view.entries) and rows:
+            next_cursor = encode_cursor(rows[-1]["key"])
+
+        user_row = None
+        if user_id is not None and user_id in view.positions:
+            position = view.positions[user_id]
+            user_row = dict(view.entries[position], rank=position + 1)
+
+        return {
+            "rows": rows,
+            "next_cursor": next_cursor,
+            "user_row": user_row,
+            "total": len(view.entries),
+        }
+
+    def course_members(self, course_id: int) -> Set[int]:
+        """User ids enrolled in a course (course_wise_segregations), cached"""
+        cached = self._courses.get(course_id)
+        if cached and time.time() - cached[0] < self.refresh_seconds:
+            return cached[1]
+        db = self._session_factory()
+        try:
+            rows = db.execute(
+                text("SELECT DISTINCT user_id FROM course_wise_segregations WHERE course_id = :course_id"),
+                {"course_id": course_id},
+            ).fetchall()
+        finally:
+            db.close()
+        members = {int(row[0]) for row in rows}
+        self._courses[course_id] = (time.time(), members)
+        return members
+
+    def _view(self, board: _CollegeBoards, category, department_id, batch_id, section_id, course_id) -> _View:
+        snapshot = board.snapshot
+        base = snapshot.boards.get(category)
+        if base is None:
+            return _View([])
+        if not any((department_id, batch_id, section_id, course_id)):
+            return base
+
+        key = (category, department_id, batch_id, section_id, course_id)
+        views = snapshot.views
+        view = views.get(key)
+        if view is not None:
+            return view
+
+        members = self.course_members(course_id) if course_id else None
+        entries = [
+            e for e in base.entries
+            if (not department_id or e["department_id"] == department_id)
+            and (not batch_id or e["batch_id"] == batch_id)
+            and (not section_id or e["section_id"] == section_id)
+            and (members is None or e["user_id"] in members)
+        ]
+        view = _View(entries)
+        views[key] = view
+        while len(views) > _MAX_VIEWS:
+            views.popitem(last=False)
+        return view
+
+    # ─────────────────────────────────────────────
+    # Refresh
+    # ─────────────────────────────────────────────
+
+    def _fresh_board(self, college_id: int, college_code: str) -> _CollegeBoards:
+        """Get a college's boards, building or refreshing them when due"""
+        with self._lock:
+            board = self._colleges.get(college_id)
+            if board is None:
+                board = _CollegeBoards(college_id, college_code)
+                self._colleges[college_id] = board
+        board.last_access = time.time()
+
+        if not board.refreshed_at:
+            # First build: callers wait for it
+            with board.lock:
+                if not board.refreshed_at:
+                    self._refresh(board, full=True, raise_errors=True)
+        elif time.time() - board.refreshed_at >= self.refresh_seconds:
+            # Refresh in this request; concurrent requests serve the current boards
+            if board.lock.acquire(blocking=False):
+                try:
+                    self._refresh(board)
+                finally:
+                    board.lock.release()
+            else:
+                self.stale_served += 1
+        return board
+
+    def refresh(self, college_id: int, full: bool = False) -> bool:
+        """Refresh a college's boards now (on demand). False if never built."""
+        board = self._colleges.get(college_id)
+        if board is None:
+            return False
+        with board.lock:
+            self._refresh(board, full=full, raise_errors=True)
+        return True
+
+    def _refresh(self, board: _CollegeBoards, full: bool = None, raise_errors: bool = False):
+        if full is None:
+            full = time.time() - board.rebuilt_at >= self.full_rebuild_seconds
+        started = time.time()
+        db = self._session_factory()
+        try:
+            if full:
+                self._discover_tables(board)
+            changed: Set[int] = set()
+            for table in board.tables:
+                if full or table not in board.watermarks:
+                    changed |= self._load_table(db, board, table)
+                else:
+                    changed |= self._load_changes(db, board, table)
+
+            if full:
+                self._load_profiles(db, board)
+            elif changed:
+                self._load_profiles(db, board, changed)
+            if full or changed:
+                self._rebuild(board)
+
+            self.refreshes += 1
+            self.users_recomputed += len(changed)
+            if full:
+                self.full_rebuilds += 1
+                board.rebuilt_at = started
+            board.refreshed_at = time.time()
+            logger.info(
+                f"🏆 Leaderboard {board.college_code}: {'full rebuild' if full else 'refresh'}, "
+                f"{len(changed)} users recomputed in {time.time() - started:.2f}s"
+            )
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error(f"Leaderboard refresh failed for {board.college_code}: {e}")
+            if board.refreshed_at:
+                # Keep serving the current boards; retry after the next interval
+                board.refreshed_at = time.time()
+            if raise_errors:
+                raise
+        finally:
+            db.close()
+
+    def _discover_tables(self, board: _CollegeBoards):
+        """Find the college's semester result tables (from the result table catalog)"""
+        code = board.college_code
+        if not _SAFE_IDENTIFIER.match(code):
+            raise ValueError(f"Unexpected college code: {code!r}")
+        found = {
+            table: result_table_catalog.get(table)["kind"]
+            for table in result_table_catalog.tables_for(code)
+        }
+
+        for table in set(board.tables) - set(found):
+            board.parts.pop(table, None)
+            board.watermarks.pop(table, None)
+        board.tables = found
+
+    @staticmethod
+    def _aggregate(db, table: str, user_ids: List[int] = None) -> Dict[int, tuple]:
+        sql = f"""
+            SELECT
+                user_id,
+                SUM(mark) AS marks,
+                COUNT(*) AS attempts,
+                SUM(CASE WHEN solve_status = 2 THEN 1 ELSE 0 END) AS solved
+            FROM {table}
+            WHERE status = 1 {"AND user_id IN :user_ids" if user_ids is not None else ""}
+            GROUP BY user_id
+        """
+        query = text(sql)
+        params = {}
+        if user_ids is not None:
+            query = query.bindparams(bindparam("user_ids", expanding=True))
+            params["user_ids"] = user_ids
+        return {
+            int(row.user_id): (float(row.marks or 0), int(row.attempts or 0), int(row.solved or 0))
+            for row in db.execute(query, params)
+        }
+
+    def _load_table(self, db, board: _CollegeBoards, table: str) -> Set[int]:
+        """Aggregate a whole table; returns every user whose sums may have changed"""
+        # Read the watermark first: rows written during the aggregate are picked up next time
+        watermark = db.execute(text(f"SELECT MAX(updated_at) FROM {table}")).scalar()
+        parts = self._aggregate(db, table)
+        previous = board.parts.get(table, {})
+        board.parts[table] = parts
+        board.watermarks[table] = watermark
+        return set(parts) | set(previous)
+
+    def _load_changes(self, db, board: _CollegeBoards, table: str) -> Set[int]:
+        """Re-aggregate users with rows updated at/after the table's watermark"""
+        watermark = board.watermarks.get(table)
+        if watermark is None:
+            return self._load_table(db, board, table)
+
+        rows = db.execute(
+            text(f"SELECT user_id, MAX(updated_at) AS updated_at FROM {table} WHERE updated_at >= :wm GROUP BY user_id"),
+            {"wm": watermark},
+        ).fetchall()
+        if not rows:
+            return set()
+
+        changed = [int(row.user_id) for row in rows]
+        parts = board.parts.setdefault(table, {})
+        for i in range(0, len(changed), _CHUNK):
+            chunk = changed[i:i + _CHUNK]
+            fresh = self._aggregate(db, table, chunk)
+            for user_id in chunk:
+                if user_id in fresh:
+                    parts[user_id] = fresh[user_id]
+                else:
+                    # No status = 1 rows left for this user
+                    parts.pop(user_id, None)
+        board.watermarks[table] = max(row.updated_at for row in rows)
+        return set(changed)
+
+    def _load_profiles(self, db, board: _CollegeBoards, user_ids: Set[int] = None):
+        """Names and academic placement of the college's users (all, or only user_ids)"""
+        sql = """
+            SELECT u.id, u.name, ua.department_id, ua.batch_id, ua.section_id
+            FROM users u
+            JOIN user_academics ua ON u.id = ua.user_id
+            WHERE ua.college_id = :college_id {extra}
+        """
+        if user_ids is None:
+            rows = db.execute(text(sql.format(extra="")), {"college_id": board.college_id}).fetchall()
+            board.profiles = {}
+            for row in rows:
+                board.profiles.setdefault(int(row.id), self._profile(row))
+            return
+
+        ids = list(user_ids)
+        query = text(sql.format(extra="AND u.id IN :user_ids")).bindparams(
+            bindparam("user_ids", expanding=True)
+        )
+        for i in range(0, len(ids), _CHUNK):
+            chunk = ids[i:i + _CHUNK]
+            rows = db.execute(query, {"college_id": board.college_id, "user_ids": chunk}).fetchall()
+            fresh = {}
+            for row in rows:
+                fresh.setdefault(int(row.id), self._profile(row))
+            for user_id in chunk:
+                if user_id in fresh:
+                    board.profiles[user_id] = fresh[user_id]
+                else:
+                    board.profiles.pop(user_id, None)
+
+    @staticmethod
+    def _profile(row) -> Dict:
+        return {
+            "student_name": row.name,
+            "department_id": row.department_id,
+            "batch_id": row.batch_id,
+            "section_id": row.section_id,
+        }
+
+    @staticmethod
+    def _rebuild(board: _CollegeBoards):
+        """Re-rank every category from the partial sums and swap the boards in"""
+        totals: Dict[str, Dict[int, list]] = {category: {} for category in CATEGORIES}
+        for table, kind in board.tables.items():
+            for user_id, (marks, attempts, solved) in board.parts.get(table, {}).items():
+                if user_id not in board.profiles:
+                    continue
+                for category in ("all", kind):
+                    t = totals[category].setdefault(user_id, [0.0, 0, 0])
+                    t[0] += marks
+                    t[1] += attempts
+                    t[2] += solved
+
+        boards = {}
+        for category, by_user in totals.items():
+            entries = []
+            for user_id, (marks, attempts, solved) in by_user.items():
+                if not attempts:
+                    continue
+                accuracy = solved * 100.0 / attempts
+                score = wpi_score(marks, attempts, accuracy)
+                entry = dict(board.profiles[user_id])
+                entry.update(
+                    user_id=user_id,
+                    total_marks=marks,
+                    total_attempts=attempts,
+                    solved_count=solved,
+                    accuracy=accuracy,
+                    wpi_score=score,
+                    key=(-score, -marks, user_id),
+                )
+                entries.append(entry)
+            entries.sort(key=lambda e: e["key"])
+            boards[category] = _View(entries)
+
+        board.snapshot = _Snapshot(boards)
+
+    # ─────────────────────────────────────────────
+    # Background refresh
+    # ─────────────────────────────────────────────
+
+    def start_refresher(self, interval_seconds: int = None):
+        """Refresh recently used boards on a daemon thread (idempotent)"""
+        if self._refresher is not None:
+            return
+        interval = interval_seconds or self.refresh_seconds
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self._refresh_all()
+
+        self._refresher = threading.Thread(target=loop, name="leaderboard-refresher", daemon=True)
+        self._refresher.start()
+
+    def _refresh_all(self):
+        now = time.time()
+        with self._lock:
+            boards = list(self._colleges.values())
+        for board in boards:
+            if now - board.last_access >= self.full_rebuild_seconds:
+                # Not requested for a while: drop it instead of keeping it fresh
+                with self._lock:
+                    self._colleges.pop(board.college_id, None)
+                continue
+            if board.refreshed_at and board.lock.acquire(blocking=False):
+                try:
+                    self._refresh(board)
+                finally:
+                    board.lock.release()
+
+    def get_stats(self) -> Dict:
+        """Get store statistics"""
+        return {
+            "colleges": len(self._colleges),
+            "entries": sum(
+                len(b.snapshot.boards["all"].entries)
+                for b in list(self._colleges.values())
+                if "all" in b.snapshot.boards
+            ),
+            "refreshes": self.refreshes,
+            "full_rebuilds": self.full_rebuilds,
+            "users_recomputed": self.users_recomputed,
+            "stale_served": self.stale_served,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+# Global singleton
+leaderboard_store = LeaderboardStore(
+    refresh_seconds=settings.LEADERBOARD_REFRESH_SECONDS,
+    full_rebuild_seconds=settings.LEADERBOARD_FULL_REBUILD_SECONDS,
+)
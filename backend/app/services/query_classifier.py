@@ -24,7 +24,7 @@ class ClassifiedIntent:
     intent: str                          # one of the buckets above
     confidence: float                    # how confident the rule engine is (0–1)
     table_hint: Optional[str] = None    # table to use (skips schema analysis)
-    sql_template: Optional[str] = None  # pre-built SQL template (skips SQL gen)
+    sql_template: Optional[str] = None  # key into sql_templates (skips schema analysis + SQL gen)
     metadata: dict = field(default_factory=dict)
 
 
@@ -95,6 +95,41 @@ class QueryIntentClassifier:
         r"\bgrowth\b",
     ]
 
+    # ── Words a question may contain and still be answered by a SQL template ──
+    # Anything else (time ranges, marks thresholds, names) needs the full pipeline.
+    TEMPLATE_FILLER_WORDS = {
+        "a", "all", "are", "best", "count", "currently",
+        "do", "does", "find", "get", "give", "has", "have", "highest", "how", "in",
+        "is", "leaderboard", "leading", "list", "many", "now", "number",
+        "of", "overall", "performer", "performers", "please", "present",
+        "registered", "s", "scorer", "scorers", "show", "student",
+        "students", "tell", "the", "there", "top", "total", "us", "we", "what",
+        "which", "who", "achiever", "achievers", "user", "users", "college",
+        "colleges", "department", "departments", "dept", "batch", "batches",
+        "section", "sections", "class",
+    }
+    # Possessives only qualify a scope word ("in my batch"); anywhere else the
+    # question is about the asker ("my rank"), which no template answers.
+    # "rank"/"by" are absent on purpose: a personal rank or a per-group
+    # breakdown ("top students by department") needs the full pipeline.
+    TEMPLATE_POSSESSIVES = {"my", "our"}
+
+    # Course qualifiers: only the top performer template has a course slot
+    # (a count "in the java course" is not a count of all students)
+    TEMPLATE_COURSE_WORDS = {
+        "course", "courses", "java", "python", "c++", "cpp", "c", "html", "react",
+    }
+
+    # Scope words -> scope level ("in my batch" needs a batch-scoped role)
+    SCOPE_WORDS = {
+        "college": "college",
+        "department": "department",
+        "dept": "department",
+        "batch": "batch",
+        "section": "section",
+        "class": "section",
+    }
+
     def classify(self, question: str) -> ClassifiedIntent:
         q = question.lower().strip()
 
@@ -119,7 +154,15 @@ class QueryIntentClassifier:
                     intent="top_performer",
                     confidence=0.90,
                     table_hint="course_wise_segregations",
-                    metadata={"language": lang, "reason": f"matched top performer pattern"},
+                    sql_template=(
+                        "top_performers" if self._is_template_question(q, allow_course=True) else None
+                    ),
+                    metadata={
+                        "language": lang,
+                        "limit": self._extract_limit(q),
+                        "scope_words": self._extract_scope_words(q),
+                        "reason": f"matched top performer pattern",
+                    },
                 )
 
         # 3. Assessment count
@@ -139,7 +182,12 @@ class QueryIntentClassifier:
                 return ClassifiedIntent(
                     intent="simple_count",
                     confidence=0.85,
-                    metadata={"entity": entity, "reason": "matched simple count pattern"},
+                    sql_template="count" if self._is_template_question(q) else None,
+                    metadata={
+                        "entity": entity,
+                        "scope_words": self._extract_scope_words(q),
+                        "reason": "matched simple count pattern",
+                    },
                 )
 
         # 5. Comparison
@@ -185,11 +233,46 @@ class QueryIntentClassifier:
 
     def _extract_count_entity(self, q: str) -> str:
         entities = ["students", "users", "colleges", "departments", "batches", "sections"]
+        # Prefer the noun being counted ("how many batches in my college" -> batches)
+        counted = re.search(r"\b(?:how many|number of|count of|total)\s+(\w+)", q)
+        if counted:
+            for e in entities:
+                if counted.group(1) in (e, e.rstrip("s"), e[:-2] if e.endswith("es") else e):
+                    return e
         for e in entities:
             if e in q or e.rstrip("s") in q:
                 return e
         return "records"
 
+    def _extract_limit(self, q: str) -> int:
+        match = re.search(r"\b(?:top|best|first)\s+(\d{1,3})\b", q)
+        return min(int(match.group(1)), 50) if match else 10
+
+    def _extract_scope_words(self, q: str) -> list:
+        words = set(re.findall(r"[a-z]+", q))
+        return sorted({level for word, level in self.SCOPE_WORDS.items() if word in words})
+
+    def _is_template_question(self, q: str, allow_course: bool = False) -> bool:
+        """
+        True if the question has nothing beyond the intent and scope words
+        (plus a course/language qualifier when allow_course is set)
+        """
+        allowed = self.TEMPLATE_FILLER_WORDS
+        if allow_course:
+            allowed = allowed | self.TEMPLATE_COURSE_WORDS
+        tokens = re.findall(r"[a-z]+\+*|\d+", q)
+        for i, t in enumerate(tokens):
+            if t in self.TEMPLATE_POSSESSIVES:
+                if i + 1 >= len(tokens) or tokens[i + 1] not in self.SCOPE_WORDS:
+                    return False
+            elif t == "me":
+                # "show me ..." is phrasing; any other "me" is about the asker
+                if i == 0 or tokens[i - 1] not in ("show", "tell", "give", "get"):
+                    return False
+            elif not (t.isdigit() or t in allowed):
+                return False
+        return True
+
     def should_skip_schema_analysis(self, intent: ClassifiedIntent) -> bool:
         """
         Returns True when we can skip the schema analysis API call.
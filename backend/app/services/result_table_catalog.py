@@ -0,0 +1,184 @@
+"""
+Result Table Catalog
+Per-college result tables ({college}_{YYYY}_{n}_{coding|mcq}_result, plus
+semester-less ones like b2c_coding_result) and their live columns.
+
+Built from sql_executor.existing_tables and one bulk information_schema.columns
+scan, then refreshed periodically, so request paths (leaderboard, schema
+prompts, SQL hints) never query information_schema themselves.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import re
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.logging_config import get_logger
+from app.services.sql_executor import sql_executor
+
+logger = get_logger("result_table_catalog")
+
+RESULT_TABLE_RE = re.compile(
+    r"^(?P<college>[a-z0-9_]+?)(?:_(?P<semester>\d{4}_\d+))?_(?P<kind>coding|mcq)_result$"
+)
+
+
+class ResultTableCatalog:
+    """Result tables keyed by college short name and semester, with their columns"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        # table -> {"college", "semester", "kind", "columns": {name: {"type", "key"}}}
+        self.tables: Dict[str, Dict] = {}
+        # college -> semester (None if unversioned) -> kind -> table
+        self.by_college: Dict[str, Dict[Optional[str], Dict[str, str]]] = {}
+        self.loaded_at = 0.0
+        self.loads = 0
+        self.load_errors = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._refresher: Optional[threading.Thread] = None
+        self.load()
+
+    # ─────────────────────────────────────────────
+    # Loading
+    # ─────────────────────────────────────────────
+
+    def load(self) -> bool:
+        """Rebuild from the known table list; returns True if anything changed"""
+        names = sorted(
+            t for t in (sql_executor.existing_tables or ())
+            if RESULT_TABLE_RE.match(t.lower())
+        )
+        try:
+            columns = self._load_columns(names) if names else {}
+        except Exception as e:
+            self.load_errors += 1
+            logger.error(f"Failed to load result table columns: {e}")
+            return False
+
+        tables = {}
+        by_college: Dict[str, Dict[Optional[str], Dict[str, str]]] = {}
+        for name in names:
+            match = RESULT_TABLE_RE.match(name.lower())
+            info = {
+                "college": match.group("college"),
+                "semester": match.group("semester"),
+                "kind": match.group("kind"),
+                "columns": columns.get(name, OrderedDict()),
+            }
+            tables[name] = info
+            by_college.setdefault(info["college"], {}).setdefault(info["semester"], {})[info["kind"]] = name
+
+        changed = tables != self.tables
+        self.tables = tables
+        self.by_college = by_college
+        self.loaded_at = time.time()
+        self.loads += 1
+        logger.info(f"✅ Result table catalog: {len(tables)} tables across {len(by_college)} colleges")
+        return changed
+
+    def _load_columns(self, names: List[str]) -> Dict[str, "OrderedDict[str, Dict]"]:
+        """Columns of every result table in one information_schema scan"""
+        query = text(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY "
+            "FROM information_schema.columns "
+            "WHERE TABLE_SCHEMA = :schema AND TABLE_NAME IN :names "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        ).bindparams(bindparam("names", expanding=True))
+        db = self._session_factory()
+        try:
+            rows = db.execute(query, {"schema": settings.DB_NAME, "names": names}).fetchall()
+        finally:
+            db.close()
+
+        columns: Dict[str, "OrderedDict[str, Dict]"] = {}
+        for table, column, column_type, key in rows:
+            columns.setdefault(table, OrderedDict())[column] = {
+                "type": column_type.decode() if isinstance(column_type, bytes) else column_type,
+                "key": key or "",
+            }
+        return columns
+
+    def refresh(self):
+        """Re-read the live table list and columns; notify listeners on change"""
+        sql_executor.refresh_tables()
+        if self.load():
+            for listener in list(self._listeners):
+                try:
+                    listener()
+                except Exception as e:
+                    logger.warning(f"Result table catalog listener failed: {e}")
+
+    def add_listener(self, fn: Callable[[], None]):
+        """Call fn() after a refresh that found new/removed tables or columns"""
+        self._listeners.append(fn)
+
+    def start_refresher(self, interval_seconds: int = 600):
+        """Run refresh() periodically on a daemon thread (idempotent)"""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"Result table catalog refresh failed: {e}")
+
+        self._refresher = threading.Thread(target=loop, name="result-catalog-refresher", daemon=True)
+        self._refresher.start()
+
+    # ─────────────────────────────────────────────
+    # Lookups
+    # ─────────────────────────────────────────────
+
+    def get(self, table: str) -> Optional[Dict]:
+        return self.tables.get(table)
+
+    def tables_for(self, college_code: str, kind: str = None) -> List[str]:
+        """A college's semester result tables (optionally one kind), oldest semester first"""
+        semesters = self.by_college.get(college_code.lower(), {})
+        return [
+            table
+            for semester in sorted(s for s in semesters if s)
+            for table_kind, table in sorted(semesters[semester].items())
+            if kind is None or table_kind == kind
+        ]
+
+    def columns(self, table: str) -> List[str]:
+        info = self.tables.get(table)
+        return list(info["columns"]) if info else []
+
+    def has_column(self, table: str, column: str) -> bool:
+        info = self.tables.get(table)
+        return bool(info) and column in info["columns"]
+
+    def describe(self, table: str) -> List[Dict]:
+        """Columns in DESCRIBE shape ({"Field", "Type", "Key"}), as in the schema file"""
+        info = self.tables.get(table)
+        if not info:
+            return []
+        return [
+            {"Field": name, "Type": col["type"], "Key": col["key"]}
+            for name, col in info["columns"].items()
+        ]
+
+    def get_stats(self) -> Dict:
+        """Get catalog statistics"""
+        return {
+            "tables": len(self.tables),
+            "colleges": len(self.by_college),
+            "loaded_at": self.loaded_at,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+        }
+
+
+# Global singleton
+result_table_catalog = ResultTableCatalog()
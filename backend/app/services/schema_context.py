@@ -8,7 +8,36 @@ import os
 from datetime import datetime
 from app.models.enums import *
 from app.core.sql_validator import sql_validator
+from app.core.answer_cache import answer_cache
+from app.core.rate_limiter import query_cache
+from app.core.config import settings
 from app.services.sql_executor import sql_executor
+from app.services.result_table_catalog import result_table_catalog
+from app.services.table_retriever import table_retriever
+
+# Identity tables are universal (always needed for role-based scoping)
+MANDATORY_TABLES = {
+    "users",
+    "user_academics",
+    "colleges",
+    "departments",
+    "batches",
+    "sections",
+    "courses",
+    "course_academic_maps",
+}
+
+# Assessment/Result infrastructure, only added for assessment-related questions
+ASSESSMENT_TABLES = {
+    "tests",
+    "test_question_maps",
+    "standard_qb_codings",
+    "standard_qb_mcqs",
+    "course_wise_segregations",
+    "user_course_enrollments",
+    "academic_qb_codings",
+    "academic_qb_mcqs",
+}
 
 
 class SchemaContext:
@@ -28,8 +57,10 @@ class SchemaContext:
         self.schema_data = {}
         self.mappings = {}
         self.available_tables = set()
+        self.table_fragments = {}  # table -> precompiled prompt fragment
         self.context_string = ""  # Basic rules
         self.load_context()
+        result_table_catalog.add_listener(self._on_result_tables_changed)
 
     def load_context(self):
         """Loads the schema metrics into memory but NOT the full string."""
@@ -53,7 +84,13 @@ class SchemaContext:
                 print(f"⚠️ Warning: {self.complete_schema_path} not found. Schema context will be limited.")
                 self.schema_data = {"tables": {}}
 
-            # 3. Base Rules Prompt (No Tables)
+            # 3. Precompile per-table prompt fragments (reused by every request)
+            self.table_fragments = self._build_fragment_index()
+            print(f"✅ Schema Context: Compiled {len(self.table_fragments)} table fragments")
+            sql_executor.set_column_index(self._build_column_index())
+            table_retriever.build(self._merged_tables(), self._describe_table, self.mappings)
+
+            # 4. Base Rules Prompt (No Tables)
             self.context_string = self.build_rules_prompt()
             print("✅ AI Schema Context Manager Initialized (Smart Retrieval Mode)")
 
@@ -61,9 +98,35 @@ class SchemaContext:
             print(f"❌ Error loading schema context: {e}")
             self.context_string = f"Error loading context: {str(e)}"
 
+    def reload(self):
+        """
+        Re-reads live tables and schema files after a schema change.
+        Cached answers and results were produced against the old schema, so they are dropped.
+        """
+        sql_executor.refresh_tables()
+        result_table_catalog.load()
+        self.load_context()
+        answer_cache.invalidate_all()
+        query_cache.clear()
+
+    def _on_result_tables_changed(self):
+        """Pick up result tables/columns found by the catalog's periodic refresh"""
+        self.available_tables = set(sql_executor.get_available_tables())
+        self.table_fragments = self._build_fragment_index()
+        sql_executor.set_column_index(self._build_column_index())
+        table_retriever.build(self._merged_tables(), self._describe_table, self.mappings)
+
     def get_system_prompt(self) -> str:
         return self.context_string
 
+    def build_sql_system_prompt(self, role_instruction: str) -> str:
+        """
+        Stable part of the SQL prompt: static rules, then the role prompt.
+        Per-request content (table schemas, analysis, question) belongs in the
+        user message so this stays byte-identical across a role's requests.
+        """
+        return f"{self.context_string}\n\n{'='*20}\n{role_instruction}\n{'='*20}"
+
     def get_all_table_names(self) -> str:
         """
         Returns a flat list of ALL available tables with row counts and descriptions.
@@ -84,129 +147,175 @@ class SchemaContext:
             rows = details.get("schema", {}).get("row_count", 0)
             
             # Semantic Hinting based on table name patterns
-            context = ""
-            if "_coding_result" in t: context = "Student coding test scores, marks, and actual submitted solutions"
-            elif "_mcq_result" in t: context = "Student MCQ/Fillup test scores"
-            elif "_test_data" in t: context = "Test metadata and specific settings"
-            elif "user_academics" == t: context = "Links users to academic hierarchy (College, Dept, Batch, Section)"
-            elif "users" == t: context = "User profiles, emails, and role identifiers"
-            elif "courses" == t: context = "LMS course titles and basic info"
-            elif "topics" == t: context = "Syllabus topics for specific courses"
-            elif "academic_qb" in t: context = "Question bank for university-level academic assessments"
-            elif "standard_qb" in t: context = "Company-standardized question bank (coding/mcqs)"
-            elif "placement" in t: context = "Recruitment data, company drives, and student eligibility"
-            elif "enrollment" in t: context = "Mapping of students to their enrolled courses"
-            elif "test_question_maps" == t: context = "Bridge table linking tests to their specific questions"
-            elif "tests" == t: context = "Assessments or exams (contains testName)"
-            elif "course_wise_segregations" == t: context = "Aggregated student metrics: progress, scores, and institutional ranks"
-            elif "colleges" == t: context = "List of participating institutions"
-            elif "departments" == t: context = "Academic branches (CSE, IT, etc.)"
-            elif "batches" == t: context = "Graduation years (2025, 2026, etc.)"
-            elif "sections" == t: context = "Classroom divisions (Section A, B, etc.)"
-            elif "course_academic_maps" == t: context = "Allocates courses to specific Colleges or Batches"
-            
+            context = self._describe_table(t)
             hint = f" | Context: {context}" if context else ""
             lines.append(f"- {t} (Rows: {rows}){hint}")
                 
         return "\n".join(lines)
 
-    def get_detailed_schema(self, table_names: list) -> str:
+    @staticmethod
+    def _describe_table(t: str) -> str:
+        """One-line semantic description of a table, based on name patterns."""
+        context = ""
+        if "_coding_result" in t: context = "Student coding test scores, marks, and actual submitted solutions"
+        elif "_mcq_result" in t: context = "Student MCQ/Fillup test scores"
+        elif "_test_data" in t: context = "Test metadata and specific settings"
+        elif "user_academics" == t: context = "Links users to academic hierarchy (College, Dept, Batch, Section)"
+        elif "users" == t: context = "User profiles, emails, and role identifiers"
+        elif "courses" == t: context = "LMS course titles and basic info"
+        elif "topics" == t: context = "Syllabus topics for specific courses"
+        elif "academic_qb" in t: context = "Question bank for university-level academic assessments"
+        elif "standard_qb" in t: context = "Company-standardized question bank (coding/mcqs)"
+        elif "placement" in t: context = "Recruitment data, company drives, and student eligibility"
+        elif "enrollment" in t: context = "Mapping of students to their enrolled courses"
+        elif "test_question_maps" == t: context = "Bridge table linking tests to their specific questions"
+        elif "tests" == t: context = "Assessments or exams (contains testName)"
+        elif "course_wise_segregations" == t: context = "Aggregated student metrics: progress, scores, and institutional ranks"
+        elif "colleges" == t: context = "List of participating institutions"
+        elif "departments" == t: context = "Academic branches (CSE, IT, etc.)"
+        elif "batches" == t: context = "Graduation years (2025, 2026, etc.)"
+        elif "sections" == t: context = "Classroom divisions (Section A, B, etc.)"
+        elif "course_academic_maps" == t: context = "Allocates courses to specific Colleges or Batches"
+        return context
+
+    def _merged_tables(self) -> dict:
+        """Schema file tables, with live columns for result tables (new since the snapshot, or changed)"""
+        tables = dict(self.schema_data.get("tables", {}))
+        for t in result_table_catalog.tables:
+            live = result_table_catalog.describe(t)
+            if live:
+                raw_table = dict(tables.get(t, {}))
+                raw_table["schema"] = dict(raw_table.get("schema", {}), columns=live)
+                tables[t] = raw_table
+        return tables
+
+    def _build_column_index(self) -> dict:
+        """table -> {lowercase column: column} for pre-execution column checks"""
+        return {
+            t.lower(): {
+                col["Field"].lower(): col["Field"]
+                for col in raw_table.get("schema", {}).get("columns", [])
+            }
+            for t, raw_table in self._merged_tables().items()
+        }
+
+    def _build_fragment_index(self) -> dict:
         """
-        Extracts FULL JSON schema ONLY for the requested tables.
-        This provides the AI with deep context for the chosen tables.
+        Precompiles a compact prompt fragment for every table in the schema file.
+        Each fragment holds a header (name, rows, description), a body
+        (columns with PK/UNIQUE/IDX keys, enums, mappings), a short
+        column-name-only form for tight budgets, and a column signature so
+        identically shaped tables (e.g. all *_coding_result tables) share one
+        body in the prompt.
         """
-        # 1. Expand wildcards (e.g., 'srec_2025_2_coding_result')
-        real_tables = set()
+        fragments = {}
+        for t, raw_table in self._merged_tables().items():
+            columns = []
+            names = []
+            for col in raw_table.get("schema", {}).get("columns", []):
+                col_type = col["Type"].replace(" unsigned", "")
+                # DESCRIBE's MUL only means "leads a non-unique index"; the snapshot
+                # has no FK constraints, so don't claim join keys it can't back
+                key = {"PRI": " PK", "UNI": " UNIQUE", "MUL": " IDX"}.get(col["Key"], "")
+                columns.append(f"{col['Field']} {col_type}{key}")
+                names.append(col["Field"])
+
+            lines = [f"  cols: {', '.join(columns)}"]
+
+            enums = []
+            for col, data in raw_table.get("enum_fields", {}).items():
+                if isinstance(data, dict) and "values" in data:
+                    values = [
+                        str(v["value"]) for v in data["values"]
+                        if isinstance(v, dict) and "value" in v
+                    ]
+                    if values:
+                        enums.append(f"{col}=[{', '.join(values)}]")
+            if enums:
+                lines.append(f"  enums: {'; '.join(enums)}")
+
+            if t in self.mappings:
+                lines.append(f"  mappings: {json.dumps(self.mappings[t], separators=(',', ':'))}")
+
+            rows = raw_table.get("schema", {}).get("row_count", 0)
+            description = self._describe_table(t)
+            body = "\n".join(lines)
+            short = f"  cols: {', '.join(names)}"
+            fragments[t] = {
+                "header": f"- {t} ({rows} rows)" + (f" — {description}" if description else ""),
+                "body": body,
+                "short": short,
+                "signature": body,
+                "tokens": (len(body) + len(t) + 40) // 4,
+                "short_tokens": (len(short) + len(t) + 40) // 4,
+            }
+        return fragments
+
+    def get_detailed_schema(self, table_names: list, token_budget: int = None) -> str:
+        """
+        Assembles the schema prompt for the requested tables from precompiled
+        fragments. Requested tables come first, then the mandatory identity
+        (and assessment) tables. Once the token budget is spent, remaining
+        tables fall back to column names only, then to a bare name list.
+        """
+        budget = token_budget or settings.SCHEMA_PROMPT_TOKEN_BUDGET
+
+        # 1. Keep only live tables, preserving the AI's recommendation order
+        requested = []
         for name in table_names:
-            if name in self.available_tables:
-                real_tables.add(name)
-            else:
-                # fuzzy match?
-                pass
+            if name in self.available_tables and name not in requested:
+                requested.append(name)
 
         # 2. Smart Table Injection (Core vs. Contextual)
-        # Identity tables are universal (always needed for role-based scoping)
-        mandatory = {
-            "users",
-            "user_academics",
-            "colleges",
-            "departments",
-            "batches",
-            "sections",
-            "courses",
-            "course_academic_maps",
-        }
-        
-        # Assessment/Result infrastructure is only added if relevant
-        # (e.g., if AI recommended a result table or a test-related table)
         is_assessment_query = any(
             "result" in t.lower() or 
             "test" in t.lower() or 
             "qb" in t.lower() or 
             "segregation" in t.lower() or
             "enrollment" in t.lower()
-            for t in real_tables
+            for t in requested
         )
-        
+        mandatory = set(MANDATORY_TABLES)
         if is_assessment_query:
-            mandatory.update({
-                "tests",
-                "test_question_maps",
-                "standard_qb_codings",
-                "standard_qb_mcqs",
-                "course_wise_segregations",
-                "user_course_enrollments",
-                "academic_qb_codings",
-                "academic_qb_mcqs"
-            })
-
-        real_tables.update(mandatory.intersection(self.available_tables))
-
-        # 3. Build JSON Dump for these tables
-        extracted_schema = {"tables": {}}
-        for t in real_tables:
-            if t in self.schema_data["tables"]:
-                raw_table = self.schema_data["tables"][t]
-                
-                # Simplify Columns
-                simple_columns = []
-                for col in raw_table.get("schema", {}).get("columns", []):
-                    simple_columns.append(
-                        f"{col['Field']} ({col['Type']})" + 
-                        (f" [PK]" if col['Key'] == 'PRI' else "") +
-                        (f" [FK]" if col['Key'] == 'MUL' else "")
-                    )
-
-                # Simplify Enums
-                simple_enums = {}
-                for col, data in raw_table.get("enum_fields", {}).items():
-                    # Extract just the values, ignore counts
-                    if isinstance(data, dict) and "values" in data:
-                        simple_enums[col] = [
-                            v["value"] for v in data["values"] 
-                            if isinstance(v, dict) and "value" in v
-                        ]
-                
-                extracted_schema["tables"][t] = {
-                    "columns": simple_columns,
-                    "row_count": raw_table.get("schema", {}).get("row_count", 0),
-                    "enums": simple_enums
-                }
-
-        # 4. Add Mappings for these tables (keep as is, usually small)
-        extracted_mappings = {}
-        for t in real_tables:
-            if t in self.mappings:
-                extracted_mappings[t] = self.mappings[t]
+            mandatory.update(ASSESSMENT_TABLES)
 
-        # 5. Construct Prompt
-        lines = []
-        lines.append("### SELECTED TABLE SCHEMAS (SIMPLIFIED):")
-        lines.append(json.dumps(extracted_schema, indent=2))
+        ordered = requested + sorted(
+            t for t in mandatory.intersection(self.available_tables) if t not in requested
+        )
 
-        if extracted_mappings:
-            lines.append("\n### RELEVANT MANUAL MAPPINGS:")
-            lines.append(json.dumps(extracted_mappings, indent=2))
+        # 3. Group identically shaped tables so their columns are listed once
+        groups = {}
+        for t in ordered:
+            fragment = self.table_fragments.get(t)
+            if fragment:
+                groups.setdefault(fragment["signature"], []).append(t)
+
+        # 4. Concatenate fragments within the token budget
+        lines = ["### SELECTED TABLE SCHEMAS (COMPACT):"]
+        used = 0
+        omitted = []
+        for tables in groups.values():
+            first = self.table_fragments[tables[0]]
+            headers = [self.table_fragments[t]["header"] for t in tables]
+            header_tokens = sum(len(h) for h in headers) // 4
+            shared = f"  cols (shared by the {len(tables)} tables above):"
+            if used + header_tokens + first["tokens"] <= budget:
+                body = first["body"]
+                used += header_tokens + first["tokens"]
+            elif used + header_tokens + first["short_tokens"] <= budget:
+                body = first["short"]
+                used += header_tokens + first["short_tokens"]
+            else:
+                omitted.extend(tables)
+                continue
+            lines.extend(headers)
+            lines.append(body.replace("  cols:", shared, 1) if len(tables) > 1 else body)
+
+        if omitted:
+            lines.append(
+                f"\n### OTHER AVAILABLE TABLES (schema omitted, token budget reached):\n"
+                f"{', '.join(omitted)}"
+            )
 
         return "\n".join(lines)
 
@@ -8,44 +8,81 @@ CHANGELOG:
 - Fixed: Retry logic with simplified SQL fallback on SYNTAX_ERROR
 - Added: Better error messages for truncated queries
 - Added: Query complexity estimator to warn before execution
+- Added: Per-query time budget (MAX_EXECUTION_TIME hint + KILL QUERY) -> QUERY_TIMEOUT
+- Added: EXPLAIN cost gate (estimated rows / full table scans) -> QUERY_TOO_EXPENSIVE
+- Added: Column check against the schema index (aliases resolved, did-you-mean) -> UNKNOWN_COLUMN
 """
 
-from sqlalchemy import text, event, exc
-from sqlalchemy.pool import Pool
-from app.core.db import SessionLocal
+from sqlalchemy import text, exc
+from sqlalchemy.dialects import mysql
+from app.core.config import settings
+from app.core.db import SessionLocal, AsyncSessionLocal, engine
 from app.core.logging_config import get_logger
 from app.core.rate_limiter import query_cache
 from app.core.sql_validator import sql_validator
+from app.core.sql_canonicalizer import sql_canonicalizer
+from app.core.single_flight import query_flight, async_query_flight
+from collections import OrderedDict
+from typing import Dict
 import re
+import threading
 import time
 
 logger = get_logger("sql_executor")
 
 
+class _QueryDeadline:
+    """
+    Issues KILL QUERY for a server connection if its statement outlives the
+    time budget. Backstop for the MAX_EXECUTION_TIME hint, which only covers
+    plain SELECTs.
+    """
+
+    def __init__(self, thread_id: int, seconds: float):
+        self.thread_id = thread_id
+        self.fired = False
+        self._done = False
+        # Held while KILL runs so the connection can't be returned to the pool
+        # (and reused) until the kill has landed
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(seconds, self._kill)
+        self._timer.daemon = True
+
+    def start(self) -> "_QueryDeadline":
+        self._timer.start()
+        return self
+
+    def cancel(self):
+        self._timer.cancel()
+        with self._lock:
+            self._done = True
+
+    def _kill(self):
+        with self._lock:
+            if self._done:
+                return
+            self.fired = True
+            try:
+                with engine.connect() as conn:
+                    conn.exec_driver_sql(f"KILL QUERY {int(self.thread_id)}")
+                logger.warning(f"⏱️ Killed query on connection {self.thread_id} (time budget exceeded)")
+            except Exception as e:
+                logger.error(f"KILL QUERY {self.thread_id} failed: {e}")
+
+
 class SQLExecutor:
+    # Distinct query shapes tracked for latency stats (least recently seen dropped first)
+    MAX_TRACKED_FINGERPRINTS = 500
+
     def __init__(self):
         self.existing_tables = None
+        # table -> {lowercase column: column}, set by the schema context
+        self.column_index: Dict[str, Dict[str, str]] = {}
+        self.column_rejections = 0
+        self.fingerprint_stats: "OrderedDict[str, dict]" = OrderedDict()
+        self._stats_lock = threading.Lock()
+        self.cost_rejections = 0
         self._load_existing_tables()
-        self._setup_connection_pool_logging()
-
-    # ─────────────────────────────────────────────
-    # Connection Pool Setup
-    # ─────────────────────────────────────────────
-
-    def _setup_connection_pool_logging(self):
-        """Setup connection pool event listeners for monitoring"""
-
-        @event.listens_for(Pool, "connect")
-        def receive_connect(dbapi_conn, connection_record):
-            logger.debug("Database connection established")
-
-        @event.listens_for(Pool, "checkout")
-        def receive_checkout(dbapi_conn, connection_record, connection_proxy):
-            logger.debug("Connection checked out from pool")
-
-        @event.listens_for(Pool, "detach")
-        def receive_detach(dbapi_conn, connection_record):
-            logger.debug("Connection detached from pool")
 
     # ─────────────────────────────────────────────
     # Table Management
@@ -71,6 +108,35 @@ class SQLExecutor:
         logger.info("Refreshing table list from database")
         self._load_existing_tables()
 
+    def set_column_index(self, column_index: Dict[str, Dict[str, str]]):
+        """Replace the column index used to check generated SQL before execution"""
+        self.column_index = column_index
+        logger.info(f"✅ Column index loaded for {len(column_index)} tables")
+
+    def validate_columns(self, sql: str) -> dict:
+        """
+        Checks every resolvable column reference against the column index
+        (no DB round trip). Unknown columns come back with the nearest real
+        column so the correction prompt can name the fix.
+        """
+        if not self.column_index:
+            return {"valid": True, "unknown_columns": [], "message": ""}
+
+        issues = sql_validator.find_unknown_columns(sql, self.column_index)
+        if not issues:
+            return {"valid": True, "unknown_columns": [], "message": ""}
+
+        parts = []
+        for issue in issues:
+            part = f"{issue['ref']} (table {issue['table']})"
+            if issue["suggestion"]:
+                part += f" — did you mean {issue['suggestion']}?"
+            else:
+                available = list(self.column_index[issue["table"]].values())
+                part += f" — available columns: {', '.join(available[:25])}"
+            parts.append(part)
+        return {"valid": False, "unknown_columns": issues, "message": "; ".join(parts)}
+
     def extract_tables_from_sql(self, sql: str) -> set:
         """Extract table names from SQL query"""
         return set(sql_validator.extract_tables(sql))
@@ -320,38 +386,121 @@ class SQLExecutor:
         }
 
     # ─────────────────────────────────────────────
-    # Main Query Executor (FIXED: better error messages)
+    # Per-query Time Budget
     # ─────────────────────────────────────────────
 
-    def execute_query(
-        self, sql: str, user_id: str = None, use_cache: bool = True
-    ) -> dict:
-        """
-        Executes raw SQL with explicit error handling, validation, and caching.
+    def query_time_budget(self, complexity: dict) -> float:
+        """Seconds a query may run, scaled by its estimated complexity"""
+        budgets = settings.SQL_TIMEOUT_SECONDS
+        return float(budgets.get(complexity["level"], max(budgets.values())))
+
+    @staticmethod
+    def _with_time_hint(sql: str, budget_seconds: float) -> str:
+        """Adds a MAX_EXECUTION_TIME optimizer hint to a top-level SELECT"""
+        match = re.match(r"\s*SELECT\b", sql, re.IGNORECASE)
+        if not match or "MAX_EXECUTION_TIME" in sql.upper():
+            return sql
+        hint = f" /*+ MAX_EXECUTION_TIME({int(budget_seconds * 1000)}) */"
+        return sql[: match.end()] + hint + sql[match.end():]
+
+    @staticmethod
+    def _start_deadline(driver_connection, budget_seconds: float):
+        """Arm KILL QUERY for the connection, or None if the driver has no thread id"""
+        try:
+            thread_id = driver_connection.thread_id()
+        except AttributeError:
+            return None
+        return _QueryDeadline(
+            thread_id, budget_seconds + settings.SQL_TIMEOUT_KILL_GRACE_SECONDS
+        ).start()
 
-        Args:
-            sql: SQL query to execute
-            user_id: Optional user identifier for audit trail
-            use_cache: Whether to use cached results
+    # ─────────────────────────────────────────────
+    # EXPLAIN Cost Gate
+    # ─────────────────────────────────────────────
 
-        Returns:
-            {"data": [...], "count": N, "sql": "...", "cached": bool} or
-            {"error": "...", "sql": "...", "error_code": "..."}
+    @staticmethod
+    def _explain_sql(clean_sql: str):
+        """EXPLAIN statement for the query, or None if it isn't a SELECT/WITH"""
+        if not re.match(r"\s*(SELECT|WITH)\b", clean_sql, re.IGNORECASE):
+            return None
+        return text(f"EXPLAIN {clean_sql}")
 
-        FIXES APPLIED:
-        - scrub_sql() now detects and rejects truncated queries (unbalanced parens)
-        - Complexity is logged before execution for observability
-        - Truncated query error returns a clear, actionable message
+    @staticmethod
+    def estimate_plan_cost(plan: list) -> dict:
         """
-        start_time = time.time()
+        Reads EXPLAIN output (TiDB: id/estRows/access object, MySQL: table/type/rows/filtered).
 
+        Returns: {"est_rows": int, "full_scans": [{"table": str, "rows": int}]}
+        est_rows is the largest row estimate of any operator (TiDB) or of any
+        query block's nested-loop join (MySQL).
+        """
+        full_scans = []
+        if plan and "estRows" in plan[0]:
+            est_rows = 0
+            for step in plan:
+                rows = int(float(step.get("estRows") or 0))
+                est_rows = max(est_rows, rows)
+                if "TableFullScan" in str(step.get("id", "")):
+                    table = str(step.get("access object") or "").replace("table:", "").split(",")[0]
+                    full_scans.append({"table": table.strip(), "rows": rows})
+        else:
+            blocks = {}
+            for step in plan:
+                rows = int(step.get("rows") or 0)
+                filtered = float(step.get("filtered") or 100) / 100
+                blocks[step.get("id")] = blocks.get(step.get("id"), 1) * max(rows * filtered, 1)
+                if step.get("type") == "ALL":
+                    full_scans.append({"table": step.get("table") or "", "rows": rows})
+            est_rows = int(max(blocks.values(), default=0))
+        return {"est_rows": est_rows, "full_scans": full_scans}
+
+    def _check_cost(self, plan: list, clean_sql: str, user_id: str = None):
+        """Returns a QUERY_TOO_EXPENSIVE error dict if the plan is over budget, else None"""
+        cost = self.estimate_plan_cost(plan)
+        big_scans = [
+            scan for scan in cost["full_scans"]
+            if scan["rows"] > settings.SQL_COST_MAX_FULL_SCAN_ROWS
+        ]
+        if cost["est_rows"] <= settings.SQL_COST_MAX_EST_ROWS and not big_scans:
+            return None
+
+        self.cost_rejections += 1
+        reasons = [f"~{cost['est_rows']:,} estimated rows"] + [
+            f"full scan of {scan['table']} (~{scan['rows']:,} rows)" for scan in big_scans
+        ]
+        logger.warning(
+            f"💸 Query rejected by cost gate | {'; '.join(reasons)} | "
+            f"SQL: {clean_sql[:100]} | User: {user_id}"
+        )
+        return {
+            "error": (
+                f"Query is too expensive to run ({'; '.join(reasons)}). "
+                "Add WHERE filters on indexed columns (user_id, college, batch, section, "
+                "course) so whole tables aren't scanned, aggregate before joining, "
+                "and add a LIMIT to list queries."
+            ),
+            "sql": clean_sql,
+            "error_code": "QUERY_TOO_EXPENSIVE",
+            "cost": cost,
+            "user_id": user_id,
+        }
+
+    # ─────────────────────────────────────────────
+    # Query Preparation (shared by buffered and streaming execution)
+    # ─────────────────────────────────────────────
+
+    def _prepare_query(self, sql: str, user_id: str = None) -> tuple:
+        """
+        Scrubs the SQL and estimates its complexity.
+        Returns (clean_sql, complexity, error) where error is an error dict or None.
+        """
         # Step 1: Scrub SQL
         clean_sql = self.scrub_sql(sql)
         logger.debug(f"Executing query: {clean_sql[:80]}...")
 
         # Step 1b: If scrub_sql returned empty (truncated query detected)
         if not clean_sql:
-            return {
+            return clean_sql, None, {
                 "error": (
                     "The generated SQL query was incomplete (likely truncated by the AI token limit). "
                     "Please try rephrasing your question more simply, or break it into smaller parts."
@@ -372,13 +521,13 @@ class SQLExecutor:
                 f"Has JSON: {complexity['has_json']}"
             )
 
-        # Step 2: Check cache
-        if use_cache:
-            cached_result = query_cache.get(clean_sql, user_id)
-            if cached_result:
-                logger.info(f"Cache hit for query (user: {user_id})")
-                return {**cached_result, "cached": True}
+        return clean_sql, complexity, None
 
+    def _validate_query(self, clean_sql: str, user_id: str = None):
+        """
+        Runs safety, syntax, table, column and GROUP BY checks.
+        Returns an error dict, or None if the query may be executed.
+        """
         # Step 3: Validate safety
         if not self.is_safe(clean_sql):
             error_msg = "Query rejected: Only SELECT queries are allowed. Destructive operations (INSERT, UPDATE, DELETE, DROP) are not permitted."
@@ -428,6 +577,19 @@ class SQLExecutor:
                 "user_id": user_id,
             }
 
+        # Step 5a: Validate columns exist (aliases resolved against the schema index)
+        column_validation = self.validate_columns(clean_sql)
+        if not column_validation["valid"]:
+            logger.warning(f"Column validation failed: {column_validation['message']}")
+            self.column_rejections += 1
+            return {
+                "error": f"Unknown column: {column_validation['message']}",
+                "sql": clean_sql,
+                "error_code": "UNKNOWN_COLUMN",
+                "unknown_columns": column_validation["unknown_columns"],
+                "user_id": user_id,
+            }
+
         # Step 5b: Detect GROUP BY issues before execution (MySQL ONLY_FULL_GROUP_BY)
         group_check = self.detect_group_by_issues(clean_sql)
         if group_check.get("has_issue"):
@@ -445,15 +607,193 @@ class SQLExecutor:
                 "user_id": user_id,
             }
 
-        # Step 6: Execute query
+        return None
+
+    @staticmethod
+    def _classify_db_error(error_msg: str) -> tuple:
+        """Maps a database exception message to (error_code, friendly_msg)."""
+        # Parse specific error types for user-friendly messages
+        if "doesn't exist" in error_msg.lower():
+            table_match = re.search(r"Table '[\w.]+\.([\w_]+)'", error_msg)
+            missing_table = table_match.group(1) if table_match else "unknown"
+            error_code = "TABLE_NOT_FOUND"
+            friendly_msg = (
+                f"Table '{missing_table}' doesn't exist in the database. "
+                "The AI may have referenced a non-existent table. "
+                "Please try rephrasing your question."
+            )
+
+        elif (
+            "only_full_group_by" in error_msg.lower()
+            or "nonaggregated column" in error_msg.lower()
+        ):
+            error_code = "GROUP_BY_ERROR"
+            friendly_msg = (
+                "Query error: GROUP BY clause is incomplete. "
+                "When using aggregate functions (SUM, COUNT, AVG), "
+                "all non-aggregated columns must appear in the GROUP BY clause."
+            )
+
+        elif (
+            "maximum statement execution time exceeded" in error_msg.lower()
+            or "query execution was interrupted" in error_msg.lower()
+        ):
+            error_code = "QUERY_TIMEOUT"
+            friendly_msg = (
+                "The query took too long and was cancelled. "
+                "Narrow it down (a specific college, batch or semester) or ask for fewer details."
+            )
+
+        elif "syntax" in error_msg.lower():
+            error_code = "SQL_SYNTAX_ERROR"
+            # Extract the specific syntax issue from error message
+            syntax_detail = ""
+            if "near" in error_msg.lower():
+                # Try to extract what's near the error
+                near_match = re.search(r"near '([^']+)'", error_msg, re.IGNORECASE)
+                if near_match:
+                    syntax_detail = f" (near '{near_match.group(1)}')"
+            friendly_msg = (
+                f"SQL syntax error: {syntax_detail or 'Check query formatting'}. "
+                "Ensure all keywords have proper spacing (e.g., 'FROM table INNER JOIN' not 'FROM tableINNER'). "
+                "Check that all parentheses, quotes, and commas are balanced."
+            )
+
+        elif "access denied" in error_msg.lower():
+            error_code = "ACCESS_DENIED"
+            friendly_msg = (
+                "Database access denied. Please contact your administrator."
+            )
+
+        elif (
+            "lost connection" in error_msg.lower()
+            or "gone away" in error_msg.lower()
+        ):
+            error_code = "DB_CONNECTION_ERROR"
+            friendly_msg = "Database connection lost. Please try again in a moment."
+
+        elif "lock wait timeout" in error_msg.lower():
+            error_code = "LOCK_TIMEOUT"
+            friendly_msg = (
+                "Query timed out waiting for a database lock. Please try again."
+            )
+
+        else:
+            error_code = "QUERY_EXECUTION_ERROR"
+            friendly_msg = "An error occurred while executing the query. Please try a simpler question."
+
+        return error_code, friendly_msg
+
+    # ─────────────────────────────────────────────
+    # Main Query Executor (FIXED: better error messages)
+    # ─────────────────────────────────────────────
+
+    def execute_query(
+        self, sql: str, user_id: str = None, use_cache: bool = True, params: dict = None
+    ) -> dict:
+        """
+        Executes raw SQL with explicit error handling, validation, and caching.
+
+        Args:
+            sql: SQL query to execute
+            user_id: Optional user identifier for audit trail
+            use_cache: Whether to use cached results
+            params: Bind parameters for :name placeholders (vetted SQL templates)
+
+        Returns:
+            {"data": [...], "count": N, "sql": "...", "cached": bool} or
+            {"error": "...", "sql": "...", "error_code": "..."}
+
+        FIXES APPLIED:
+        - scrub_sql() now detects and rejects truncated queries (unbalanced parens)
+        - Complexity is logged before execution for observability
+        - Truncated query error returns a clear, actionable message
+        - Each query gets a time budget scaled by complexity (MAX_EXECUTION_TIME
+          hint + KILL QUERY backstop); overruns return error_code QUERY_TIMEOUT
+        - SELECT/WITH queries are EXPLAINed first; plans over the row/full-scan
+          thresholds return error_code QUERY_TOO_EXPENSIVE without running
+        """
+        start_time = time.time()
+
+        # Steps 1-1c: Scrub SQL and estimate complexity
+        clean_sql, complexity, error = self._prepare_query(sql, user_id)
+        if error:
+            return error
+
+        # Step 2: Check cache
+        cache_sql = self.inline_params(clean_sql, params)
+        if use_cache:
+            cached_result = query_cache.get(cache_sql, user_id)
+            if cached_result:
+                logger.info(f"Cache hit for query (user: {user_id})")
+                return {**cached_result, "cached": True}
+
+        # Steps 3-5b: Safety, syntax, table and GROUP BY validation
+        error = self._validate_query(clean_sql, user_id)
+        if error:
+            return error
+
+        # Step 6: Execute query (concurrent identical queries share one execution)
+        flight_key = f"{sql_canonicalizer.result_key(cache_sql)}:{user_id or 'anonymous'}:{use_cache}"
+        result, shared = query_flight.do(
+            flight_key,
+            lambda: self._run_query(clean_sql, user_id, use_cache, complexity, start_time, params),
+        )
+        if shared:
+            logger.info(f"🔗 Coalesced with in-flight identical query (user: {user_id})")
+            return {**result, "coalesced": True}
+        return result
+
+    @staticmethod
+    def inline_params(sql: str, params: dict = None) -> str:
+        """
+        SQL with bind parameters rendered as escaped literals. Used as the
+        cache/coalescing identity of a parameterized query, and wherever the
+        SQL is shown or saved to run later without its parameters.
+        """
+        if not params:
+            return sql
+        statement = text(sql).bindparams(**params)
+        return str(
+            statement.compile(
+                dialect=mysql.dialect(paramstyle="named"),
+                compile_kwargs={"literal_binds": True},
+            )
+        )
+
+    def _run_query(
+        self,
+        clean_sql: str,
+        user_id: str,
+        use_cache: bool,
+        complexity: dict,
+        start_time: float,
+        params: dict = None,
+    ) -> dict:
+        """Runs a validated query against the database and caches the result."""
         db = SessionLocal()
+        deadline = None
         try:
+            explain = self._explain_sql(clean_sql) if settings.SQL_COST_GATE_ENABLED else None
+            if explain is not None:
+                plan = [dict(row) for row in db.execute(explain, params or {}).mappings()]
+                error = self._check_cost(plan, clean_sql, user_id)
+                if error:
+                    db.rollback()
+                    return error
+
             start_exec = time.time()
-            result = db.execute(text(clean_sql))
+            budget = self.query_time_budget(complexity)
+            deadline = self._start_deadline(
+                db.connection().connection.driver_connection, budget
+            )
+            result = db.execute(text(self._with_time_hint(clean_sql, budget)), params or {})
 
             # Fetch all rows
             rows = result.fetchall()
             keys = result.keys()
+            if deadline:
+                deadline.cancel()
 
             # Convert to list of dicts
             data = [dict(zip(keys, row)) for row in rows]
@@ -463,102 +803,229 @@ class SQLExecutor:
             # Commit transaction
             db.commit()
 
-            result_dict = {
-                "data": data,
-                "count": len(data),
-                "sql": clean_sql,
-                "cached": False,
-                "execution_time_ms": int(execution_time * 1000),
-                "complexity": complexity["level"],
-            }
-
-            # Cache successful result
-            if use_cache:
-                query_cache.set(clean_sql, result_dict, user_id)
-
-            logger.info(
-                f"Query executed successfully | "
-                f"Rows: {len(data)} | "
-                f"Time: {execution_time * 1000:.2f}ms | "
-                f"User: {user_id} | "
-                f"Complexity: {complexity['level']} (score={complexity['score']})"
+            return self._query_succeeded(
+                clean_sql, data, execution_time, user_id, use_cache, complexity, params
             )
 
-            return result_dict
-
         except Exception as e:
+            # Disarm before rollback releases the connection to the pool
+            if deadline:
+                deadline.cancel()
             db.rollback()
-            error_msg = str(e)
-            error_type = type(e).__name__
-
-            # Parse specific error types for user-friendly messages
-            if "doesn't exist" in error_msg.lower():
-                table_match = re.search(r"Table '[\w.]+\.([\w_]+)'", error_msg)
-                missing_table = table_match.group(1) if table_match else "unknown"
-                error_code = "TABLE_NOT_FOUND"
-                friendly_msg = (
-                    f"Table '{missing_table}' doesn't exist in the database. "
-                    "The AI may have referenced a non-existent table. "
-                    "Please try rephrasing your question."
-                )
+            return self._query_failed(e, clean_sql, user_id, start_time)
+        finally:
+            db.close()
 
-            elif (
-                "only_full_group_by" in error_msg.lower()
-                or "nonaggregated column" in error_msg.lower()
-            ):
-                error_code = "GROUP_BY_ERROR"
-                friendly_msg = (
-                    "Query error: GROUP BY clause is incomplete. "
-                    "When using aggregate functions (SUM, COUNT, AVG), "
-                    "all non-aggregated columns must appear in the GROUP BY clause."
-                )
+    async def execute_query_async(
+        self, sql: str, user_id: str = None, use_cache: bool = True, params: dict = None
+    ) -> dict:
+        """
+        execute_query() on the async engine: same validation, caching and
+        result shape, but the database round-trip doesn't hold a threadpool
+        thread. Concurrent identical queries share one execution.
+        """
+        start_time = time.time()
 
-            elif "syntax" in error_msg.lower():
-                error_code = "SQL_SYNTAX_ERROR"
-                # Extract the specific syntax issue from error message
-                syntax_detail = ""
-                if "near" in error_msg.lower():
-                    # Try to extract what's near the error
-                    near_match = re.search(r"near '([^']+)'", error_msg, re.IGNORECASE)
-                    if near_match:
-                        syntax_detail = f" (near '{near_match.group(1)}')"
-                friendly_msg = (
-                    f"SQL syntax error: {syntax_detail or 'Check query formatting'}. "
-                    "Ensure all keywords have proper spacing (e.g., 'FROM table INNER JOIN' not 'FROM tableINNER'). "
-                    "Check that all parentheses, quotes, and commas are balanced."
-                )
+        clean_sql, complexity, error = self._prepare_query(sql, user_id)
+        if error:
+            return error
 
-            elif "access denied" in error_msg.lower():
-                error_code = "ACCESS_DENIED"
-                friendly_msg = (
-                    "Database access denied. Please contact your administrator."
-                )
+        cache_sql = self.inline_params(clean_sql, params)
+        if use_cache:
+            cached_result = query_cache.get(cache_sql, user_id)
+            if cached_result:
+                logger.info(f"Cache hit for query (user: {user_id})")
+                return {**cached_result, "cached": True}
+
+        error = self._validate_query(clean_sql, user_id)
+        if error:
+            return error
 
-            elif (
-                "lost connection" in error_msg.lower()
-                or "gone away" in error_msg.lower()
-            ):
-                error_code = "DB_CONNECTION_ERROR"
-                friendly_msg = "Database connection lost. Please try again in a moment."
-
-            elif "lock wait timeout" in error_msg.lower():
-                error_code = "LOCK_TIMEOUT"
-                friendly_msg = (
-                    "Query timed out waiting for a database lock. Please try again."
+        flight_key = f"{sql_canonicalizer.result_key(cache_sql)}:{user_id or 'anonymous'}:{use_cache}"
+        result, shared = await async_query_flight.do(
+            flight_key,
+            lambda: self._run_query_async(clean_sql, user_id, use_cache, complexity, start_time, params),
+        )
+        if shared:
+            logger.info(f"🔗 Coalesced with in-flight identical query (user: {user_id})")
+            return {**result, "coalesced": True}
+        return result
+
+    async def _run_query_async(
+        self,
+        clean_sql: str,
+        user_id: str,
+        use_cache: bool,
+        complexity: dict,
+        start_time: float,
+        params: dict = None,
+    ) -> dict:
+        """Async counterpart of _run_query()"""
+        async with AsyncSessionLocal() as db:
+            deadline = None
+            try:
+                explain = self._explain_sql(clean_sql) if settings.SQL_COST_GATE_ENABLED else None
+                if explain is not None:
+                    plan = [dict(row) for row in (await db.execute(explain, params or {})).mappings()]
+                    error = self._check_cost(plan, clean_sql, user_id)
+                    if error:
+                        await db.rollback()
+                        return error
+
+                start_exec = time.time()
+                budget = self.query_time_budget(complexity)
+                raw = await (await db.connection()).get_raw_connection()
+                deadline = self._start_deadline(raw.driver_connection, budget)
+                result = await db.execute(text(self._with_time_hint(clean_sql, budget)), params or {})
+                keys = result.keys()
+                data = [dict(zip(keys, row)) for row in result.fetchall()]
+                execution_time = time.time() - start_exec
+                if deadline:
+                    deadline.cancel()
+                await db.commit()
+
+                return self._query_succeeded(
+                    clean_sql, data, execution_time, user_id, use_cache, complexity, params
                 )
 
-            else:
-                error_code = "QUERY_EXECUTION_ERROR"
-                friendly_msg = "An error occurred while executing the query. Please try a simpler question."
+            except Exception as e:
+                if deadline:
+                    deadline.cancel()
+                await db.rollback()
+                return self._query_failed(e, clean_sql, user_id, start_time)
+
+    def _query_succeeded(
+        self,
+        clean_sql: str,
+        data: list,
+        execution_time: float,
+        user_id: str,
+        use_cache: bool,
+        complexity: dict,
+        params: dict = None,
+    ) -> dict:
+        """Builds (and caches) the result of a successful execution."""
+        result_dict = {
+            "data": data,
+            "count": len(data),
+            "sql": clean_sql,
+            "cached": False,
+            "execution_time_ms": int(execution_time * 1000),
+            "complexity": complexity["level"],
+            "fingerprint": self.record_latency(
+                clean_sql, execution_time * 1000, len(data)
+            ),
+        }
+
+        # Cache successful result
+        if use_cache:
+            query_cache.set(self.inline_params(clean_sql, params), result_dict, user_id)
+
+        logger.info(
+            f"Query executed successfully | "
+            f"Rows: {len(data)} | "
+            f"Time: {execution_time * 1000:.2f}ms | "
+            f"User: {user_id} | "
+            f"Complexity: {complexity['level']} (score={complexity['score']})"
+        )
 
+        return result_dict
+
+    def _query_failed(self, e: Exception, clean_sql: str, user_id: str, start_time: float) -> dict:
+        """Builds the error result of a failed execution."""
+        error_msg = str(e)
+        error_type = type(e).__name__
+
+        error_code, friendly_msg = self._classify_db_error(error_msg)
+        self.record_latency(
+            clean_sql, (time.time() - start_time) * 1000, 0, failed=True
+        )
+
+        logger.error(
+            f"Query execution failed | "
+            f"Error: {error_type} | "
+            f"Message: {error_msg[:200]} | "
+            f"SQL: {clean_sql[:100]} | "
+            f"User: {user_id}"
+        )
+
+        return {
+            "error": friendly_msg,
+            "error_code": error_code,
+            "sql": clean_sql,
+            "technical_details": error_msg,
+            "user_id": user_id,
+            "execution_time_ms": int((time.time() - start_time) * 1000),
+        }
+
+    # ─────────────────────────────────────────────
+    # Streaming Query Executor (server-side cursor)
+    # ─────────────────────────────────────────────
+
+    def stream_query(
+        self, sql: str, user_id: str = None, batch_size: int = 500
+    ) -> dict:
+        """
+        Executes SQL on an unbuffered server-side cursor (PyMySQL SSCursor)
+        so large result sets never sit in memory all at once.
+
+        The statement is validated and executed eagerly, so errors come back
+        in the same shape as execute_query(). Rows are then pulled lazily.
+
+        Returns:
+            {"columns": [...], "batches": <iterator of lists of row dicts>,
+             "sql": "...", "complexity": "..."} or
+            {"error": "...", "sql": "...", "error_code": "..."}
+
+        Same EXPLAIN cost gate and time budget as execute_query(); the budget
+        covers the whole stream, including time spent waiting on the client.
+
+        Results are never cached. The iterator owns the DB session and must be
+        consumed or closed; it closes the session when exhausted, and closing
+        it early (client disconnected) drops the connection instead of
+        draining the remaining rows.
+        """
+        start_time = time.time()
+
+        clean_sql, complexity, error = self._prepare_query(sql, user_id)
+        if error:
+            return error
+
+        error = self._validate_query(clean_sql, user_id)
+        if error:
+            return error
+
+        db = SessionLocal()
+        deadline = None
+        try:
+            conn = db.connection(execution_options={"stream_results": True})
+            explain = self._explain_sql(clean_sql) if settings.SQL_COST_GATE_ENABLED else None
+            if explain is not None:
+                plan = [dict(row) for row in conn.execute(explain).mappings()]
+                error = self._check_cost(plan, clean_sql, user_id)
+                if error:
+                    db.rollback()
+                    db.close()
+                    return error
+
+            budget = self.query_time_budget(complexity)
+            deadline = self._start_deadline(conn.connection.driver_connection, budget)
+            result = conn.execute(text(self._with_time_hint(clean_sql, budget)))
+            columns = list(result.keys())
+        except Exception as e:
+            if deadline:
+                deadline.cancel()
+            db.rollback()
+            db.close()
+            error_msg = str(e)
+            error_code, friendly_msg = self._classify_db_error(error_msg)
             logger.error(
-                f"Query execution failed | "
-                f"Error: {error_type} | "
+                f"Streaming query failed | "
+                f"Error: {type(e).__name__} | "
                 f"Message: {error_msg[:200]} | "
                 f"SQL: {clean_sql[:100]} | "
                 f"User: {user_id}"
             )
-
             return {
                 "error": friendly_msg,
                 "error_code": error_code,
@@ -567,8 +1034,98 @@ class SQLExecutor:
                 "user_id": user_id,
                 "execution_time_ms": int((time.time() - start_time) * 1000),
             }
-        finally:
-            db.close()
+
+        def batches():
+            row_count = 0
+            finished = False
+            try:
+                for partition in result.partitions(batch_size):
+                    row_count += len(partition)
+                    yield [dict(zip(columns, row)) for row in partition]
+                finished = True
+                db.commit()
+                self.record_latency(
+                    clean_sql, (time.time() - start_time) * 1000, row_count
+                )
+                logger.info(
+                    f"Streamed query completed | "
+                    f"Rows: {row_count} | "
+                    f"Time: {(time.time() - start_time) * 1000:.2f}ms | "
+                    f"User: {user_id} | "
+                    f"Complexity: {complexity['level']} (score={complexity['score']})"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Streaming query aborted after {row_count} rows | "
+                    f"Error: {type(e).__name__} | Message: {str(e)[:200]}"
+                )
+                raise
+            finally:
+                if deadline:
+                    deadline.cancel()
+                if not finished:
+                    # Abandoned mid-stream: closing an unbuffered cursor would read
+                    # every remaining row, so drop the connection instead
+                    logger.info(f"Streamed query closed early after {row_count} rows | User: {user_id}")
+                    conn.invalidate()
+                else:
+                    result.close()
+                db.close()
+
+        return {
+            "columns": columns,
+            "batches": batches(),
+            "sql": clean_sql,
+            "complexity": complexity["level"],
+        }
+
+    # ─────────────────────────────────────────────
+    # Per-fingerprint Latency Stats
+    # ─────────────────────────────────────────────
+
+    def record_latency(
+        self, sql: str, elapsed_ms: float, rows: int, failed: bool = False
+    ) -> str:
+        """Accumulate timing for the query's shape. Returns the fingerprint digest."""
+        fingerprint = sql_canonicalizer.fingerprint(sql)
+        digest = sql_canonicalizer.digest(fingerprint)
+        with self._stats_lock:
+            stats = self.fingerprint_stats.get(digest)
+            if stats is None:
+                stats = {
+                    "fingerprint": fingerprint[:300],
+                    "count": 0,
+                    "errors": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "total_rows": 0,
+                }
+                self.fingerprint_stats[digest] = stats
+                while len(self.fingerprint_stats) > self.MAX_TRACKED_FINGERPRINTS:
+                    self.fingerprint_stats.popitem(last=False)
+            self.fingerprint_stats.move_to_end(digest)
+            stats["count"] += 1
+            stats["errors"] += 1 if failed else 0
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["total_rows"] += rows
+        return digest
+
+    def get_fingerprint_stats(self, top: int = 10) -> list:
+        """Query shapes ordered by total time spent"""
+        with self._stats_lock:
+            items = [
+                {
+                    "digest": digest,
+                    **stats,
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                    "total_ms": round(stats["total_ms"], 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                }
+                for digest, stats in self.fingerprint_stats.items()
+            ]
+        items.sort(key=lambda s: s["total_ms"], reverse=True)
+        return items[:top]
 
     # ─────────────────────────────────────────────
     # Utility Methods
@@ -583,6 +1140,10 @@ class SQLExecutor:
         return {
             "tables_loaded": len(self.existing_tables) if self.existing_tables else 0,
             "cache_stats": query_cache.get_stats(),
+            "tracked_fingerprints": len(self.fingerprint_stats),
+            "cost_rejections": self.cost_rejections,
+            "column_rejections": self.column_rejections,
+            "slowest_fingerprints": self.get_fingerprint_stats(),
             "timestamp": time.time(),
         }
 
@@ -0,0 +1,160 @@
+"""
+SQL Templates
+Vetted, parameterized SQL for classifier intents that don't need the LLM
+(top performers, plain counts). The classifier picks a template and fills
+its slots; render() adds the caller's role scope. Every value reaches the
+database as a bind parameter.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from app.core.logging_config import get_logger
+from app.services.query_classifier import ClassifiedIntent
+
+logger = get_logger("sql_templates")
+
+# Finest scope level last
+SCOPE_LEVELS = ("college", "department", "batch", "section")
+
+# role_id -> scope levels every query for that role must filter on
+# (roles not listed, e.g. Content, always use the LLM pipeline)
+ROLE_SCOPES = {
+    1: (),
+    2: (),
+    3: ("college",),
+    4: ("department",),
+    5: ("department",),
+    7: ("college", "department", "batch", "section"),
+}
+
+# Course-name substrings for the language slot ("c" is too short to match safely)
+LANGUAGE_COURSE_NAMES = {
+    "java": "java",
+    "python": "python",
+    "c++": "c++",
+    "html": "html",
+    "react": "react",
+}
+
+TOP_PERFORMERS_SQL = """SELECT u.name AS student_name, SUM(cws.score) AS total_score,
+ROUND(AVG(cws.progress), 2) AS avg_progress, COUNT(cws.course_id) AS courses
+FROM course_wise_segregations cws
+JOIN users u ON u.id = cws.user_id{course_join}
+WHERE cws.status = 1 AND cws.user_role = 7{filters}
+GROUP BY cws.user_id, u.name
+ORDER BY total_score DESC
+LIMIT :limit"""
+
+TOP_PERFORMERS_COURSE_JOIN = "\nJOIN courses c ON c.id = cws.course_id"
+TOP_PERFORMERS_LANGUAGE_FILTER = " AND LOWER(c.course_name) LIKE CONCAT('%', :course_name, '%')"
+
+# entity -> (unscoped SQL for admins, scoped SQL over user_academics or None)
+COUNT_SQL = {
+    "students": (
+        "SELECT COUNT(*) AS total_students FROM users WHERE role = 7",
+        "SELECT COUNT(DISTINCT ua.user_id) AS total_students FROM users u "
+        "JOIN user_academics ua ON ua.user_id = u.id WHERE u.role = 7{filters}",
+    ),
+    "users": (
+        "SELECT COUNT(*) AS total_users FROM users",
+        "SELECT COUNT(DISTINCT ua.user_id) AS total_users FROM user_academics ua "
+        "WHERE ua.user_id IS NOT NULL{filters}",
+    ),
+    "colleges": (
+        "SELECT COUNT(*) AS total_colleges FROM colleges WHERE status = 1",
+        None,
+    ),
+    "departments": (
+        "SELECT COUNT(*) AS total_departments FROM departments WHERE status = 1",
+        "SELECT COUNT(DISTINCT ua.department_id) AS total_departments FROM user_academics ua "
+        "WHERE ua.department_id IS NOT NULL{filters}",
+    ),
+    "batches": (
+        "SELECT COUNT(*) AS total_batches FROM batches WHERE status = 1",
+        "SELECT COUNT(DISTINCT ua.batch_id) AS total_batches FROM user_academics ua "
+        "WHERE ua.batch_id IS NOT NULL{filters}",
+    ),
+    "sections": (
+        "SELECT COUNT(*) AS total_sections FROM sections WHERE status = 1",
+        "SELECT COUNT(DISTINCT ua.section_id) AS total_sections FROM user_academics ua "
+        "WHERE ua.section_id IS NOT NULL{filters}",
+    ),
+}
+
+# Count entity -> scope level it corresponds to (a role can't count its own level or coarser)
+ENTITY_LEVELS = {"departments": "department", "batches": "batch", "sections": "section"}
+
+
+class SQLTemplateLibrary:
+    """Renders classifier templates into (sql, params) for a role scope"""
+
+    def render(self, intent: ClassifiedIntent, scope: Dict) -> Optional[Tuple[str, Dict]]:
+        """
+        Returns (sql, params), or None when the template can't answer this
+        question for this role (the caller falls back to the LLM pipeline).
+        scope: {"role_id", "college_id", "department_id", "batch_id", "section_id"}
+        """
+        if not intent.sql_template:
+            return None
+
+        levels = ROLE_SCOPES.get(scope.get("role_id"))
+        if levels is None:
+            return None
+
+        # "in my batch" from an admin, or "in my college" from staff, means a
+        # scope the role context doesn't pin down
+        mentioned = set(intent.metadata.get("scope_words", ()))
+        if not mentioned <= set(levels):
+            return None
+
+        params = {}
+        for level in levels:
+            value = scope.get(f"{level}_id")
+            if value in (None, "", "Unknown"):
+                return None
+            params[f"{level}_id"] = value
+
+        if intent.sql_template == "top_performers":
+            return self._top_performers(intent, levels, params)
+        if intent.sql_template == "count":
+            return self._count(intent, levels, params)
+        logger.warning(f"Unknown SQL template: {intent.sql_template}")
+        return None
+
+    @staticmethod
+    def _filters(alias: str, levels) -> str:
+        return "".join(f" AND {alias}.{level}_id = :{level}_id" for level in levels)
+
+    def _top_performers(self, intent: ClassifiedIntent, levels, params: Dict):
+        course_join = ""
+        filters = self._filters("cws", levels)
+        language = intent.metadata.get("language")
+        if language:
+            course_name = LANGUAGE_COURSE_NAMES.get(language)
+            if not course_name:
+                return None
+            course_join = TOP_PERFORMERS_COURSE_JOIN
+            filters += TOP_PERFORMERS_LANGUAGE_FILTER
+            params["course_name"] = course_name
+
+        params["limit"] = int(intent.metadata.get("limit") or 10)
+        sql = TOP_PERFORMERS_SQL.format(course_join=course_join, filters=filters)
+        return sql, params
+
+    def _count(self, intent: ClassifiedIntent, levels, params: Dict):
+        entity = intent.metadata.get("entity")
+        if entity not in COUNT_SQL:
+            return None
+        unscoped, scoped = COUNT_SQL[entity]
+        if not levels:
+            return unscoped, params
+        if scoped is None:
+            return None
+        entity_level = ENTITY_LEVELS.get(entity)
+        if entity_level and SCOPE_LEVELS.index(entity_level) <= SCOPE_LEVELS.index(levels[-1]):
+            return None
+        return scoped.format(filters=self._filters("ua", levels)), params
+
+
+# Global singleton
+sql_template_library = SQLTemplateLibrary()
@@ -0,0 +1,260 @@
+"""
+Table Retriever
+In-process BM25 index over table names, column names, enum/mapping labels and
+the semantic table descriptions, used to pick tables for SQL generation
+without the schema analysis LLM call. Built once when the schema context
+loads (and again when result tables change); lookups take well under 1 ms.
+
+Retrievals that don't cover enough of the question are reported as
+low-confidence so the caller can fall back to the LLM analysis.
+"""
+
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import math
+import re
+import threading
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger("table_retriever")
+
+# Words that say nothing about which table holds the data
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "best",
+    "by", "can", "could", "data", "details", "do", "does", "each", "every", "find",
+    "for", "from", "get", "give", "has", "have", "how", "i", "in", "info",
+    "information", "is", "it", "last", "latest", "list", "many", "me", "much", "my",
+    "number", "of", "on", "or", "our", "please", "show", "tell", "than", "that",
+    "the", "their", "them", "there", "these", "this", "those", "to", "top", "total",
+    "was", "were", "what", "when", "where", "which", "who", "whose", "why", "will",
+    "with", "would", "you", "your",
+    # time, ordering and aggregation words
+    "across", "average", "avg", "between", "compare", "count", "day", "highest",
+    "least", "lowest", "month", "most", "recent", "sum", "today", "week",
+    "yesterday",
+    # data values rather than schema terms (course / language names)
+    "c++", "html", "java", "javascript", "python", "react", "sql",
+}
+
+# Question vocabulary -> schema vocabulary
+SYNONYMS = {
+    "student": ["user"],
+    "staff": ["user", "trainer"],
+    "faculty": ["user", "trainer"],
+    "mark": ["score"],
+    "score": ["mark"],
+    "exam": ["test"],
+    "assessment": ["test"],
+    "quiz": ["mcq", "test"],
+    "dept": ["department"],
+    "branch": ["department"],
+    "class": ["section"],
+    "year": ["batch"],
+    "problem": ["question", "coding"],
+    "program": ["coding"],
+    "solved": ["solve", "status"],
+    "login": ["activity"],
+    "enrolled": ["enrollment"],
+    "enroll": ["enrollment"],
+    "assigned": ["allocation"],
+    "allocated": ["allocation"],
+    "issued": ["certificate"],
+    "rank": ["segregation", "score"],
+    "performer": ["segregation", "score"],
+    "performance": ["segregation", "score"],
+    "progress": ["segregation"],
+}
+
+# Field weights: a term in the table name says more than a term in a column
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 2
+COLUMN_WEIGHT = 1
+LABEL_WEIGHT = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, split on snake_case and camelCase, crudely singularized"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    tokens = []
+    for word in re.findall(r"[a-z0-9+#]+", text.lower()):
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _table_family(table: str) -> str:
+    """Per-college result tables share a family (e.g. ciet_2026_1_coding_result -> coding_result)"""
+    match = re.match(r"^[a-z0-9]+_\d{4}_\d+_(.+)$", table)
+    if match:
+        return match.group(1)
+    match = re.match(r"^(?:admin|b2c)_(coding_result|mcq_result|test_data)$", table)
+    return match.group(1) if match else table
+
+
+class TableRetriever:
+    """BM25 (k1, b) ranking of tables for a natural-language question"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {table: weighted tf}
+        self.doc_lengths: Dict[str, int] = {}
+        self.avg_length = 0.0
+        self.hits = 0
+        self.fallbacks = 0
+
+    # ─────────────────────────────────────────────
+    # Index
+    # ─────────────────────────────────────────────
+
+    def build(
+        self,
+        tables: Dict[str, Dict],
+        describe: Callable[[str], str],
+        mappings: Dict = None,
+    ):
+        """
+        (Re)builds the index.
+        tables: schema-file shaped {name: {"schema": {"columns": [...]}, "enum_fields": {...}}}
+        describe: table name -> one-line description
+        """
+        postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        doc_lengths = {}
+        for table, raw_table in tables.items():
+            if "migration" in table or "failed_jobs" in table:
+                continue
+            terms = Counter()
+            for token in tokenize(table.replace("_", " ")):
+                terms[token] += NAME_WEIGHT
+            for token in tokenize(describe(table)):
+                terms[token] += DESCRIPTION_WEIGHT
+            for col in raw_table.get("schema", {}).get("columns", []):
+                for token in tokenize(col.get("Field", "")):
+                    terms[token] += COLUMN_WEIGHT
+            for token in tokenize(" ".join(self._labels(raw_table, (mappings or {}).get(table)))):
+                terms[token] += LABEL_WEIGHT
+
+            doc_lengths[table] = sum(terms.values())
+            for term, tf in terms.items():
+                postings[term][table] = tf
+
+        with self._lock:
+            self.postings = dict(postings)
+            self.doc_lengths = doc_lengths
+            self.avg_length = (
+                sum(doc_lengths.values()) / len(doc_lengths) if doc_lengths else 0.0
+            )
+        logger.info(f"✅ Table retriever indexed {len(doc_lengths)} tables ({len(postings)} terms)")
+
+    @staticmethod
+    def _labels(raw_table: Dict, mapping=None) -> Iterable[str]:
+        """Enum value labels and manual mapping text for a table"""
+        for col, data in raw_table.get("enum_fields", {}).items():
+            yield col
+            values = data.get("values", []) if isinstance(data, dict) else []
+            for v in values:
+                if isinstance(v, dict):
+                    yield " ".join(str(x) for x in v.values() if isinstance(x, str))
+        if mapping:
+            yield re.sub(r"[^A-Za-z0-9_ ]", " ", str(mapping))
+
+    # ─────────────────────────────────────────────
+    # Query
+    # ─────────────────────────────────────────────
+
+    def query_terms(self, question: str) -> List[str]:
+        """Content terms of a question, with schema synonyms appended"""
+        terms = [t for t in tokenize(question) if t not in STOPWORDS]
+        expanded = list(terms)
+        for term in terms:
+            expanded.extend(s for s in SYNONYMS.get(term, ()) if s not in expanded)
+        return expanded
+
+    def search(
+        self, question: str, top_k: int = None, allowed: Optional[set] = None
+    ) -> List[Tuple[str, float]]:
+        """Ranked (table, score) pairs, at most two tables per result-table family"""
+        top_k = top_k or settings.TABLE_RETRIEVAL_TOP_K
+        with self._lock:
+            postings, doc_lengths, avg_length = self.postings, self.doc_lengths, self.avg_length
+        if not doc_lengths:
+            return []
+
+        n_docs = len(doc_lengths)
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(self.query_terms(question)):
+            docs = postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for table, tf in docs.items():
+                if allowed and table not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[table] / avg_length)
+                scores[table] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = []
+        per_family = Counter()
+        for table, score in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0])):
+            family = _table_family(table)
+            if per_family[family] >= 2:
+                continue
+            per_family[family] += 1
+            ranked.append((table, round(score, 3)))
+            if len(ranked) >= top_k:
+                break
+        return ranked
+
+    def retrieve(self, question: str, allowed: Optional[set] = None) -> Dict:
+        """
+        Returns {"tables", "scores", "coverage", "confident"}.
+        coverage is the share of the question's content terms found in the
+        returned tables; low coverage or a weak top score means the LLM
+        analysis should pick the tables instead.
+        """
+        ranked = self.search(question, allowed=allowed)
+        terms = [t for t in tokenize(question) if t not in STOPWORDS]
+        tables = [t for t, _ in ranked]
+
+        covered = 0
+        with self._lock:
+            postings = self.postings
+        for term in terms:
+            candidates = [term] + SYNONYMS.get(term, [])
+            if any(table in postings.get(c, {}) for c in candidates for table in tables):
+                covered += 1
+        coverage = round(covered / len(terms), 3) if terms else 0.0
+
+        confident = bool(
+            ranked
+            and ranked[0][1] >= settings.TABLE_RETRIEVAL_MIN_SCORE
+            and coverage >= settings.TABLE_RETRIEVAL_MIN_COVERAGE
+        )
+        if confident:
+            self.hits += 1
+        else:
+            self.fallbacks += 1
+        return {
+            "tables": tables,
+            "scores": dict(ranked),
+            "coverage": coverage,
+            "confident": confident,
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "tables": len(self.doc_lengths),
+            "terms": len(self.postings),
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+        }
+
+
+# Global singleton
+table_retriever = TableRetriever()
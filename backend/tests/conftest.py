@@ -0,0 +1,11 @@
+import os
+
+# Settings() requires DB credentials; unit tests never open a connection
+for key, value in {
+    "DB_HOST": "127.0.0.1",
+    "DB_PORT": "3306",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_NAME": "test",
+}.items():
+    os.environ.setdefault(key, value)
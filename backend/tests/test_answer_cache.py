@@ -0,0 +1,43 @@
+import pytest
+
+from app.core.answer_cache import answer_cache
+
+
+def key(question, role_id, user_id):
+    return answer_cache.make_key(question, role_id, user_id=user_id, college_id=3, department_id=11)
+
+
+def test_student_answers_are_never_shared():
+    assert key("show marks", 7, "101") != key("show marks", 7, "102")
+    assert key("what is our rank", 7, "101") != key("what is our rank", 7, "102")
+
+
+def test_scope_questions_are_shared_for_other_roles():
+    assert key("show marks", 4, "201") == key("show marks", 4, "202")
+    assert key("show my marks", 4, "201") != key("show my marks", 4, "202")
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM users WHERE id = 42",
+        "SELECT marks FROM results r WHERE r.user_id = '42'",
+        "SELECT * FROM staff_trainer_feedback WHERE staff_trainer_id=42 LIMIT 5",
+        "SELECT * FROM users u WHERE u.`id` = 42",
+    ],
+)
+def test_references_user(sql):
+    assert answer_cache.references_user(sql, "42")
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM users WHERE id = 420",
+        "SELECT * FROM users WHERE department_id = 11 LIMIT 42",
+        "SELECT * FROM scores WHERE score = 42",
+        "SELECT * FROM users WHERE id = 4.2",
+    ],
+)
+def test_does_not_reference_user(sql):
+    assert not answer_cache.references_user(sql, "42")
@@ -0,0 +1,19 @@
+from app.core import logging_config
+
+
+def test_stop_logging_is_idempotent():
+    logging_config.setup_logging()
+    logging_config.stop_logging()
+    assert logging_config._listener is None
+    assert logging_config._log_queue is None
+    # Shutdown hook and atexit both call it
+    logging_config.stop_logging()
+
+
+def test_setup_after_stop_does_not_duplicate_handlers():
+    logging_config.setup_logging()
+    logging_config.stop_logging()
+    logging_config.setup_logging()
+    handlers = logging_config.get_logger("ai_app").handlers
+    assert sum(isinstance(h, logging_config.CappedQueueHandler) for h in handlers) == 1
+    logging_config.stop_logging()
@@ -0,0 +1,68 @@
+import json
+
+from app.core.rate_limiter import MemoryCounterBackend, RateLimiter, RateLimitMiddleware
+
+ROLE_LIMITS = {1: 5, 7: 2}
+
+
+def make_middleware(ip_limit=100, roles=None):
+    limiter = RateLimiter(
+        requests_per_minute=3, role_limits=ROLE_LIMITS, backend=MemoryCounterBackend()
+    )
+    middleware = RateLimitMiddleware(
+        None, limiter=limiter, paths=["/ask"], ip_limit=ip_limit, trusted_proxy_hops=1
+    )
+    middleware._role_for = lambda user_id: (roles or {}).get(user_id)
+    return middleware
+
+
+def scope(forwarded=None, client="10.0.0.9"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "headers": headers, "client": (client, 1234)}
+
+
+def body(**payload):
+    return json.dumps(payload).encode()
+
+
+def hits_until_rejected(middleware, request_scope, request_body, max_hits=50):
+    for n in range(max_hits):
+        allowed, *_ = middleware._check(request_scope, request_body)
+        if not allowed:
+            return n
+    return max_hits
+
+
+def test_client_ip_uses_proxy_appended_hop():
+    middleware = make_middleware()
+    assert middleware._client_ip(scope("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+    assert middleware._client_ip(scope("203.0.113.7")) == "203.0.113.7"
+    assert middleware._client_ip(scope()) == "10.0.0.9"
+
+
+def test_spoofed_first_hop_does_not_get_a_fresh_bucket():
+    middleware = make_middleware(ip_limit=3, roles={"42": 1})
+    request = body(user_id="42")
+    for spoofed in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        allowed, *_ = middleware._check(scope(f"{spoofed}, 203.0.113.7"), request)
+        assert allowed
+    allowed, *_ = middleware._check(scope("4.4.4.4, 203.0.113.7"), request)
+    assert not allowed
+
+
+def test_body_role_is_ignored_for_unknown_users():
+    middleware = make_middleware()
+    request = body(user_id="42", user_role=1)
+    # Lowest tier (min of default 3 and role limits), not the admin's 5
+    assert hits_until_rejected(middleware, scope(), request) == 2
+
+
+def test_tier_comes_from_database_role():
+    middleware = make_middleware(roles={"42": 1})
+    assert hits_until_rejected(middleware, scope(), body(user_id="42", user_role=7)) == 5
+
+
+def test_ip_floor_applies_across_user_ids():
+    middleware = make_middleware(ip_limit=4, roles={str(i): 1 for i in range(10)})
+    results = [middleware._check(scope(), body(user_id=str(i)))[0] for i in range(6)]
+    assert results == [True, True, True, True, False, False]
@@ -0,0 +1,79 @@
+import pytest
+
+from app.core.sql_canonicalizer import sql_canonicalizer
+
+
+def canon(sql):
+    return sql_canonicalizer.canonicalize(sql)
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("select id from users where id = 1;", "SELECT id\nFROM users WHERE id=1"),
+        ("SELECT u.id FROM users u", "select x.id from users as x"),
+        ("SELECT id FROM users -- trailing note", "SELECT id FROM users"),
+        ("SELECT id FROM `users` WHERE a != 1", "SELECT id FROM users WHERE a <> 1"),
+        ("SELECT CAST(x AS date) FROM t", "SELECT CAST(x AS DATE) FROM t"),
+    ],
+)
+def test_equivalent_queries_share_a_canonical_form(a, b):
+    assert canon(a) == canon(b)
+
+
+def test_double_dash_without_space_is_not_a_comment():
+    # MySQL reads 5--3 as 5 - (-3), not as 5 followed by a comment
+    assert canon("SELECT 5--3 FROM t") != canon("SELECT 5 FROM t")
+    assert "3" in canon("SELECT 5--3 FROM t")
+
+
+@pytest.mark.parametrize(
+    "sql, alias",
+    [
+        ("SELECT created_at AS date FROM t", "date"),
+        ("SELECT COUNT(*) AS count FROM t", "count"),
+        ("SELECT MAX(score) AS Year FROM t", "Year"),
+    ],
+)
+def test_alias_after_as_is_kept_verbatim(sql, alias):
+    assert canon(sql).split(" FROM")[0].endswith(f"AS {alias}")
+
+
+def test_aliases_differing_in_case_stay_distinct():
+    assert canon("SELECT created_at AS date FROM t") != canon("SELECT created_at AS DATE FROM t")
+
+
+def test_fingerprint_masks_literals_and_collapses_in_lists():
+    assert sql_canonicalizer.fingerprint(
+        "SELECT id FROM users WHERE role IN (1, 2, 3) AND name = 'x'"
+    ) == "SELECT id FROM users WHERE role IN (?+) AND name = ?"
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("SELECT count(*) FROM users", "SELECT COUNT(*) FROM users"),
+        ("SELECT date FROM t", "SELECT DATE FROM t"),
+        ("SELECT COUNT( * ) FROM users", "SELECT COUNT(*) FROM users"),
+    ],
+)
+def test_result_key_keeps_select_list_labels(a, b):
+    assert canon(a) == canon(b)
+    assert sql_canonicalizer.result_key(a) != sql_canonicalizer.result_key(b)
+
+
+def test_result_key_ignores_differences_outside_the_select_list():
+    assert sql_canonicalizer.result_key(
+        "SELECT u.name, COUNT(*) AS n FROM users u where u.id  in (1,2) group by u.name;"
+    ) == sql_canonicalizer.result_key(
+        "SELECT u.name,COUNT(*) AS n\nFROM users AS u WHERE u.id IN (1, 2) GROUP BY u.name"
+    )
+    assert sql_canonicalizer.result_key(
+        "SELECT id, name FROM users where id = 1"
+    ) == sql_canonicalizer.result_key("SELECT id,name\nFROM `users` WHERE id=1;")
+
+
+def test_select_list_stops_at_top_level_from():
+    assert sql_canonicalizer._select_list(
+        "SELECT EXTRACT(YEAR FROM d) y, (SELECT MAX(x) FROM t) m FROM t2"
+    ) == ["EXTRACT(YEAR FROM d) y", "(SELECT MAX(x) FROM t) m"]
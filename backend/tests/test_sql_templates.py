@@ -0,0 +1,86 @@
+import pytest
+
+from app.services.query_classifier import query_classifier
+from app.services.sql_templates import sql_template_library
+
+ADMIN = {"role_id": 1}
+STUDENT = {
+    "role_id": 7,
+    "college_id": 3,
+    "department_id": 11,
+    "batch_id": 21,
+    "section_id": 31,
+}
+
+
+def render(question, scope=ADMIN):
+    return sql_template_library.render(query_classifier.classify(question), scope)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "how many students are in the java course",
+        "total students in react",
+        "how many students in python",
+        "total users in the c++ course",
+        "how many students are in courses",
+    ],
+)
+def test_count_with_course_qualifier_uses_full_pipeline(question):
+    intent = query_classifier.classify(question)
+    assert intent.intent == "simple_count"
+    assert intent.sql_template is None
+    assert render(question) is None
+
+
+def test_plain_count_renders_unscoped_for_admin():
+    sql, params = render("how many students are there")
+    assert sql == "SELECT COUNT(*) AS total_students FROM users WHERE role = 7"
+    assert params == {}
+
+
+def test_count_in_my_college_is_scoped_for_student():
+    intent = query_classifier.classify("how many batches in my college")
+    assert intent.metadata["entity"] == "batches"
+    # Students can't count batches: their scope pins the batch already
+    assert sql_template_library.render(intent, STUDENT) is None
+
+
+def test_top_performers_keeps_language_slot():
+    intent = query_classifier.classify("top 5 java performers")
+    assert intent.sql_template == "top_performers"
+    sql, params = sql_template_library.render(intent, ADMIN)
+    assert "JOIN courses c" in sql
+    assert params == {"course_name": "java", "limit": 5}
+
+
+def test_top_performers_scoped_for_student():
+    sql, params = render("top performers in my batch", STUDENT)
+    assert "cws.batch_id = :batch_id" in sql
+    assert params["batch_id"] == 21 and params["limit"] == 10
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "what is my rank in my batch students",
+        "show my rank in the leaderboard",
+        "top students by department",
+        "am i among the top performers in my batch",
+        "how many students are ranked above me",
+    ],
+)
+def test_personal_and_grouped_questions_use_full_pipeline(question):
+    assert query_classifier.classify(question).sql_template is None
+    assert render(question, STUDENT) is None
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["show me the top performers in my batch", "top 10 students in our college"],
+)
+def test_scope_possessives_still_use_templates(question):
+    intent = query_classifier.classify(question)
+    assert intent.sql_template == "top_performers"
+    assert render(question, STUDENT) is not None
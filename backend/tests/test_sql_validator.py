@@ -0,0 +1,57 @@
+import pytest
+
+from app.core.sql_validator import sql_validator
+
+COLUMNS = {
+    "users": {c.lower(): c for c in ("id", "name", "email", "gender", "status", "role", "created_at")},
+    "tests": {c.lower(): c for c in ("id", "testName", "status")},
+    "user_login_activities": {c.lower(): c for c in ("id", "user_id", "created_at")},
+}
+
+
+def unknown(sql):
+    return sql_validator.find_unknown_columns(sql, COLUMNS)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT gender, COUNT(*) genders FROM users GROUP BY gender",
+        "SELECT status stat FROM users",
+        "SELECT gender, COUNT(*) AS genders FROM users GROUP BY gender ORDER BY genders",
+        "SELECT CASE WHEN role = 7 THEN 'student' ELSE 'staff' END kind FROM users",
+        "SELECT DISTINCT gender FROM users",
+        "SELECT YEAR(created_at) yr, COUNT(*) total FROM users GROUP BY YEAR(created_at)",
+        "SELECT EXTRACT(YEAR FROM created_at) yr FROM users",
+        "SELECT u.name, JSON_EXTRACT(u.email, '$.status_x') FROM users u",
+        "SELECT name FROM users WHERE id = :user_id",
+        "SELECT d.x FROM (SELECT id AS x FROM users) d",
+        "SELECT u.* FROM users u",
+    ],
+)
+def test_valid_sql_passes(sql):
+    assert unknown(sql) == []
+
+
+def test_qualified_unknown_column_suggests_nearest():
+    issues = unknown("SELECT t.test_name FROM tests t")
+    assert [(i["ref"], i["suggestion"]) for i in issues] == [("t.test_name", "testName")]
+
+
+def test_qualified_column_case_insensitive():
+    assert unknown("SELECT `t`.`TESTNAME` FROM `tests` `t`") == []
+
+
+def test_known_mistake_mapped_through_join_alias():
+    issues = unknown(
+        "SELECT u.name FROM users u JOIN user_login_activities ula "
+        "ON ula.user_id = u.id WHERE ula.login_time > NOW()"
+    )
+    assert [(i["ref"], i["table"], i["suggestion"]) for i in issues] == [
+        ("ula.login_time", "user_login_activities", "created_at")
+    ]
+
+
+def test_bare_typo_in_single_table_query():
+    issues = unknown("SELECT name, emial FROM users WHERE role = 7")
+    assert [(i["ref"], i["suggestion"]) for i in issues] == [("emial", "email")]
@@ -0,0 +1,38 @@
+import threading
+
+from app.core.usage_recorder import UsageRecorder
+
+
+def record(day="2026-01-01"):
+    return {"day": day, "stage": "sql_generation", "model": "deepseek-chat", "total_tokens": 1}
+
+
+def test_close_writes_every_queued_record(tmp_path):
+    recorder = UsageRecorder(str(tmp_path), flush_interval=0.01, batch_size=10)
+    for _ in range(35):
+        recorder._queue.put(record())
+    recorder._ensure_started()
+    recorder.close()
+
+    lines = (tmp_path / "usage-2026-01-01.jsonl").read_text().splitlines()
+    assert len(lines) == 35
+
+
+def test_concurrent_records_start_one_writer(tmp_path, monkeypatch):
+    recorder = UsageRecorder(str(tmp_path), flush_interval=0.01)
+    started = []
+    original_start = threading.Thread.start
+
+    def counting_start(thread):
+        if thread.name == "usage-recorder":
+            started.append(thread)
+        original_start(thread)
+
+    monkeypatch.setattr(threading.Thread, "start", counting_start)
+    workers = [threading.Thread(target=recorder._ensure_started) for _ in range(20)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    recorder.close()
+    assert len(started) == 1